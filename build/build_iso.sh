@@ -38,7 +38,7 @@ BUILT_AT="$(date -u +%Y-%m-%dT%H:%M:%SZ)"
 SYSTEMD_UNITS_SRC="./templates"
 
 # List additional packages to install (space separated)
-EXTRA_PKGS="hostapd iptables dnsmasq tcpdump jq openssh-server"
+EXTRA_PKGS="hostapd iptables nftables dnsmasq tcpdump jq openssh-server"
 # List unwanted packages to remove (space separated)
 REMOVE_PKGS="modemmanager rsyslog"
 
@@ -239,7 +239,8 @@ allow-hotplug wlan0
 auto wlan0
 iface wlan0 inet static
     pre-up /usr/sbin/rfkill unblock wlan
-    post-up /usr/sbin/dnsmasq -I lo -i wlan0 --bind-interfaces -K -z -F wlan0,192.168.42.10,192.168.42.250,5m --dhcp-option=3,192.168.42.1 --dhcp-option=6,192.168.42.1 --address=/gateway.border0/10.10.10.10 --log-dhcp --log-facility=/var/log/dnsmasq_wlan0.log
+    pre-up /bin/mkdir -p /run/border0/log
+    post-up /usr/sbin/dnsmasq -I lo -i wlan0 --bind-interfaces -K -z -F wlan0,192.168.42.10,192.168.42.250,5m --dhcp-option=3,192.168.42.1 --dhcp-option=6,192.168.42.1 --address=/gateway.border0/10.10.10.10 --log-dhcp --log-facility=/run/border0/log/dnsmasq_wlan0.log
     post-up /sbin/iptables -t nat -A POSTROUTING -s 192.168.42.0/24 -o eth+ -j MASQUERADE
     post-up /sbin/iptables -t nat -A POSTROUTING -s 192.168.42.0/24 -o utun+ -j MASQUERADE
     post-down /sbin/iptables -t nat -D POSTROUTING -s 192.168.42.0/24 -o eth+ -j MASQUERADE
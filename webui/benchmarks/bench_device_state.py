@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Benchmark device.state.yaml reads for the VPN page.
+
+Writes a synthetic Border0 device state with many organizations, each
+with its own peers, then times what the VPN page does per view before
+and after: the pure-Python ``yaml.safe_load`` plus summary on every
+request, a libyaml ``CSafeLoader`` parse plus summary (the cost of a
+cache miss now), and ``state_files.device_state()`` when the file has
+not changed (one stat).
+
+Usage (from webui/):  python3 benchmarks/bench_device_state.py [--orgs 20] [--peers 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gateway_admin import state_files  # noqa: E402
+from gateway_admin.config import Config  # noqa: E402
+
+
+def synthetic_state(orgs, peers):
+    rnd = random.Random(42)
+
+    def key():
+        return ''.join(rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/') for _ in range(43)) + '='
+
+    organizations = {}
+    for o in range(orgs):
+        subdomain = f'org{o}'
+        organizations[subdomain] = {
+            'device_id': f'{o:08x}-0000-4000-8000-{rnd.getrandbits(48):012x}',
+            'self_ip_v4': f'100.{64 + o % 64}.0.1',
+            'self_ip_v6': f'fd00:{o:x}::1',
+            'network_cidr_v4': f'100.{64 + o % 64}.0.0/16',
+            'network_cidr_v6': f'fd00:{o:x}::/64',
+            'resources_cidr_v4': '10.0.0.0/8',
+            'resources_cidr_v6': 'fd10::/48',
+            'key': {'public_key': key(), 'private_key': key(), 'expires_at': '2026-12-31T00:00:00Z'},
+            'managed_network_interfaces': ['utun0'],
+            'exit_node': None,
+            'last_updated_at': '2026-10-01T12:00:00Z',
+            'profile': {
+                'name': f'gateway-{o}',
+                'email': f'gw{o}@example.com',
+                'org_subdomain': subdomain,
+                'org_id': f'{rnd.getrandbits(128):032x}',
+            },
+            'peers': [
+                {
+                    'device_id': f'{rnd.getrandbits(128):032x}',
+                    'public_key': key(),
+                    'endpoints': [f'203.0.113.{rnd.randrange(256)}:{rnd.randrange(1024, 65535)}'],
+                    'allowed_ips': [f'100.{64 + o % 64}.{p // 250}.{p % 250 + 2}/32'],
+                    'last_handshake_at': '2026-10-01T11:59:00Z',
+                    'tags': {'site': f'site-{p % 17}', 'role': 'client'},
+                }
+                for p in range(peers)
+            ],
+        }
+    return {'current_organization': f'org{orgs - 1}', 'organizations': organizations}
+
+
+def legacy_read(path):
+    """The pre-cache vpn._load_device_state: pure-Python parse on every view."""
+    with open(path) as f:
+        return state_files._device_summary(yaml.safe_load(f))
+
+
+def c_read(path):
+    with open(path) as f:
+        return state_files._device_summary(yaml.load(f.read(), Loader=state_files._YamlLoader))
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orgs', type=int, default=20)
+    parser.add_argument('--peers', type=int, default=200, help='peers per organization')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-device-state-')
+    try:
+        Config.BORDER0_TOKEN_PATH = os.path.join(workdir, 'token')
+        path = state_files.device_state_path()
+        with open(path, 'w') as f:
+            yaml.safe_dump(synthetic_state(args.orgs, args.peers), f, sort_keys=False)
+        print(f'{args.orgs} orgs x {args.peers} peers, {os.path.getsize(path) / 1e6:.1f} MB, '
+              f'loader {state_files._YamlLoader.__name__}')
+
+        before, old = timed(legacy_read, path, repeat=1)
+        miss, new = timed(c_read, path)
+        state_files.device_state()
+        hit, cached = timed(state_files.device_state, repeat=1000)
+        assert old == new == cached
+        print(f'{"safe_load":>14} {before * 1e3:10.1f}ms')
+        print(f'{"CSafeLoader":>14} {miss * 1e3:10.1f}ms')
+        print(f'{"cached (stat)":>14} {hit * 1e6:10.1f}us')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Benchmark /stats/history reads: legacy JSON-lines scan vs ring seek.
+
+Builds a synthetic multi-month history at the collector's 15 s interval,
+once as the old metrics.log and once as a ring file, then times 1 h /
+24 h / 7 d window reads the way ``stats.history`` performs them before
+and after the time-indexed seek, plus the tiered query the route now uses.
+
+Usage (from webui/):  python3 benchmarks/bench_history.py [--days 90]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gateway_admin import metrics_store  # noqa: E402
+from gateway_admin.metrics_store import RingStore, TieredSeries  # noqa: E402
+
+COLUMNS = ('cpu', 'memory', 'disk', 'net_sent', 'net_recv')
+INTERVAL = 15
+WINDOWS = (('1h', 1), ('24h', 24), ('7d', 24 * 7))
+
+
+def synthetic_samples(days, end_ms):
+    rnd = random.Random(42)
+    count = days * 86400 // INTERVAL
+    start = end_ms - count * INTERVAL * 1000
+    for i in range(count):
+        yield start + i * INTERVAL * 1000, {
+            'cpu': rnd.uniform(0, 100),
+            'memory': rnd.uniform(20, 60),
+            'disk': 40.0,
+            'net_sent': rnd.uniform(0, 1e6),
+            'net_recv': rnd.uniform(0, 5e6),
+        }
+
+
+def legacy_history(log_path, cutoff):
+    """The pre-ring stats.history loop."""
+    data = []
+    with open(log_path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get('time', 0) >= cutoff:
+                data.append(rec)
+    return data
+
+
+def linear_ring(path, cutoff):
+    """Ring read that unpacks every record and filters afterwards."""
+    with RingStore.open_readonly(path) as store:
+        first, count = store._visible()
+        return [r for r in store._iter_range(first, count) if r[0] >= cutoff]
+
+
+def seek_ring(path, cutoff):
+    with RingStore.open_readonly(path) as store:
+        return store.rows(start_ms=cutoff)
+
+
+def tiered_query(directory, cutoff, end_ms):
+    """What stats.history serves now: the tier that fits 600 points."""
+    return metrics_store.query(directory, 'system', cutoff, end_ms, 600)[1]
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-history-')
+    try:
+        end_ms = int(time.time() * 1000)
+        log_path = os.path.join(workdir, 'metrics.log')
+        ring_path = os.path.join(workdir, 'metrics.ring')
+        capacity = args.days * 86400 // INTERVAL + 1
+        ring = RingStore.open(ring_path, COLUMNS, capacity)
+        series = TieredSeries(workdir, 'system', COLUMNS)
+        with open(log_path, 'w') as log:
+            for t, values in synthetic_samples(args.days, end_ms):
+                log.write(json.dumps(dict(values, time=t)) + '\n')
+                ring.append(t, values)
+                series.append(t, values)
+        ring.close()
+        series.close()
+        print(f'{args.days} days, {capacity - 1} samples, '
+              f'log {os.path.getsize(log_path) / 1e6:.1f} MB, '
+              f'ring {os.path.getsize(ring_path) / 1e6:.1f} MB')
+        print(f'{"window":>6} {"jsonl scan":>12} {"ring scan":>12} '
+              f'{"ring seek":>12} {"tiered":>12}  rows')
+        for label, hours in WINDOWS:
+            cutoff = end_ms - hours * 3600 * 1000
+            before, n = timed(legacy_history, log_path, cutoff, repeat=1)
+            scan, _ = timed(linear_ring, ring_path, cutoff)
+            after, n2 = timed(seek_ring, ring_path, cutoff)
+            tiered, _ = timed(tiered_query, workdir, cutoff, end_ms)
+            assert n == n2
+            print(f'{label:>6} {before * 1e3:10.1f}ms {scan * 1e3:10.1f}ms '
+                  f'{after * 1e3:10.2f}ms {tiered * 1e3:10.2f}ms  {n}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
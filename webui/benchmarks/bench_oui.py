@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Benchmark MAC vendor lookups: compiled OUI index vs manuf.MacParser.
+
+Draws random MACs from the OUIs in the local manuf database, then times
+compiling the index (done once per image), opening it, and resolving
+every MAC, and does the same for ``manuf.MacParser`` when the package is
+installed, checking both agree.
+
+Usage (from webui/):  python3 benchmarks/bench_oui.py [--count 500]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gateway_admin.oui import OuiIndex, compile_index, parse_manuf, source_path  # noqa: E402
+
+
+def random_macs(source, count):
+    with open(source, encoding='utf-8') as f:
+        ouis = [prefix >> 24 for _, prefix, _ in parse_manuf(f.read())]
+    rnd = random.Random(0)
+    return [
+        ':'.join(f'{b:02x}' for b in ((rnd.choice(ouis) << 24) | rnd.getrandbits(24)).to_bytes(6, 'big'))
+        for _ in range(count)
+    ]
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=500)
+    args = parser.parse_args()
+
+    source = source_path()
+    if not source:
+        sys.exit('no manuf database found')
+    macs = random_macs(source, args.count)
+
+    workdir = tempfile.mkdtemp(prefix='bench-oui-')
+    try:
+        path = os.path.join(workdir, 'oui.idx')
+        compiled, data = timed(compile_index, source, path)
+        opened, index = timed(OuiIndex.open, path)
+        lookups, found = timed(lambda: [index.lookup(m) for m in macs])
+        print(f'{source}, index {len(data)} bytes, {args.count} MACs')
+        print(f'{"index":>16} compile {compiled * 1e3:8.1f}ms (once)  '
+              f'open {opened * 1e3:6.2f}ms  lookups {lookups * 1e3:6.2f}ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    try:
+        import manuf
+    except ImportError:
+        print('manuf not installed; skipping MacParser')
+        return
+    loaded, mac_parser = timed(manuf.MacParser)
+    lookups, expected = timed(lambda: [mac_parser.get_manuf(m) for m in macs])
+    print(f'{"manuf.MacParser":>16} load {loaded * 1e3:11.1f}ms  '
+          f'lookups {lookups * 1e3:6.2f}ms')
+    print(f'mismatches: {sum(a != b for a, b in zip(found, expected))}')
+
+
+if __name__ == '__main__':
+    main()
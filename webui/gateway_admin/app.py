@@ -2,6 +2,7 @@ import os
 from flask import Flask
 from .config import Config
 from .extensions import login_manager
+from . import netlink, telemetry
 from flask_wtf import CSRFProtect
 from jinja2 import ChoiceLoader, FileSystemLoader
 
@@ -12,6 +13,7 @@ from .modules.wan.routes import wan_bp
 from .modules.lan.routes import lan_bp
 from .modules.vpn.routes import vpn_bp
 from .modules.stats.routes import stats_bp
+from .modules.metrics.routes import metrics_bp
 
 def create_app():
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -29,6 +31,9 @@ def create_app():
 
     login_manager.init_app(app)
     CSRFProtect(app)
+    telemetry.init_app(app)
+    # Keep the interface/neighbour cache fresh from netlink change events
+    netlink.watch()
     # Serve Border0 client assets (fonts, icons)
     from flask import send_from_directory
     assets_folder = os.path.join(static_dir, 'border0', 'assets')
@@ -49,5 +54,6 @@ def create_app():
     app.register_blueprint(lan_bp)
     app.register_blueprint(vpn_bp)
     app.register_blueprint(stats_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
@@ -49,6 +49,8 @@ class Config:
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'password')
     # Path to Border0 CLI binary
     BORDER0_CLI_PATH = os.environ.get('BORDER0_CLI_PATH', 'border0')
+    # Seconds a `border0 node state show` result is shared between pages
+    BORDER0_STATE_TTL = float(os.environ.get('BORDER0_STATE_TTL', '10'))
     # Optional organization name override via environment
     BORDER0_ORG = os.environ.get('BORDER0_ORG', '')
     # Path where the Border0 client token will be stored for web UI operations
@@ -66,6 +68,11 @@ class Config:
         'BORDER0_TOKEN_METADATA_PATH',
         os.path.expanduser('/etc/border0/token_metadata.json')
     )
+    # Result of the last Border0 CLI update check (System page)
+    VERSION_CACHE_PATH = os.environ.get(
+        'VERSION_CACHE_PATH',
+        '/etc/border0/version_cache.json'
+    )
     # Path where the web UI auth-mode toggle is persisted. JSON: {"mode": ...}
     # where mode is one of 'none' | 'local' | 'sso'. Env override below wins.
     AUTH_MODE_PATH = os.environ.get(
@@ -84,11 +91,52 @@ class Config:
         'IMAGE_VERSION_PATH',
         '/etc/border0/image_version.json'
     )
-    # Path where historical metrics are logged (JSON lines, timestamp in ms)
+    # Directory holding the metrics collector's ring files, one per series
+    # and tier (see gateway_admin/metrics_store.py). The collector keeps
+    # them on tmpfs and flushes them to /var/lib/border0/metrics in
+    # batches (see gateway_admin/staging.py); set this to the persistent
+    # directory when the collector runs with --staging-dir ''
+    METRICS_DIR = os.environ.get(
+        'METRICS_DIR',
+        '/run/border0/metrics'
+    )
+    # Ring on tmpfs where the collector publishes its latest live samples
+    METRICS_LIVE_PATH = os.environ.get(
+        'METRICS_LIVE_PATH',
+        '/run/border0/metrics-live.ring'
+    )
+    # Ring the collector fills with 1 s samples during a burst, and the
+    # request file /stats/burst writes to start one
+    METRICS_BURST_PATH = os.environ.get(
+        'METRICS_BURST_PATH',
+        '/run/border0/metrics-burst.ring'
+    )
+    METRICS_BURST_REQUEST_PATH = os.environ.get(
+        'METRICS_BURST_REQUEST_PATH',
+        '/run/border0/metrics-burst.json'
+    )
+    # Bearer token accepted by /metrics from other hosts; when empty the
+    # endpoint only answers scrapes from localhost
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # Legacy JSON-lines metrics log; imported by the collector on upgrade
     METRICS_LOG_PATH = os.environ.get(
         'METRICS_LOG_PATH',
         '/var/lib/border0/metrics.log'
     )
+    # dnsmasq logs DHCP to dnsmasq_<iface>.log on tmpfs; the collector
+    # appends it to the same name under /var/log in batches
+    DNSMASQ_LOG_STAGING_DIR = os.environ.get(
+        'DNSMASQ_LOG_STAGING_DIR',
+        '/run/border0/log'
+    )
+    DNSMASQ_LOG_DIR = os.environ.get('DNSMASQ_LOG_DIR', '/var/log')
+    # dnsmasq's lease database, and where the LAN client table built from
+    # it and the logs is kept (see gateway_admin.leases)
+    DHCP_LEASES_PATH = os.environ.get(
+        'DHCP_LEASES_PATH',
+        '/var/lib/misc/dnsmasq.leases'
+    )
+    DHCP_CLIENTS_DIR = os.environ.get('DHCP_CLIENTS_DIR', '/var/lib/border0')
     # Path where the chosen WAN interface will be stored
     WAN_IFACE_PATH = os.environ.get(
         'WAN_IFACE_PATH',
@@ -0,0 +1,252 @@
+"""Data providers for the home dashboard.
+
+Every card on the home page gets its data from one provider: a plain
+function of paths and interface names that never touches the Flask app, so
+it can run on a worker thread. :func:`gather` runs the providers a page
+needs concurrently on a small shared pool and waits for each at most its
+own ``timeout``; a provider that overruns or fails leaves only its card
+without data (or with the last value it produced) while the rest of the
+page renders.
+
+Results are cached for the provider's ``ttl``. A call still running when
+its request gave up is not started again: later requests wait on the same
+call, so a hung ``border0`` or ``systemctl`` holds at most one worker, and
+whatever it eventually returns fills the cache for the next page load.
+"""
+
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import psutil
+
+from . import leases, metrics_store, netlink, node_state, state_files, systemd
+
+POOL_SIZE = 6
+DEVICE_UNIT = 'border0-device.service'
+
+_executor = ThreadPoolExecutor(POOL_SIZE, thread_name_prefix='dashboard')
+_lock = threading.Lock()
+# (provider name, args) -> (monotonic time, value) of the last good call
+_cache = {}
+# (provider name, args) -> Future of the call in flight
+_inflight = {}
+
+
+def provider(ttl, timeout):
+    """Mark a function as a provider cached ``ttl`` s, waited ``timeout`` s."""
+    def wrap(fn):
+        fn.ttl = ttl
+        fn.timeout = timeout
+        return fn
+    return wrap
+
+
+def human(n):
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if n < 1024:
+            return f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}PB"
+
+
+def read_iface(path):
+    """Interface name stored in ``path``, or ``None``."""
+    return state_files.read(path) or None
+
+
+def _finish(key, future):
+    with _lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        if future.exception() is None:
+            _cache[key] = (time.monotonic(), future.result())
+
+
+def _chain(fn, args, after):
+    """Future of a call of ``fn`` that starts once ``after`` is done."""
+    follow = Future()
+
+    def call():
+        follow.set_running_or_notify_cancel()
+        try:
+            follow.set_result(fn(*args))
+        except Exception as e:
+            follow.set_exception(e)
+
+    after.add_done_callback(lambda _: _executor.submit(call))
+    return follow
+
+
+def _submit(fn, args, refresh=False):
+    key = (fn.__name__, args)
+    with _lock:
+        hit = _cache.get(key)
+        if hit and not refresh and time.monotonic() - hit[0] < fn.ttl:
+            future = Future()
+            future.set_result(hit[1])
+            return future
+        future = _inflight.get(key)
+        started = future is None
+        if started:
+            future = _inflight[key] = _executor.submit(fn, *args)
+        elif refresh and (future.running() or future.done()):
+            # The call in flight began before the refresh was asked for:
+            # queue a fresh one behind it rather than run two at once
+            future = _inflight[key] = _chain(fn, args, future)
+            started = True
+    if started:
+        # Outside the lock: a call that already finished runs the callback here
+        future.add_done_callback(lambda f: _finish(key, f))
+    return future
+
+
+def gather(calls, refresh=()):
+    """Run providers concurrently and collect what finishes in time.
+
+    ``calls`` maps a card name to ``(provider, args)``; cards named in
+    ``refresh`` skip the cache. Returns ``(results, unavailable)``: a card
+    whose provider timed out or failed gets its last cached value if there
+    is one, otherwise ``None`` and its name in ``unavailable``.
+    """
+    start = time.monotonic()
+    futures = {
+        name: _submit(fn, tuple(args), name in refresh)
+        for name, (fn, args) in calls.items()
+    }
+    results = {}
+    unavailable = set()
+    for name, future in futures.items():
+        fn, args = calls[name]
+        try:
+            results[name] = future.result(
+                timeout=max(start + fn.timeout - time.monotonic(), 0)
+            )
+        except Exception:
+            with _lock:
+                stale = _cache.get((fn.__name__, tuple(args)))
+            if stale:
+                results[name] = stale[1]
+            else:
+                results[name] = None
+                unavailable.add(name)
+    return results, unavailable
+
+
+@provider(ttl=1, timeout=2.5)
+def exit_node(cli, ttl):
+    """``{'exit_node', 'error'}`` from the shared node state (see node_state)."""
+    state, error = node_state.get(cli, wait=2, ttl=ttl)
+    return {'exit_node': state.exit_node if state else None, 'error': error}
+
+
+@provider(ttl=1, timeout=2)
+def device_service(unit=DEVICE_UNIT):
+    """``{'status', 'active', 'enabled'}`` of the Border0 device service.
+
+    systemd.status caches it for a few seconds, so the provider's own TTL
+    only needs to cover one page load.
+    """
+    try:
+        service = systemd.status(unit)[unit]
+    except Exception as e:
+        return {'status': f'Error obtaining service status: {e}', 'active': False, 'enabled': False}
+    return {
+        'status': f"{service['active_state']} ({service['sub_state']})",
+        'active': service['active'],
+        'enabled': service['enabled'],
+    }
+
+
+@provider(ttl=5, timeout=1)
+def system_info(live_path):
+    # CPU comes from the metrics collector's live ring; sampling it here
+    # would cost a blocking interval per page load.
+    live = metrics_store.read_latest(live_path)
+    cpu = live['cpu'] if live and live.get('cpu') is not None else psutil.cpu_percent(interval=None)
+    vm = psutil.virtual_memory()
+    du = psutil.disk_usage('/')
+    nc = psutil.net_io_counters()
+    return {
+        'cpu_percent': cpu,
+        'mem_total': human(vm.total),
+        'mem_used': human(vm.used),
+        'mem_percent': vm.percent,
+        'disk_total': human(du.total),
+        'disk_used': human(du.used),
+        'disk_percent': du.percent,
+        'net_sent': human(nc.bytes_sent),
+        'net_recv': human(nc.bytes_recv)
+    }
+
+
+@provider(ttl=5, timeout=1)
+def interface(iface):
+    """``(info, traffic)`` of one interface; ``info`` has IPv4 and IPv6."""
+    # Counters change without a netlink event; don't take the watched TTL
+    link = netlink.interface(iface, counters=True)
+    if link is None:
+        return {'name': iface, 'status': 'no_carrier', 'ipv4': None, 'ipv6': None}, None
+    addrs = link['addresses']
+    info = {
+        'name': iface,
+        'status': 'UP' if link['up'] else 'no_carrier',
+        'ipv4': next((a['address'] for a in addrs if a['family'] == socket.AF_INET), None),
+        'ipv6': next((a['address'] for a in addrs if a['family'] == socket.AF_INET6), None),
+    }
+    traffic = {'sent': human(link['tx_bytes']), 'recv': human(link['rx_bytes'])}
+    return info, traffic
+
+
+def _merge_neighbours(table, lan_iface):
+    try:
+        for entry in netlink.get_neighbours():
+            dst = entry['dst']
+            # only IPv4
+            if entry['dev'] != lan_iface or ':' in dst:
+                continue
+            mac = entry['lladdr']
+            state = entry['state']
+            # skip unreachable entries
+            if not mac or state == 'FAILED':
+                continue
+            existing = table.get(mac)
+            if existing:
+                # track IP changes
+                existing['state'] = state
+                existing['ip'] = dst
+            else:
+                table[mac] = {
+                    'hostname': None,
+                    'ip': dst,
+                    'mac': mac,
+                    'manufacturer': '',
+                    'state': state
+                }
+    except OSError:
+        try:
+            with open('/proc/net/arp') as arp_f:
+                lines = arp_f.readlines()[1:]
+            for line in lines:
+                parts = line.split()
+                if parts[5] == lan_iface:
+                    ip_addr, mac_addr = parts[0], parts[3].lower()
+                    if mac_addr not in table:
+                        table[mac_addr] = {
+                            'hostname': None,
+                            'ip': ip_addr,
+                            'mac': mac_addr,
+                            'manufacturer': ''
+                        }
+        except Exception:
+            pass
+
+
+@provider(ttl=15, timeout=3)
+def lan_clients(lan_iface, state_dir, log_dirs, leases_path):
+    """DHCP clients (see gateway_admin.leases) merged with the neighbour table."""
+    clients = leases.tracker(lan_iface, state_dir, log_dirs, leases_path).clients()
+    table = {c['mac']: c for c in clients}
+    _merge_neighbours(table, lan_iface)
+    return list(table.values())
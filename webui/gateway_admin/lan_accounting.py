@@ -0,0 +1,221 @@
+"""Per-LAN-client byte and packet counters from nftables sets.
+
+The collector owns an ``ip border0_acct`` table hooked into forward. It
+holds two dynamic sets with a counter per element: packets arriving on
+the LAN interface update their source address in ``up``, packets leaving
+through it their destination address in ``down``. The kernel adds a
+client on its first packet, so a packet costs one hash lookup per
+direction whatever the number of clients, and nothing forks when a new
+device shows up. An element not updated for ``CLIENT_IDLE`` seconds times
+out, so clients that left stop taking space. One ``nft -j list table``
+per sample reads every counter back.
+
+Each set holds at most ``MAX_CLIENTS`` addresses; once one is full, new
+clients are not counted until others time out, and a warning is logged.
+
+Counters are per IP; the ARP table maps them to the MAC that holds the
+address at sampling time, so history follows the device when its lease
+changes.
+"""
+
+import json
+import logging
+import re
+import subprocess
+
+from . import runner
+from .metrics_store import CLIENT_COLUMNS
+
+TABLE = 'border0_acct'
+ARP_FILE = '/proc/net/arp'
+# Addresses per set; the kernel stops adding elements past this
+MAX_CLIENTS = 1024
+# Seconds without traffic after which a client's counters are dropped
+CLIENT_IDLE = 3600
+# Chain the iptables-based accounting of earlier releases used
+LEGACY_CHAIN = 'BORDER0_ACCT'
+IFACE_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,15}$')
+# ARP flag for a resolved entry
+_ATF_COM = 0x2
+
+log = logging.getLogger(__name__)
+
+
+def read_arp(iface):
+    """Return ``{ip: mac}`` for resolved ARP entries on ``iface``."""
+    neighbours = {}
+    try:
+        with open(ARP_FILE) as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return neighbours
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 6 or parts[5] != iface:
+            continue
+        try:
+            flags = int(parts[2], 16)
+        except ValueError:
+            continue
+        if flags & _ATF_COM:
+            neighbours[parts[0]] = parts[3].lower()
+    return neighbours
+
+
+def ruleset(iface):
+    """nft script that (re)creates the accounting table for ``iface``."""
+    sets = ''.join(
+        f'    set {name} {{\n'
+        f'        type ipv4_addr\n'
+        f'        size {MAX_CLIENTS}\n'
+        f'        flags dynamic,timeout\n'
+        f'        timeout {CLIENT_IDLE}s\n'
+        f'    }}\n'
+        for name in ('up', 'down')
+    )
+    # Declaring the table first makes the delete succeed when it is absent
+    return (
+        f'table ip {TABLE}\n'
+        f'delete table ip {TABLE}\n'
+        f'table ip {TABLE} {{\n'
+        f'{sets}'
+        f'    chain forward {{\n'
+        f'        type filter hook forward priority -1; policy accept;\n'
+        f'        iifname "{iface}" update @up {{ ip saddr counter }}\n'
+        f'        oifname "{iface}" update @down {{ ip daddr counter }}\n'
+        f'    }}\n'
+        f'}}\n'
+    )
+
+
+def parse_counters(output):
+    """Parse ``nft -j list table`` output of the accounting table.
+
+    Returns ``{ip: [bytes_up, bytes_down, packets_up, packets_down]}`` and
+    the number of elements in the fuller of the two sets.
+    """
+    counters = {}
+    largest = 0
+    for obj in json.loads(output).get('nftables', []):
+        nft_set = obj.get('set')
+        if not nft_set or nft_set.get('name') not in ('up', 'down'):
+            continue
+        down = nft_set['name'] == 'down'
+        elements = nft_set.get('elem') or []
+        largest = max(largest, len(elements))
+        for element in elements:
+            element = element.get('elem') if isinstance(element, dict) else None
+            if not isinstance(element, dict):
+                continue
+            counter = element.get('counter') or {}
+            entry = counters.setdefault(element.get('val'), [0, 0, 0, 0])
+            entry[1 if down else 0] += counter.get('bytes', 0)
+            entry[3 if down else 2] += counter.get('packets', 0)
+    return counters, largest
+
+
+class LanAccounting:
+    """Maintains the accounting table and turns its counters into rates."""
+
+    def __init__(self, nft='nft'):
+        self.nft = nft
+        self.enabled = False
+        self._iface = None
+        self._prev = {}
+        # Last MAC seen on each address, for entries that age out of ARP
+        self._macs = {}
+        self._full = False
+
+    def _run(self, *args, check=True, stdin=None):
+        return runner.run(
+            [self.nft, *args], check=check, input=stdin,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+            timeout=10,
+        )
+
+    def setup(self):
+        """Check that nft can be used and drop the legacy iptables chain.
+
+        Leaves accounting disabled when nft is missing or not permitted,
+        e.g. on a development machine. The table itself is loaded by
+        :meth:`sample` once the LAN interface is known.
+        """
+        _remove_legacy_chain()
+        try:
+            self._run('list', 'tables')
+        except (OSError, subprocess.SubprocessError):
+            self.enabled = False
+            return False
+        self.enabled = True
+        self._iface = None
+        self._prev = {}
+        return True
+
+    def _load(self, iface):
+        if not IFACE_RE.match(iface):
+            return False
+        try:
+            self._run('-f', '-', stdin=ruleset(iface))
+        except (OSError, subprocess.SubprocessError):
+            return False
+        self._iface = iface
+        self._prev = {}
+        return True
+
+    def sample(self, iface, seconds):
+        """Return ``{mac: ({column: rate}, ip, deltas)}`` since the last call.
+
+        ``deltas`` holds the byte and packet counts behind the rates.
+        Clients that appeared since the last call have no baseline yet
+        and are left out. Changing ``iface``, or failing to read the
+        table, reloads it.
+        """
+        if not self.enabled:
+            return {}
+        if iface != self._iface and not self._load(iface):
+            return {}
+        try:
+            output = self._run('-j', 'list', 'table', 'ip', TABLE).stdout
+            counters, largest = parse_counters(output)
+        except (OSError, subprocess.SubprocessError, ValueError):
+            # The table may be gone after a firewall reload; load it again
+            # on the next sample
+            self._iface = None
+            return {}
+        if largest >= MAX_CLIENTS and not self._full:
+            log.warning('LAN accounting is full (%d clients); new clients '
+                        'are not counted until others go idle', MAX_CLIENTS)
+        self._full = largest >= MAX_CLIENTS
+        neighbours = read_arp(iface)
+        # Only addresses still counted need a remembered MAC
+        self._macs = {
+            ip: neighbours.get(ip) or self._macs.get(ip) for ip in counters
+        }
+        samples = {}
+        for ip, now in counters.items():
+            before = self._prev.get(ip)
+            mac = self._macs.get(ip)
+            if before is None or mac is None:
+                continue
+            # A counter that went backwards belongs to an element that
+            # timed out and was added again
+            deltas = [a - b if a >= b else a for a, b in zip(now, before)]
+            rates = {
+                col: delta / seconds for col, delta in zip(CLIENT_COLUMNS, deltas)
+            }
+            samples[mac] = (rates, ip, deltas)
+        self._prev = counters
+        return samples
+
+
+def _remove_legacy_chain(iptables='iptables'):
+    """Unhook and delete the per-client rule chain of earlier releases."""
+    for args in (('-D', 'FORWARD', '-j', LEGACY_CHAIN),
+                 ('-F', LEGACY_CHAIN), ('-X', LEGACY_CHAIN)):
+        try:
+            runner.run(
+                [iptables, '-w', *args], stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, timeout=10,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return
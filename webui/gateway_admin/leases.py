@@ -0,0 +1,267 @@
+"""Incremental DHCP client table for the LAN interface.
+
+A :class:`LeaseTracker` keeps a MAC-keyed table of the clients dnsmasq
+has served, fed from two sources:
+
+* dnsmasq's lease database (``/var/lib/misc/dnsmasq.leases``), re-read
+  only when its mtime or size changes; it is small and authoritative for
+  current leases and their expiry.
+* the ``dnsmasq_<iface>.log`` files, followed like ``tail -f``: for each
+  file the inode and byte offset reached are remembered and only bytes
+  appended since are parsed. A file that was replaced (new inode) or
+  truncated is read from the start again. The logs are given in flush
+  order (persistent ``/var/log`` copy first, tmpfs staging file last):
+  the stager appends the staged log to the persistent one and then
+  truncates it, so when an earlier file grew the later ones are re-read
+  from the start as well. Logs are read ``READ_CHUNK`` bytes at a time,
+  so a first scan of a long persistent log never holds it all in memory,
+  and a DHCPACK counts as seen at the time of its syslog prefix, so
+  replayed history does not look recent.
+
+The table is persisted compactly (one array per client, plus the log
+positions) whenever it changes, so clients survive both web UI restarts
+and the ``pre-up rm`` of the logs on every ifup. Clients not seen for
+``CLIENT_RETENTION`` seconds are dropped.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+from .oui import vendor
+
+LEASES_FILE = '/var/lib/misc/dnsmasq.leases'
+STATE_FILE = 'dhcp_clients_{iface}.json'
+# Seconds a client is kept after its last lease or DHCPACK
+CLIENT_RETENTION = 7 * 86400
+# Bytes of log read at a time
+READ_CHUNK = 1024 * 1024
+_ACK_RE = re.compile(
+    rb'DHCPACK\([^)]*\)\s+(\d+\.\d+\.\d+\.\d+)\s+([0-9A-Fa-f:]{17})(?:\s+(\S+))?'
+)
+# dnsmasq's log-facility prefix: 'Oct 17 12:34:56 dnsmasq-dhcp[123]: ...'
+_STAMP_RE = re.compile(rb'([A-Z][a-z]{2}) +(\d{1,2}) (\d\d):(\d\d):(\d\d) ')
+_MONTHS = {
+    m: i for i, m in enumerate(
+        (b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun', b'Jul', b'Aug',
+         b'Sep', b'Oct', b'Nov', b'Dec'), 1)
+}
+# Persisted client row: [mac, ip, hostname, last seen, lease expiry]
+_FIELDS = ('mac', 'ip', 'hostname', 'seen', 'expires')
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def tracker(iface, state_dir, log_dirs, leases_path=LEASES_FILE):
+    """Shared :class:`LeaseTracker` for ``iface`` (one per process)."""
+    key = (iface, state_dir, tuple(log_dirs), leases_path)
+    with _trackers_lock:
+        if key not in _trackers:
+            log_name = f'dnsmasq_{iface}.log'
+            _trackers[key] = LeaseTracker(
+                os.path.join(state_dir, STATE_FILE.format(iface=iface)),
+                [os.path.join(d, log_name) for d in log_dirs if d],
+                leases_path,
+            )
+        return _trackers[key]
+
+
+def log_time(line, now):
+    """Unix time of ``line``'s syslog prefix (local time, no year), or ``now``.
+
+    The year is the current one unless that puts the line more than a day
+    in the future, which means it was logged last year.
+    """
+    m = _STAMP_RE.match(line)
+    month = _MONTHS.get(m.group(1)) if m else None
+    if month is None:
+        return now
+    day, hour, minute, second = (int(g) for g in m.groups()[1:])
+    year = time.localtime(now).tm_year
+    try:
+        for y in (year, year - 1):
+            stamp = int(time.mktime((y, month, day, hour, minute, second, 0, 0, -1)))
+            if stamp <= now + 86400:
+                return min(stamp, now)
+    except (OverflowError, ValueError):
+        pass
+    return now
+
+
+def parse_leases(text):
+    """Parse a dnsmasq lease database into ``{mac: (ip, hostname, expires)}``."""
+    leases = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 4 or len(parts[1]) != 17:
+            # Short lines and non-Ethernet hardware addresses
+            continue
+        try:
+            expires = int(parts[0])
+        except ValueError:
+            continue
+        hostname = None if parts[3] == '*' else parts[3]
+        leases[parts[1].lower()] = (parts[2], hostname, expires)
+    return leases
+
+
+class LeaseTracker:
+    """MAC-keyed client table kept up to date from the leases and logs."""
+
+    def __init__(self, state_path, log_paths, leases_path=LEASES_FILE):
+        self.state_path = state_path
+        self.log_paths = list(log_paths)
+        self.leases_path = leases_path
+        self._lock = threading.Lock()
+        # mac -> {'mac', 'ip', 'hostname', 'seen', 'expires', 'manufacturer'}
+        self._clients = {}
+        # log path -> [inode, offset]
+        self._positions = {}
+        self._leases_stamp = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            for row in state.get('clients', []):
+                client = dict(zip(_FIELDS, row))
+                client['manufacturer'] = vendor(client['mac'])
+                self._clients[client['mac']] = client
+            self._positions = {
+                path: list(pos) for path, pos in state.get('logs', {}).items()
+            }
+        except (OSError, ValueError, TypeError, KeyError):
+            self._clients = {}
+            self._positions = {}
+
+    def _save(self):
+        state = {
+            'clients': [[c[f] for f in _FIELDS] for c in self._clients.values()],
+            'logs': self._positions,
+        }
+        tmp = self.state_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(state, f, separators=(',', ':'))
+            os.replace(tmp, self.state_path)
+        except OSError:
+            pass
+
+    def _update(self, mac, ip, hostname, seen, expires=None):
+        client = self._clients.get(mac)
+        if client is None:
+            client = self._clients[mac] = {
+                'mac': mac, 'ip': ip, 'hostname': hostname, 'seen': seen,
+                'expires': expires, 'manufacturer': vendor(mac),
+            }
+            return True
+        before = (client['ip'], client['hostname'], client['seen'], client['expires'])
+        # Replayed log lines can be older than what is already known
+        if seen >= (client['seen'] or 0):
+            client['ip'] = ip
+            client['hostname'] = hostname or client['hostname']
+            client['seen'] = seen
+        if expires is not None:
+            client['expires'] = expires
+        return before != (client['ip'], client['hostname'], client['seen'], client['expires'])
+
+    def _read_leases(self, now):
+        try:
+            st = os.stat(self.leases_path)
+        except OSError:
+            return False
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._leases_stamp:
+            return False
+        try:
+            with open(self.leases_path) as f:
+                leases = parse_leases(f.read())
+        except OSError:
+            return False
+        self._leases_stamp = stamp
+        changed = False
+        for mac, (ip, hostname, expires) in leases.items():
+            # An active lease means the client was seen at most one lease ago
+            changed |= self._update(mac, ip, hostname, now if expires > now or expires == 0 else expires, expires)
+        return changed
+
+    def _follow(self, path, restart, now):
+        """Parse what was appended to ``path``; returns (grew, changed)."""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self._positions.pop(path, None)
+            return False, False
+        with f:
+            st = os.fstat(f.fileno())
+            inode, offset = self._positions.get(path, (None, 0))
+            if restart or inode != st.st_ino or st.st_size < offset:
+                offset = 0
+            if st.st_size == offset:
+                self._positions[path] = [st.st_ino, offset]
+                return False, False
+            f.seek(offset)
+            pos, rest, changed = offset, b'', False
+            while pos < st.st_size:
+                chunk = f.read(min(READ_CHUNK, st.st_size - pos))
+                if not chunk:
+                    break
+                pos += len(chunk)
+                data = rest + chunk
+                # Carry a partial last line into the next chunk
+                end = data.rfind(b'\n') + 1
+                rest = data[end:]
+                if len(rest) > READ_CHUNK:
+                    # No line is this long; skip it
+                    rest = b''
+                changed |= self._parse_log(data[:end], now)
+        # Leave a partly written last line for the next read
+        done = pos - len(rest)
+        self._positions[path] = [st.st_ino, done]
+        return done > offset, changed
+
+    def _parse_log(self, data, now):
+        changed = False
+        for line in data.splitlines():
+            if b'DHCPACK' not in line:
+                continue
+            m = _ACK_RE.search(line)
+            if m:
+                hostname = m.group(3).decode('utf-8', 'replace') if m.group(3) else None
+                changed |= self._update(
+                    m.group(2).decode().lower(), m.group(1).decode(), hostname,
+                    log_time(line, now),
+                )
+        return changed
+
+    def clients(self):
+        """Current client table as a list of dicts (copies)."""
+        with self._lock:
+            now = int(time.time())
+            positions = json.dumps(self._positions, sort_keys=True)
+            changed = self._read_leases(now)
+            restart = False
+            for path in self.log_paths:
+                grew, log_changed = self._follow(path, restart, now)
+                changed |= log_changed
+                restart = restart or grew
+            cutoff = now - CLIENT_RETENTION
+            for mac in [m for m, c in self._clients.items() if (c['seen'] or 0) < cutoff]:
+                del self._clients[mac]
+                changed = True
+            if changed or positions != json.dumps(self._positions, sort_keys=True):
+                self._save()
+            return [dict(c) for c in self._clients.values()]
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python3 -m gateway_admin.leases <state.json> <log>... prints the table
+    for client in LeaseTracker(sys.argv[1], sys.argv[2:]).clients():
+        print(json.dumps(client, sort_keys=True))
@@ -0,0 +1,101 @@
+"""Fan live metrics samples out to Server-Sent Events subscribers.
+
+One background thread per web UI process watches the collector's live
+ring (``Config.METRICS_LIVE_PATH``) and pushes each new sample onto every
+subscriber's queue, so N open stats pages cost one mmap poll per second
+instead of N polling requests. The thread starts with the first
+subscriber and exits once the last one disconnects.
+
+Samples are identified by their timestamp (ms), which doubles as the SSE
+event id: a reconnecting ``EventSource`` sends it back as
+``Last-Event-ID`` and :meth:`LiveFeed.backfill` replays what it missed
+from the ring's tail.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from .metrics_store import RingStore, StoreError
+
+# How often the fan-out thread checks the ring for new samples, seconds.
+POLL_INTERVAL = 1.0
+# Per-subscriber backlog; a client that falls this far behind loses the
+# oldest samples rather than growing the queue without bound.
+QUEUE_SIZE = 120
+
+
+class LiveFeed:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='metrics-feed', daemon=True
+                )
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def backfill(self, since_ms):
+        """Return live samples newer than ``since_ms`` still in the ring."""
+        try:
+            with RingStore.open_readonly(self.path) as store:
+                return store.records(start_ms=since_ms + 1)
+        except (FileNotFoundError, StoreError):
+            return []
+
+    def _publish(self, record):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(record)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _run(self):
+        store = None
+        inode = None
+        last_time = None
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                try:
+                    st = os.stat(self.path)
+                    if store is None or st.st_ino != inode:
+                        # First poll, or the collector recreated the ring.
+                        if store is not None:
+                            store.close()
+                        store = RingStore.open_readonly(self.path)
+                        inode = st.st_ino
+                        if last_time is None:
+                            last_time = store.last_time() or 0
+                    for record in store.records(start_ms=last_time + 1):
+                        last_time = record['time']
+                        self._publish(record)
+                except (OSError, StoreError):
+                    pass
+                time.sleep(POLL_INTERVAL)
+        finally:
+            if store is not None:
+                store.close()
@@ -0,0 +1,867 @@
+"""Fixed-size, memory-mappable ring file for metrics samples.
+
+The collector used to append one JSON line per sample to
+``/var/lib/border0/metrics.log`` forever, which grew without bound on the
+SD card and forced every ``/stats/history`` call to ``json.loads`` the
+whole file. A ring file has a constant footprint, each write is a single
+in-place record update, and readers slice records straight out of the
+mapping without parsing text.
+
+On-disk layout (little endian)::
+
+    header   magic 'B0MR', version, ncols, capacity, data_offset,
+             names_len, written (total records ever appended)
+    names    comma-separated column names (utf-8)
+    data     ``capacity`` records of int64 time_ms + ncols float64
+
+The write cursor is ``written % capacity``. The record is written before
+the header counter is bumped, so a reader that snapshots ``written`` never
+sees a slot the writer has not finished. When the ring is full, the oldest
+slot is the one the writer overwrites next, so readers skip it.
+
+Missing values are stored as NaN and come back as ``None``.
+
+There is exactly one writer (the metrics collector); the web UI only ever
+opens stores read-only.
+
+A :class:`TieredSeries` groups one raw ring with coarser rollup rings
+(avg/min/max per bucket), and :func:`query` picks the tier that serves a
+time window within a point budget, so long windows stay cheap to read.
+"""
+
+import bisect
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'B0MR'
+VERSION = 1
+
+# magic, version, ncols, capacity, data_offset, names_len, written
+_HEADER = struct.Struct('<4sHHIIIQ')
+_WRITTEN_OFFSET = _HEADER.size - 8
+_TIME = struct.Struct('<q')
+# Keep the data region page-ish aligned so records never straddle the
+# header when the column list grows.
+_DATA_ALIGN = 64
+
+NAN = float('nan')
+
+# (name, bucket seconds, retention seconds), finest first. The first tier
+# holds samples as collected; the others hold one avg/min/max record per
+# bucket. Roughly 2.6 MB on disk for the five system columns.
+TIERS = (
+    ('raw', 15, 6 * 3600),
+    ('1m', 60, 48 * 3600),
+    ('5m', 300, 30 * 86400),
+    ('1h', 3600, 365 * 86400),
+)
+# Point budget /stats/history uses when the client does not send one.
+DEFAULT_POINTS = 1000
+
+
+class StoreError(Exception):
+    """Raised when a ring file is truncated or not a metrics ring."""
+
+
+def _record_struct(ncols):
+    return struct.Struct('<q' + 'd' * ncols)
+
+
+def _data_offset(names_len):
+    raw = _HEADER.size + names_len
+    return (raw + _DATA_ALIGN - 1) // _DATA_ALIGN * _DATA_ALIGN
+
+
+def _clean(value):
+    return None if value is None or math.isnan(value) else value
+
+
+def _as_record(columns, row):
+    return {'time': row[0], **dict(zip(columns, map(_clean, row[1:])))}
+
+
+class RingStore:
+    """A single ring file. Use :meth:`open` (writer) or :meth:`open_readonly`."""
+
+    def __init__(self, path, fd, mm, columns, capacity, data_offset, writable):
+        self.path = path
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self._fd = fd
+        self._mm = mm
+        self._data_offset = data_offset
+        self._record = _record_struct(len(self.columns))
+        self._writable = writable
+
+    # -- construction -----------------------------------------------------
+
+    @classmethod
+    def open(cls, path, columns, capacity):
+        """Open ``path`` for writing, creating or migrating it as needed.
+
+        If the existing file has a different column list or capacity its
+        records are carried over into a freshly preallocated file (columns
+        that no longer exist are dropped, new ones read back as ``None``).
+        """
+        columns = tuple(columns)
+        try:
+            existing = cls.open_readonly(path)
+        except FileNotFoundError:
+            existing = None
+        except StoreError:
+            # Corrupt or foreign file: start over rather than refuse to run.
+            existing = None
+        if existing is not None:
+            same = existing.columns == columns and existing.capacity == capacity
+            if same:
+                existing.close()
+                return cls._map(path, writable=True)
+            rows = existing.rows()
+            old_columns = existing.columns
+            existing.close()
+            cls._create(path, columns, capacity)
+            store = cls._map(path, writable=True)
+            index = {name: i for i, name in enumerate(old_columns)}
+            for row in rows[-(capacity - 1):]:
+                values = [
+                    row[index[c] + 1] if c in index else NAN for c in columns
+                ]
+                store._append_values(row[0], values)
+            return store
+        cls._create(path, columns, capacity)
+        return cls._map(path, writable=True)
+
+    @classmethod
+    def open_readonly(cls, path):
+        """Map an existing ring file read-only.
+
+        Raises ``FileNotFoundError`` when absent and ``StoreError`` when the
+        file is not a valid ring.
+        """
+        return cls._map(path, writable=False)
+
+    @staticmethod
+    def _create(path, columns, capacity):
+        if capacity < 2:
+            raise ValueError('capacity must be at least 2')
+        names = ','.join(columns).encode('utf-8')
+        data_offset = _data_offset(len(names))
+        size = data_offset + capacity * _record_struct(len(columns)).size
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.tmp.{os.getpid()}'
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Reserve the blocks up front so the footprint never changes.
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)
+            header = _HEADER.pack(
+                MAGIC, VERSION, len(columns), capacity, data_offset,
+                len(names), 0,
+            )
+            os.pwrite(fd, header + names, 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+
+    @classmethod
+    def _map(cls, path, writable):
+        flags = os.O_RDWR if writable else os.O_RDONLY
+        fd = os.open(path, flags)
+        try:
+            size = os.fstat(fd).st_size
+            if size < _HEADER.size:
+                raise StoreError(f'{path}: truncated header')
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            mm = mmap.mmap(fd, size, access=access)
+        except Exception:
+            os.close(fd)
+            raise
+        try:
+            magic, version, ncols, capacity, data_offset, names_len, _ = (
+                _HEADER.unpack_from(mm, 0)
+            )
+            if magic != MAGIC or version != VERSION:
+                raise StoreError(f'{path}: not a metrics ring file')
+            names = bytes(mm[_HEADER.size:_HEADER.size + names_len])
+            columns = names.decode('utf-8').split(',') if names else []
+            if len(columns) != ncols:
+                raise StoreError(f'{path}: column header mismatch')
+            expected = data_offset + capacity * _record_struct(ncols).size
+            if size < expected:
+                raise StoreError(f'{path}: truncated data region')
+        except Exception:
+            mm.close()
+            os.close(fd)
+            raise
+        return cls(path, fd, mm, columns, capacity, data_offset, writable)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- writing ----------------------------------------------------------
+
+    @property
+    def written(self):
+        return struct.unpack_from('<Q', self._mm, _WRITTEN_OFFSET)[0]
+
+    def append(self, time_ms, values):
+        """Append one sample. ``values`` maps column name to a number.
+
+        Returns False if the sample was dropped for being older than the
+        last record.
+        """
+        row = []
+        for name in self.columns:
+            v = values.get(name)
+            row.append(NAN if v is None else float(v))
+        return self._append_values(int(time_ms), row)
+
+    def _append_values(self, time_ms, row):
+        if not self._writable:
+            raise StoreError(f'{self.path}: opened read-only')
+        written = self.written
+        # Readers binary-search on time, so keep the ring sorted. The Pi has
+        # no RTC: after a reboot fake-hwclock can restore a time earlier than
+        # the last sample until NTP catches up; drop those samples.
+        if written and time_ms < self._time_at(written - 1):
+            return False
+        slot = written % self.capacity
+        offset = self._data_offset + slot * self._record.size
+        self._record.pack_into(self._mm, offset, time_ms, *row)
+        struct.pack_into('<Q', self._mm, _WRITTEN_OFFSET, written + 1)
+        return True
+
+    def flush(self):
+        self._mm.flush()
+
+    # -- reading ----------------------------------------------------------
+
+    def _visible(self):
+        """Return (first_logical_index, count) of the readable records."""
+        written = self.written
+        # When full, the oldest slot is the one being overwritten next.
+        count = min(written, self.capacity - 1)
+        return written - count, count
+
+    def __len__(self):
+        return self._visible()[1]
+
+    def last_time(self):
+        first, count = self._visible()
+        if not count:
+            return None
+        return self._time_at(first + count - 1)
+
+    def _iter_range(self, first, count):
+        """Yield raw record tuples for logical indices [first, first+count)."""
+        rs = self._record.size
+        start = first % self.capacity
+        head = min(count, self.capacity - start)
+        base = self._data_offset
+        segments = [(start, head)]
+        if count > head:
+            segments.append((0, count - head))
+        for slot, n in segments:
+            lo = base + slot * rs
+            yield from self._record.iter_unpack(self._mm[lo:lo + n * rs])
+
+    def _time_at(self, index):
+        slot = index % self.capacity
+        return _TIME.unpack_from(
+            self._mm, self._data_offset + slot * self._record.size
+        )[0]
+
+    def _bisect(self, first, count, time_ms):
+        """Return the first logical index in the visible range whose time
+        is >= ``time_ms`` (``first + count`` if there is none).
+
+        Records are in append order and the collector appends in time
+        order, so a binary search over the fixed-size slots finds the
+        window edge with O(log n) timestamp reads and no decoding.
+        """
+        lo, hi = first, first + count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time_at(mid) < time_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, start_ms=None, end_ms=None):
+        """Return raw ``(time_ms, v1, v2, ...)`` tuples, oldest first.
+
+        Only the records inside ``[start_ms, end_ms]`` are unpacked.
+        """
+        first, count = self._visible()
+        lo, hi = first, first + count
+        if start_ms is not None:
+            lo = self._bisect(first, count, start_ms)
+        if end_ms is not None:
+            hi = self._bisect(lo, hi - lo, end_ms + 1)
+        if hi <= lo:
+            return []
+        return list(self._iter_range(lo, hi - lo))
+
+    def records(self, start_ms=None, end_ms=None):
+        """Return samples as ``{'time': ms, column: value}`` dicts."""
+        return self.as_records(self.rows(start_ms, end_ms))
+
+    def as_records(self, rows):
+        """Turn rows from :meth:`rows` into ``{'time': ms, ...}`` dicts."""
+        columns = self.columns
+        return [_as_record(columns, row) for row in rows]
+
+
+def import_jsonl(log_path, store):
+    """Copy samples from a legacy JSON-lines metrics log into ``store``.
+
+    Only records newer than the store's last sample are imported, so
+    running the conversion twice is harmless. Returns the number of
+    records written.
+    """
+    last = store.last_time()
+    imported = 0
+    with open(log_path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(rec, dict):
+                continue
+            t = rec.get('time')
+            if not isinstance(t, (int, float)):
+                continue
+            if last is not None and t <= last:
+                continue
+            try:
+                store.append(t, rec)
+            except (TypeError, ValueError):
+                continue
+            last = t
+            imported += 1
+    return imported
+
+
+def import_ring(path, store):
+    """Copy samples from a standalone ring file (pre-tier layout) into
+    ``store``. Like :func:`import_jsonl`, only newer records are copied.
+    """
+    last = store.last_time()
+    imported = 0
+    with RingStore.open_readonly(path) as old:
+        columns = old.columns
+        for row in old.rows(start_ms=None if last is None else last + 1):
+            store.append(row[0], dict(zip(columns, row[1:])))
+            imported += 1
+    return imported
+
+
+def read_latest(path):
+    """Return the newest record of the ring at ``path``, or ``None``.
+
+    Used on the web side to read the collector's live ring without doing
+    any sampling work in the request.
+    """
+    try:
+        with RingStore.open_readonly(path) as store:
+            first, count = store._visible()
+            if not count:
+                return None
+            row = next(store._iter_range(first + count - 1, 1))
+            return _as_record(store.columns, row)
+    except (FileNotFoundError, StoreError):
+        return None
+
+
+def sync_ring(src_path, dst_path):
+    """Bring the ring at ``dst_path`` up to date with ``src_path``.
+
+    Used to persist rings kept on tmpfs. When both files have the same
+    layout only the slots appended since ``dst_path`` was last synced and
+    the header counter are rewritten, so a sync costs a few records
+    rather than the whole file; otherwise the file is copied in full.
+    Returns the number of bytes written.
+    """
+    with RingStore.open_readonly(src_path) as src:
+        written = src.written
+        size = src._data_offset + src.capacity * src._record.size
+        try:
+            with open(dst_path, 'rb') as f:
+                dst_header = f.read(src._data_offset)
+        except FileNotFoundError:
+            dst_header = b''
+        same = (
+            len(dst_header) == src._data_offset
+            and os.path.getsize(dst_path) == size
+            and dst_header[:_WRITTEN_OFFSET] == bytes(src._mm[:_WRITTEN_OFFSET])
+            and dst_header[_HEADER.size:] == bytes(src._mm[_HEADER.size:src._data_offset])
+        )
+        synced = struct.unpack_from('<Q', dst_header, _WRITTEN_OFFSET)[0] if same else 0
+        if not same or synced > written:
+            tmp = f'{dst_path}.tmp.{os.getpid()}'
+            os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(src._mm[:size])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, dst_path)
+            return size
+        if synced == written:
+            return 0
+        count = min(written - synced, src.capacity)
+        rs = src._record.size
+        start = (written - count) % src.capacity
+        head = min(count, src.capacity - start)
+        segments = [(start, head)]
+        if count > head:
+            segments.append((0, count - head))
+        total = 0
+        fd = os.open(dst_path, os.O_WRONLY)
+        try:
+            for slot, n in segments:
+                lo = src._data_offset + slot * rs
+                total += os.pwrite(fd, src._mm[lo:lo + n * rs], lo)
+            # Records first, then the counter, as in _append_values
+            total += os.pwrite(fd, struct.pack('<Q', written), _WRITTEN_OFFSET)
+            os.fdatasync(fd)
+        finally:
+            os.close(fd)
+        return total
+
+
+def remove_series(directory, series, keep=()):
+    """Delete the ring files of ``series`` except the tiers in ``keep``."""
+    prefix = series + '.'
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if (name.startswith(prefix) and name.endswith('.ring')
+                and name[len(prefix):-len('.ring')] not in keep):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def tier_path(directory, series, tier):
+    return os.path.join(directory, f'{series}.{tier}.ring')
+
+
+# Per-interface series are named ``iface-<name>`` and hold per-second
+# rates; ``interfaces.json`` next to them maps each interface the collector
+# has seen to its role (wan, lan, vpn, loopback or other) and the hour it
+# was last seen. Interfaces come and go (veth, tun, USB tethering), so
+# their tiers are kept short, 6 h raw and 7 days at 5 min, about 0.5 MB
+# each, and an interface gone for IFACE_EXPIRY seconds is dropped with its
+# series.
+IFACE_PREFIX = 'iface-'
+IFACE_COLUMNS = (
+    'bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+    'errin', 'errout', 'dropin', 'dropout',
+)
+IFACE_TIERS = (
+    ('raw', 15, 6 * 3600),
+    ('5m', 300, 7 * 86400),
+)
+IFACE_EXPIRY = 86400
+INTERFACES_FILE = 'interfaces.json'
+
+
+def iface_series(iface):
+    return IFACE_PREFIX + iface
+
+
+def read_interfaces(directory):
+    """Return ``{iface: {'role': ...}}`` as last written by the collector."""
+    try:
+        with open(os.path.join(directory, INTERFACES_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_interfaces(directory, interfaces):
+    path = os.path.join(directory, INTERFACES_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(interfaces, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# Per-LAN-client series are named ``client-<mac without colons>`` and hold
+# per-second rates from the collector's nftables accounting sets (see
+# gateway_admin/lan_accounting.py). With a few hundred clients per LAN the
+# tiers are kept short: 6 h at 1 min and 7 days at 1 h, about 31 KB each.
+# ``clients.json`` maps each MAC to its last IP, latest rates and byte
+# totals.
+CLIENT_PREFIX = 'client-'
+CLIENT_COLUMNS = ('bytes_up', 'bytes_down', 'packets_up', 'packets_down')
+CLIENT_TIERS = (
+    ('raw', 60, 6 * 3600),
+    ('1h', 3600, 7 * 86400),
+)
+CLIENTS_FILE = 'clients.json'
+
+
+def client_series(mac):
+    return CLIENT_PREFIX + mac.replace(':', '').lower()
+
+
+def read_clients(directory):
+    """Return ``{mac: {...}}`` as last written by the collector."""
+    try:
+        with open(os.path.join(directory, CLIENTS_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_clients(directory, clients):
+    path = os.path.join(directory, CLIENTS_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(clients, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def top_clients(directory, limit=10):
+    """Clients ordered by their current up+down byte rate, busiest first."""
+    clients = [
+        dict(info, mac=mac) for mac, info in read_clients(directory).items()
+    ]
+    clients.sort(
+        key=lambda c: (c.get('rate_up') or 0) + (c.get('rate_down') or 0),
+        reverse=True,
+    )
+    return clients[:limit]
+
+
+# Per-service process series are named ``proc-<group>`` and hold the summed
+# resource use of the processes in each group's systemd units (see
+# gateway_admin/process_metrics.py). cpu is percent of one core,
+# ctx_switches is per second.
+PROC_PREFIX = 'proc-'
+PROC_GROUPS = ('border0', 'hostapd', 'dnsmasq', 'webui')
+PROC_COLUMNS = ('cpu', 'rss', 'threads', 'fds', 'ctx_switches', 'procs')
+
+
+def proc_series(group):
+    return PROC_PREFIX + group
+
+
+# Path probe series are named ``probe-<target>`` (gateway, public, exit);
+# one record per probe round, RTTs and jitter in ms, loss in percent (see
+# gateway_admin/probes.py). A round runs every 30 s, so the raw tier's
+# bucket is the probe interval rather than the system sample interval,
+# which would leave every other raw slot empty.
+PROBE_PREFIX = 'probe-'
+PROBE_COLUMNS = ('rtt_min', 'rtt_p50', 'rtt_p90', 'rtt_max', 'jitter', 'loss')
+PROBE_TIERS = (
+    ('raw', 30, 24 * 3600),
+    ('5m', 300, 30 * 86400),
+    ('1h', 3600, 365 * 86400),
+)
+
+
+def probe_series(target):
+    return PROBE_PREFIX + target
+
+
+# Burst mode: while a request written by the web UI is pending, the
+# collector samples every BURST_INTERVAL seconds into a separate ring on
+# tmpfs that keeps BURST_RETENTION seconds.
+BURST_INTERVAL = 1
+BURST_RETENTION = 30 * 60
+BURST_MAX_MINUTES = BURST_RETENTION // 60
+
+
+def read_burst(path):
+    """Return when the requested burst ends (epoch seconds), 0 if none."""
+    try:
+        with open(path) as f:
+            until = json.load(f).get('until', 0)
+    except (OSError, ValueError, AttributeError):
+        return 0
+    return until if isinstance(until, (int, float)) else 0
+
+
+def write_burst(path, until):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'until': until}, f)
+    os.replace(tmp, path)
+
+
+def rollup_columns(columns):
+    """Column layout of a rollup ring: ``col`` (avg), ``col_min``, ``col_max``."""
+    out = []
+    for name in columns:
+        out.extend((name, f'{name}_min', f'{name}_max'))
+    return tuple(out)
+
+
+class _Rollup:
+    """Accumulates raw rows into fixed buckets and emits one record each."""
+
+    def __init__(self, store, bucket_ms, ncols):
+        self.store = store
+        self.bucket_ms = bucket_ms
+        self._ncols = ncols
+        self._key = None
+        self._reset()
+
+    def _reset(self):
+        n = self._ncols
+        self._count = [0] * n
+        self._sum = [0.0] * n
+        self._min = [NAN] * n
+        self._max = [NAN] * n
+
+    def feed(self, time_ms, row):
+        key = time_ms // self.bucket_ms
+        if self._key is not None and key != self._key:
+            self._emit()
+        self._key = key
+        for i, v in enumerate(row):
+            if math.isnan(v):
+                continue
+            if self._count[i]:
+                self._min[i] = min(self._min[i], v)
+                self._max[i] = max(self._max[i], v)
+            else:
+                self._min[i] = self._max[i] = v
+            self._count[i] += 1
+            self._sum[i] += v
+
+    def _emit(self):
+        flat = []
+        for i in range(self._ncols):
+            n = self._count[i]
+            flat.extend((
+                self._sum[i] / n if n else NAN, self._min[i], self._max[i],
+            ))
+        self.store._append_values(self._key * self.bucket_ms, flat)
+        self._reset()
+
+
+class TieredSeries:
+    """Writer for one metric series: a raw ring plus its rollup rings.
+
+    Files live at ``<directory>/<name>.<tier>.ring``. On open, raw samples
+    newer than each rollup's last bucket are replayed so a collector
+    restart does not lose the partially filled buckets.
+    """
+
+    def __init__(self, directory, name, columns, tiers=TIERS):
+        self.name = name
+        self.columns = tuple(columns)
+        raw_name, raw_bucket, raw_retention = tiers[0]
+        self.raw = RingStore.open(
+            tier_path(directory, name, raw_name), self.columns,
+            raw_retention // raw_bucket,
+        )
+        self._rollups = []
+        for tier_name, bucket, retention in tiers[1:]:
+            store = RingStore.open(
+                tier_path(directory, name, tier_name),
+                rollup_columns(self.columns), retention // bucket,
+            )
+            rollup = _Rollup(store, bucket * 1000, len(self.columns))
+            last = store.last_time()
+            since = None if last is None else last + rollup.bucket_ms
+            for row in self.raw.rows(start_ms=since):
+                rollup.feed(row[0], row[1:])
+            self._rollups.append(rollup)
+
+    def last_time(self):
+        return self.raw.last_time()
+
+    def append(self, time_ms, values):
+        time_ms = int(time_ms)
+        row = []
+        for name in self.columns:
+            v = values.get(name)
+            row.append(NAN if v is None else float(v))
+        if not self.raw._append_values(time_ms, row):
+            return
+        for rollup in self._rollups:
+            rollup.feed(time_ms, row)
+
+    def flush(self):
+        self.raw.flush()
+        for rollup in self._rollups:
+            rollup.store.flush()
+
+    def close(self):
+        self.raw.close()
+        for rollup in self._rollups:
+            rollup.store.close()
+
+
+def select_tier(span_ms, points, tiers=TIERS):
+    """Pick the finest tier that retains ``span_ms`` within ``points``.
+
+    Falls back to the coarsest tier when nothing fits the budget.
+    """
+    for name, bucket, retention in tiers:
+        if retention * 1000 < span_ms:
+            continue
+        if span_ms / (bucket * 1000) <= points:
+            return name
+    return tiers[-1][0]
+
+
+def open_tier(directory, series, span_ms, points=DEFAULT_POINTS, tiers=TIERS):
+    """Open the ring :func:`select_tier` picks for a window read-only.
+
+    Returns ``(tier_name, bucket_seconds, store)``; the caller closes the
+    store. Raises ``FileNotFoundError`` when the series has not been
+    written yet.
+    """
+    tier = select_tier(max(span_ms, 0), points, tiers)
+    bucket = next(b for name, b, _ in tiers if name == tier)
+    store = RingStore.open_readonly(tier_path(directory, series, tier))
+    return tier, bucket, store
+
+
+def query(directory, series, start_ms, end_ms=None, points=DEFAULT_POINTS,
+          tiers=TIERS):
+    """Read ``series`` between ``start_ms`` and ``end_ms`` from the tier
+    :func:`select_tier` picks. Returns ``(tier_name, records)``.
+
+    Raises ``FileNotFoundError`` when the series has not been written yet.
+    """
+    end = end_ms if end_ms is not None else int(time.time() * 1000)
+    tier, _, store = open_tier(directory, series, end - start_ms, points, tiers)
+    with store:
+        return tier, store.records(start_ms, end_ms)
+
+
+def lttb(times, values, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that
+    keep the visual shape of ``values`` over ``times``.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the next bucket's average, so isolated spikes survive.
+    NaN values never win a bucket. A bucket with nothing but NaN keeps its
+    first point so the gap stays visible, and the buckets after it are
+    anchored on the last finite point kept.
+
+    Only the choice of anchor is sequential: bucket averages come from
+    prefix sums, and each bucket's areas from one comprehension over
+    slices of the finite points.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    # Bucket i covers [edges[i], edges[i + 1]); the point after the last
+    # bucket stands in as the final "next bucket"
+    edges = [int(i * every) + 1 for i in range(threshold - 1)] + [n]
+    edges[-2] = n - 1
+    finite = [j for j, v in enumerate(values) if v == v]
+    if not finite:
+        return [0] + edges[:-1]
+    # Times relative to the first point keep the prefix sums exact
+    t0 = times[0]
+    if len(finite) == n:
+        ft = [t - t0 for t in times]
+        fy = list(values)
+        starts = edges
+    else:
+        ft = [times[j] - t0 for j in finite]
+        fy = [values[j] for j in finite]
+        starts = [bisect.bisect_left(finite, edge) for edge in edges]
+    sum_t = list(itertools.accumulate(ft, initial=0))
+    sum_y = list(itertools.accumulate(fy, initial=0.0))
+    kept = [0]
+    ax, ay = ft[0], fy[0]
+    for i in range(threshold - 2):
+        lo, hi, nhi = starts[i], starts[i + 1], starts[i + 2]
+        if lo == hi:
+            kept.append(edges[i])
+            continue
+        if nhi > hi:
+            avg_t = (sum_t[nhi] - sum_t[hi]) / (nhi - hi)
+            avg_y = (sum_y[nhi] - sum_y[hi]) / (nhi - hi)
+        else:
+            avg_t, avg_y = ft[-1], fy[-1]
+        # |(ax - avg_t) * (y - ay) - (ax - t) * (avg_y - ay)|, expanded
+        dx = ax - avg_t
+        dy = avg_y - ay
+        c = -dx * ay - dy * ax
+        areas = [abs(dx * y + dy * t + c) for t, y in zip(ft[lo:hi], fy[lo:hi])]
+        best = lo + areas.index(max(areas))
+        kept.append(finite[best])
+        ax, ay = ft[best], fy[best]
+    kept.append(n - 1)
+    return kept
+
+
+def downsample(columns, rows, points):
+    """Reduce ``rows`` to at most ~``points`` with LTTB on each metric.
+
+    Every averaged metric (not the ``_min``/``_max`` companions of a rollup
+    tier) gets an equal share of the budget, and the union of the picked
+    rows is returned so all charts keep one shared time axis. Works on the
+    transposed columns rather than per row.
+    """
+    if len(rows) <= points:
+        return rows
+    primary = [
+        i for i, name in enumerate(columns, 1)
+        if not name.endswith(('_min', '_max'))
+    ]
+    share = max(points // max(len(primary), 1), 3)
+    transposed = list(zip(*rows))
+    times = transposed[0]
+    keep = set()
+    for i in primary:
+        keep.update(lttb(times, transposed[i], share))
+    return [rows[i] for i in sorted(keep)]
+
+
+def columnar(columns, rows, precision=2):
+    """Encode rows as ``{'time': [...], column: [...]}``.
+
+    ``time`` is delta-encoded (first value absolute, then the gap to the
+    previous sample) and values are rounded to ``precision`` decimals, so
+    the JSON does not repeat field names or carry float noise per sample.
+    """
+    if not rows:
+        return dict({'time': []}, **{name: [] for name in columns})
+    transposed = list(zip(*rows))
+    times = transposed[0]
+    out = {'time': [times[0]] + [b - a for a, b in zip(times, times[1:])]}
+    for name, values in zip(columns, transposed[1:]):
+        out[name] = [
+            None if math.isnan(v) else round(v, precision) for v in values
+        ]
+    return out
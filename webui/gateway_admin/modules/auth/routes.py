@@ -4,7 +4,6 @@ from flask_login import login_user, logout_user, login_required, current_user, U
 from ...config import Config
 import os
 import re
-import json
 import uuid
 import glob
 import shutil
@@ -20,6 +19,10 @@ import urllib.request
 from ...extensions import login_manager
 from ... import auth_mode
 from ... import image_version
+from ... import runner
+from ... import state_files
+from ... import systemd
+from ... import telemetry
 from ...auth_mode import ANONYMOUS_USER_ID
 # Endpoints that must remain reachable even when the session is being
 # torn down by a mode change, so the user can finish the redirect chain
@@ -31,10 +34,20 @@ _AUTH_FLOW_ENDPOINTS = frozenset({
     'auth.logout',
     'static',
 })
+# Endpoints with their own authentication that never use a browser
+# session; the session hooks leave them alone so scrapers don't get
+# anonymous sessions and cookies.
+_SESSIONLESS_ENDPOINTS = frozenset({
+    'metrics.export',
+})
 
 # map login_id to Border0 CLI subprocess for ongoing login flows
 pending_logins = {}
 pending_lock = threading.Lock()
+telemetry.register_gauge(
+    'border0_webui_pending_logins', 'SSO login flows waiting for the browser',
+    lambda: len(pending_logins),
+)
 LOGIN_FLOW_TTL = 300  # seconds to keep pending login flows before cleanup
 # Web-UI SSO flows run the CLI with HOME pointed at a per-flow tempdir so the
 # CLI writes its client_token there (HOME/.border0/client_token) instead of
@@ -187,7 +200,7 @@ def apply_auth_mode():
     # for those, and don't touch static-asset requests — both would
     # cause spurious Set-Cookie churn.
     endpoint = request.endpoint
-    if endpoint is None or endpoint == 'static':
+    if endpoint is None or endpoint == 'static' or endpoint in _SESSIONLESS_ENDPOINTS:
         return None
 
     mode = auth_mode.current_mode()
@@ -244,10 +257,9 @@ def enforce_single_session():
         return None
     # Invalidate sessions when a new login (token refresh) occurs elsewhere
     if current_user.is_authenticated:
-        meta_file = current_app.config.get('BORDER0_TOKEN_METADATA_PATH')
-        if meta_file and os.path.isfile(meta_file):
+        data = state_files.token_metadata()
+        if isinstance(data, dict):
             try:
-                data = json.loads(open(meta_file).read())
                 # Expire if token was refreshed elsewhere
                 server_iat = data.get('iat')
                 if server_iat and session.get('token_iat') != server_iat:
@@ -338,18 +350,8 @@ def login():
     login_id = request.values.get('login_id') or uuid.uuid4().hex
 
     # Determine if organization is locked via existing org file
-    org_file = current_app.config.get('BORDER0_ORG_PATH')
-    org_saved = None
-    locked = False
-    if os.path.isfile(org_file):
-        try:
-            content = open(org_file).read().strip()
-            data = json.loads(content)
-            org_saved = data.get('org_subdomain') or None
-        except Exception:
-            org_saved = content
-        if org_saved:
-            locked = True
+    org_saved = state_files.org().get('org_subdomain') or None
+    locked = bool(org_saved)
     # Initial org value: use saved if locked
     org = org_saved if locked else None
     token_file = current_app.config.get('BORDER0_TOKEN_PATH')
@@ -370,7 +372,7 @@ def login():
                 flash('Please enter an organization name to log into.', 'danger')
             else:
                 try:
-                    subprocess.run(['pkill', '-f', f"{Config.BORDER0_CLI_PATH} client login"], check=False)
+                    runner.run(['pkill', '-f', f"{Config.BORDER0_CLI_PATH} client login"])
                 except Exception:
                     pass
 
@@ -386,7 +388,7 @@ def login():
                         'HOME': flow_home,
                         'USER': 'root',
                     })
-                    proc = subprocess.Popen(
+                    proc = runner.spawn(
                         [Config.BORDER0_CLI_PATH, 'client', 'login', '--org', org],
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT,
@@ -469,11 +471,10 @@ def login():
 
         else:
             try:
-                token_str = open(token_file).read().strip()
-                parts = token_str.split('.')
-                if len(parts) >= 2:
-                    padding = '=' * (-len(parts[1]) % 4)
-                    payload = json.loads(base64.urlsafe_b64decode(parts[1] + padding))
+                payload = state_files.read(token_file, 'jwt')
+                if payload is None:
+                    flash('Failed to authenticate: no valid client token', 'danger')
+                else:
                     user_id = payload.get('user_email') or payload.get('sub')
                     if user_id:
                         user = User(user_id)
@@ -487,17 +488,13 @@ def login():
                         # persist org_id/subdomain and token metadata for UI display
                         org_path = current_app.config.get('BORDER0_ORG_PATH')
                         try:
-                            os.makedirs(os.path.dirname(org_path), exist_ok=True)
                             if payload.get('org_id') and payload.get('org_subdomain') and not os.path.isfile(org_path):
-                                with open(org_path, 'w') as f:
-                                    json.dump({'org_subdomain': payload.get('org_subdomain'), 'org_id': payload.get('org_id')}, f)
+                                state_files.write(org_path, {'org_subdomain': payload.get('org_subdomain'), 'org_id': payload.get('org_id')}, 'org')
                         except Exception:
                             pass
                         meta_path = current_app.config.get('BORDER0_TOKEN_METADATA_PATH')
                         try:
-                            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
-                            with open(meta_path, 'w') as mf:
-                                json.dump(payload, mf)
+                            state_files.write(meta_path, payload, 'json', perms=0o600)
                         except Exception:
                             pass
                         return redirect(request.args.get('next') or url_for('home.index'))
@@ -579,11 +576,9 @@ def login_callback():
 
     real_token = current_app.config.get('BORDER0_TOKEN_PATH')
     try:
-        token_str = open(flow_token).read().strip()
-        parts = token_str.split('.')
-        if len(parts) >= 2:
-            padding = '=' * (-len(parts[1]) % 4)
-            payload = json.loads(base64.urlsafe_b64decode(parts[1] + padding))
+        with open(flow_token) as f:
+            payload = state_files.parse_jwt(f.read())
+        if payload:
             user_id = payload.get('user_email') or payload.get('sub')
             if user_id:
                 user = User(user_id)
@@ -616,28 +611,21 @@ def login_callback():
                         )
                 if provisioned:
                     try:
-                        subprocess.run(
-                            ['systemctl', 'restart', 'border0-device'],
-                            check=False,
-                        )
+                        systemd.restart('border0-device')
                     except Exception:
                         pass
 
                 org_path = current_app.config.get('BORDER0_ORG_PATH')
                 try:
-                    os.makedirs(os.path.dirname(org_path), exist_ok=True)
                     if payload.get('org_id') and payload.get('org_subdomain') and not os.path.isfile(org_path):
-                        with open(org_path, 'w') as f:
-                            json.dump({'org_subdomain': payload.get('org_subdomain'), 'org_id': payload.get('org_id')}, f)
+                        state_files.write(org_path, {'org_subdomain': payload.get('org_subdomain'), 'org_id': payload.get('org_id')}, 'org')
                 except Exception:
                     pass
                 meta_path = current_app.config.get('BORDER0_TOKEN_METADATA_PATH')
                 try:
-                    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
                     meta = payload.copy()
                     meta['device_id'] = device_id
-                    with open(meta_path, 'w') as mf:
-                        json.dump(meta, mf)
+                    state_files.write(meta_path, meta, 'json', perms=0o600)
                     breadcrumb_path = '/etc/border0/first_login_done'
                     try:
                         if not os.path.exists(breadcrumb_path):
@@ -684,14 +672,12 @@ def logout():
         session.clear()
         flash('You have been logged out.', 'info')
         return redirect(url_for('auth.login'))
-    token_file = current_app.config.get('BORDER0_TOKEN_PATH')
     meta_file = current_app.config.get('BORDER0_TOKEN_METADATA_PATH')
+    payload = state_files.token_metadata()
     token_exists = os.path.isfile(meta_file)
     token_info = None
-    if token_exists:
+    if isinstance(payload, dict):
         try:
-            with open(meta_file) as mf:
-                payload = json.load(mf)
             exp_ts = payload.get('exp')
             exp = None
             if isinstance(exp_ts, (int, float)):
@@ -715,7 +701,7 @@ def logout():
     # token_file is owned by the operator (e.g. an E2E service-account token)
     # and must survive a UI logout so border0 CLI keeps working.
     try:
-        os.remove(meta_file)
+        state_files.remove(meta_file)
     except Exception:
         pass
     flash('You have been logged out.', 'info')
@@ -827,7 +813,7 @@ def system():
         # Reboot
         if action == 'reboot':
             try:
-                subprocess.run(['systemctl', 'reboot'], check=False)
+                runner.run(['systemctl', 'reboot'])
                 flash('Rebooting system...', 'info')
             except Exception as e:
                 flash(f'Failed to reboot system: {e}', 'danger')
@@ -835,12 +821,9 @@ def system():
         # Check for updates
         if action == 'check_update':
             cli = current_app.config.get('BORDER0_CLI_PATH', 'border0')
-            cache_dir = '/etc/border0'
-            cache_file = os.path.join(cache_dir, 'version_cache.json')
-            os.makedirs(cache_dir, exist_ok=True)
             # Get current version
             try:
-                out = subprocess.check_output([cli, '--version'], stderr=subprocess.STDOUT, text=True, timeout=30)
+                out = runner.run([cli, '--version'], check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
                 m = re.search(r'version:\s*(v\S+)', out)
                 current_version = m.group(1) if m else 'unknown'
             except Exception as e:
@@ -860,10 +843,7 @@ def system():
                 'new_version': latest
             }
             try:
-                tmp = cache_file + '.tmp'
-                with open(tmp, 'w') as f:
-                    json.dump(cache, f)
-                os.replace(tmp, cache_file)
+                state_files.write(current_app.config.get('VERSION_CACHE_PATH'), cache, 'json')
             except Exception as e:
                 flash(f'Failed to write version cache: {e}', 'warning')
             if update_available:
@@ -880,21 +860,18 @@ def system():
                 current_app.config.get('LAN_IFACE_PATH'),
                 current_app.config.get('BORDER0_TOKEN_PATH'),
                 current_app.config.get('BORDER0_ORG_PATH'),
-                '/etc/border0/version_cache.json'
+                current_app.config.get('VERSION_CACHE_PATH'),
             ]
             # Remove files
             for p in paths:
                 try:
-                    if p and os.path.isfile(p):
-                        os.remove(p)
+                    if p:
+                        state_files.remove(p)
                 except Exception as e:
                     errors.append(str(e))
             # Remove device state file
             try:
-                token_path = current_app.config.get('BORDER0_TOKEN_PATH')
-                state_file = os.path.join(os.path.dirname(token_path or ''), 'device.state.yaml')
-                if state_file and os.path.isfile(state_file):
-                    os.remove(state_file)
+                state_files.remove(state_files.device_state_path())
             except Exception as e:
                 errors.append(str(e))
             # Clean interface configs and hostapd
@@ -915,11 +892,11 @@ def system():
                 shutil.copy(file, f'/etc/hostapd/{os.path.basename(file)}')
             # Sync and reboot
             try:
-                subprocess.run(['sync'], check=False)
+                runner.run(['sync'])
             except Exception:
                 pass
             try:
-                subprocess.run(['systemctl', 'reboot'], check=False)
+                runner.run(['systemctl', 'reboot'])
             except Exception as e:
                 flash(f'Failed to reboot system: {e}', 'danger')
 
@@ -966,18 +943,10 @@ def system():
     except Exception:
         uptime_str = 'Unavailable'
     # Load version cache
-    cache_file = os.path.join('/etc/border0', 'version_cache.json')
-    current_version = 'unknown'
-    update_available = False
-    new_version = None
-    try:
-        with open(cache_file) as f:
-            data = json.load(f)
-            current_version = data.get('current_version', current_version)
-            update_available = data.get('update_available', False)
-            new_version = data.get('new_version')
-    except Exception:
-        pass
+    data = state_files.version_cache()
+    current_version = data.get('current_version', 'unknown')
+    update_available = data.get('update_available', False)
+    new_version = data.get('new_version')
 
     ssh_keys = []
     ssh_dir = os.path.expanduser('~/.ssh')
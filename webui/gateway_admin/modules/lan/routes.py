@@ -1,11 +1,9 @@
 import os
 import re
 import ipaddress
-import subprocess
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, abort
 from flask_login import login_required
-import socket
-import psutil
+from ... import netlink, runner, state_files, systemd
 
 lan_bp = Blueprint('lan', __name__, url_prefix='/lan')
 
@@ -55,13 +53,7 @@ def index():
     # Discover LAN interfaces: only ethX or wlanX, excluding selected WAN
     net_dir = '/sys/class/net'
     interfaces = []
-    wan_iface = None
-    wan_iface_path = current_app.config.get('WAN_IFACE_PATH')
-    try:
-        with open(wan_iface_path) as f:
-            wan_iface = f.read().strip()
-    except Exception:
-        wan_iface = None
+    wan_iface = state_files.wan_iface()
     if os.path.isdir(net_dir):
         for iface in sorted(os.listdir(net_dir)):
             # only physical ethX or wlanX
@@ -75,11 +67,7 @@ def index():
     current_iface = None
     static_cfg = DEFAULT_LAN_STATIC_CFG.copy()
     lan_iface_path = current_app.config.get('LAN_IFACE_PATH')
-    try:
-        with open(lan_iface_path) as f:
-            current_iface = f.read().strip()
-    except Exception:
-        current_iface = None
+    current_iface = state_files.lan_iface()
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -90,8 +78,8 @@ def index():
                 flash('Invalid interface selected for LAN', 'warning')
                 return redirect(url_for('lan.index'))
             try:
-                subprocess.run(['ifdown', iface], capture_output=True, text=True, timeout=10)
-                subprocess.run(['ifup', iface], capture_output=True, text=True, timeout=10)
+                runner.run(['ifdown', iface], timeout=10)
+                runner.run(['ifup', iface], timeout=10)
                 flash(f'LAN interface {iface} restarted', 'success')
             except Exception as e:
                 flash(f'Failed to restart LAN interface: {e}', 'danger')
@@ -147,14 +135,12 @@ def index():
             content = render_template(template_name, **context)
             with open(cfg_file, 'w') as f:
                 f.write(content)
-            os.makedirs(os.path.dirname(lan_iface_path), exist_ok=True)
-            with open(lan_iface_path, 'w') as f:
-                f.write(iface + '\n')
+            state_files.write(lan_iface_path, iface + '\n')
             flash(f'LAN interface {iface} configured statically', 'success')
             # Automatically restart the LAN interface
             try:
-                subprocess.run(['ifdown', iface], capture_output=True, text=True, timeout=10)
-                subprocess.run(['ifup', iface], capture_output=True, text=True, timeout=10)
+                runner.run(['ifdown', iface], timeout=10)
+                runner.run(['ifup', iface], timeout=10)
                 flash(f'LAN interface {iface} restarted', 'success')
             except Exception as e:
                 flash(f'Failed to restart LAN interface: {e}', 'danger')
@@ -193,21 +179,16 @@ def index():
         static_cfg['prefix'] = 24
 
     # Build interface information for display
-    iface_stats = psutil.net_if_stats()
-    iface_addrs = psutil.net_if_addrs()
+    links = netlink.get_links()
     interfaces_info = []
     for iface in interfaces:
         if os.path.isdir(f'/sys/class/net/{iface}/wireless'):
             iface_type = 'WiFi'
         else:
             iface_type = 'Ethernet'
-        is_up = iface_stats.get(iface).isup if iface in iface_stats else False
+        is_up = iface in links and links[iface]['up']
         status = 'UP' if is_up else 'no_carrier'
-        ip_addr = 'none'
-        for addr in iface_addrs.get(iface, []):
-            if addr.family == socket.AF_INET:
-                ip_addr = addr.address
-                break
+        ip_addr = netlink.first_address(iface) or 'none'
         cfg_file = os.path.join('/etc/network/interfaces.d', f'{iface}.conf')
         mode_val = 'unmanaged'
         if os.path.isfile(cfg_file):
@@ -260,20 +241,9 @@ def index():
                 except Exception:
                     pass
             try:
-                result = subprocess.run(['iwconfig', iface], capture_output=True, text=True, timeout=2)
-                stats = result.stdout or result.stderr
+                stats = netlink.describe_wireless(iface)
             except Exception:
                 stats = 'Unable to retrieve interface statistics'
-            try:
-                en = subprocess.run(['systemctl', 'is-enabled', f'hostapd@{iface}'], capture_output=True, text=True, timeout=2)
-                service_enabled = en.stdout.strip() == 'enabled'
-            except Exception:
-                service_enabled = False
-            try:
-                act = subprocess.run(['systemctl', 'is-active', f'hostapd@{iface}'], capture_output=True, text=True, timeout=2)
-                service_active = act.stdout.strip() == 'active'
-            except Exception:
-                service_active = False
             wifi_interfaces.append({
                 'name': iface,
                 'ssid': ssid,
@@ -281,9 +251,19 @@ def index():
                 'wpa_passphrase': wpa_passphrase,
                 'channel': _display_channel(channel, hw_mode),
                 'stats': stats,
-                'service_enabled': service_enabled,
-                'service_active': service_active
+                'service_enabled': False,
+                'service_active': False,
             })
+    # One systemctl call for every interface's hostapd unit
+    try:
+        services = systemd.status(*(f"hostapd@{w['name']}" for w in wifi_interfaces))
+    except Exception:
+        services = {}
+    for w in wifi_interfaces:
+        service = services.get(f"hostapd@{w['name']}")
+        if service:
+            w['service_enabled'] = service['enabled']
+            w['service_active'] = service['active']
     HW_MODES = ['g', 'a']
     hw_mode_labels = {
         'g': '2.4 GHz (802.11g: 6/12/24/54 Mbps)',
@@ -317,15 +297,14 @@ def wifi_save(iface):
     if action in ['enable', 'disable', 'restart']:
         try:
             if action == 'enable':
-                cmd = ['systemctl', 'enable', '--now', service]
+                result = systemd.enable(service, now=True)
                 msg = 'enabled and started'
             elif action == 'disable':
-                cmd = ['systemctl', 'disable', '--now', service]
+                result = systemd.disable(service, now=True)
                 msg = 'disabled and stopped'
             else:
-                cmd = ['systemctl', 'restart', service]
+                result = systemd.restart(service)
                 msg = 'restarted'
-            result = subprocess.run(cmd, capture_output=True, text=True)
             if result.returncode == 0:
                 flash(f'Service {service} {msg} successfully', 'success')
             else:
@@ -369,8 +348,8 @@ def wifi_save(iface):
         flash(f'Configuration for {iface} saved', 'success')
         # Automatically enable and restart the hostapd service for this interface
         try:
-            subprocess.run(['systemctl', 'enable', service], capture_output=True, text=True, timeout=10)
-            subprocess.run(['systemctl', 'restart', service], capture_output=True, text=True, timeout=10)
+            systemd.enable(service, timeout=10)
+            systemd.restart(service, timeout=10)
             flash(f'Service {service} enabled and restarted', 'success')
         except Exception as e:
             flash(f'Failed to enable/restart service {service}: {e}', 'danger')
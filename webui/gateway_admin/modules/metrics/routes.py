@@ -0,0 +1,179 @@
+import datetime
+import hmac
+from flask import Blueprint, Response, abort, request
+from ...config import Config
+from ... import metrics_store
+from ... import probes
+from ... import staging
+from ... import telemetry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Live sample columns -> (metric name, help). cpuN columns and the
+# firmware throttle flags are exported as labelled families below.
+SYSTEM_GAUGES = {
+    'cpu': ('border0_cpu_usage_percent', 'CPU usage over the last sample interval'),
+    'memory': ('border0_memory_usage_percent', 'Memory in use'),
+    'disk': ('border0_disk_usage_percent', 'Root filesystem usage'),
+    'net_sent': ('border0_network_transmit_bytes_per_second',
+                 'Bytes sent on physical interfaces'),
+    'net_recv': ('border0_network_receive_bytes_per_second',
+                 'Bytes received on physical interfaces'),
+    'load1': ('border0_load1', '1 minute load average'),
+    'load5': ('border0_load5', '5 minute load average'),
+    'load15': ('border0_load15', '15 minute load average'),
+    'cpu_freq': ('border0_cpu_frequency_mhz', 'Current ARM clock'),
+    'soc_temp': ('border0_soc_temperature_celsius', 'SoC temperature'),
+}
+THROTTLE_FLAGS = ('undervolt', 'freq_capped', 'throttled', 'soft_temp_limit')
+
+
+def _authorized():
+    """Allow scrapes from this host, or with ``Authorization: Bearer``
+    matching Config.METRICS_TOKEN when one is configured."""
+    if request.remote_addr in ('127.0.0.1', '::1'):
+        return True
+    token = Config.METRICS_TOKEN
+    if not token:
+        return False
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(
+        given.strip().encode(), token.encode()
+    )
+
+
+def _system_lines(record):
+    lines = telemetry.family(
+        'border0_metrics_sample_timestamp_seconds', 'gauge',
+        'Time of the collector sample exported below',
+        [('', None, record['time'] / 1000)],
+    )
+    for column, (name, help_text) in SYSTEM_GAUGES.items():
+        lines += telemetry.family(name, 'gauge', help_text,
+                                  [('', None, record.get(column))])
+    cores = sorted(
+        (int(k[3:]), v) for k, v in record.items()
+        if k.startswith('cpu') and k[3:].isdigit()
+    )
+    lines += telemetry.family(
+        'border0_cpu_core_usage_percent', 'gauge', 'Per-core CPU usage',
+        [('', {'core': core}, v) for core, v in cores],
+    )
+    lines += telemetry.family(
+        'border0_throttle_state', 'gauge',
+        'Raspberry Pi firmware throttle flags (1 = active)',
+        [('', {'flag': flag}, record.get(flag)) for flag in THROTTLE_FLAGS],
+    )
+    return lines
+
+
+def _interface_lines():
+    samples = {column: [] for column in metrics_store.IFACE_COLUMNS}
+    interfaces = metrics_store.read_interfaces(Config.METRICS_DIR)
+    for iface, info in sorted(interfaces.items()):
+        record = metrics_store.read_latest(metrics_store.tier_path(
+            Config.METRICS_DIR, metrics_store.iface_series(iface), 'raw'
+        ))
+        if record is None:
+            continue
+        labels = {'iface': iface, 'role': info.get('role', 'other')}
+        for column in metrics_store.IFACE_COLUMNS:
+            samples[column].append(('', labels, record.get(column)))
+    lines = []
+    for column, values in samples.items():
+        lines += telemetry.family(
+            f'border0_interface_{column}_per_second', 'gauge',
+            f'{column} rate over the last history interval', values,
+        )
+    return lines
+
+
+# Process series columns -> (metric name, help)
+PROCESS_GAUGES = {
+    'cpu': ('border0_process_cpu_percent', 'CPU used by a service, percent of one core'),
+    'rss': ('border0_process_resident_memory_bytes', 'Resident memory of a service'),
+    'threads': ('border0_process_threads', 'Threads of a service'),
+    'fds': ('border0_process_open_fds', 'Open file descriptors of a service'),
+    'ctx_switches': ('border0_process_context_switches_per_second',
+                     'Context switches of a service'),
+    'procs': ('border0_process_count', 'Processes of a service'),
+}
+
+
+def _process_lines():
+    samples = {column: [] for column in PROCESS_GAUGES}
+    for group in metrics_store.PROC_GROUPS:
+        record = metrics_store.read_latest(metrics_store.tier_path(
+            Config.METRICS_DIR, metrics_store.proc_series(group), 'raw'
+        ))
+        if record is None:
+            continue
+        for column in PROCESS_GAUGES:
+            samples[column].append(('', {'service': group}, record.get(column)))
+    lines = []
+    for column, (name, help_text) in PROCESS_GAUGES.items():
+        lines += telemetry.family(name, 'gauge', help_text, samples[column])
+    return lines
+
+
+PROBE_GAUGES = {
+    'rtt_p50': ('border0_probe_rtt_p50_milliseconds',
+                'Median round-trip time of the last probe round'),
+    'rtt_p90': ('border0_probe_rtt_p90_milliseconds',
+                '90th percentile round-trip time of the last probe round'),
+    'jitter': ('border0_probe_jitter_milliseconds',
+               'Mean RTT change between consecutive probes'),
+    'loss': ('border0_probe_loss_percent', 'Probes lost in the last round'),
+}
+
+
+def _probe_lines():
+    samples = {column: [] for column in PROBE_GAUGES}
+    for name, target in sorted(probes.read_probes(Config.METRICS_DIR).items()):
+        record = metrics_store.read_latest(metrics_store.tier_path(
+            Config.METRICS_DIR, metrics_store.probe_series(name), 'raw'
+        ))
+        if record is None:
+            continue
+        labels = {'target': name, 'kind': target.get('kind', ''),
+                  'host': target.get('host', '')}
+        for column in PROBE_GAUGES:
+            samples[column].append(('', labels, record.get(column)))
+    lines = []
+    for column, (name, help_text) in PROBE_GAUGES.items():
+        lines += telemetry.family(name, 'gauge', help_text, samples[column])
+    return lines
+
+
+def _write_lines():
+    """Today's bytes written to persistent storage, by source."""
+    writes = staging.read_writes(Config.METRICS_DIR)
+    today = writes.get(datetime.date.today().isoformat(), {})
+    return telemetry.family(
+        'border0_storage_written_today_bytes', 'gauge',
+        'Bytes written to persistent storage today (metrics and log '
+        'flushes, and the root block device as a whole)',
+        [('', {'source': source}, n) for source, n in sorted(today.items())],
+    )
+
+
+@metrics_bp.route('/metrics')
+def export():
+    """OpenMetrics exposition for fleet scraping.
+
+    Serves the collector's latest live sample, the newest per-interface
+    rates, per-service process totals and path probe results, and the web
+    UI's own counters (see telemetry). Only reads what the collector
+    already wrote; no sampling happens here.
+    """
+    if not _authorized():
+        abort(403)
+    lines = []
+    record = metrics_store.read_latest(Config.METRICS_LIVE_PATH)
+    if record is not None:
+        lines += _system_lines(record)
+    lines += _interface_lines()
+    lines += _process_lines()
+    lines += _probe_lines()
+    lines += _write_lines()
+    return Response(telemetry.render(lines), content_type=telemetry.CONTENT_TYPE)
@@ -1,82 +1,295 @@
-from flask import Blueprint, render_template, jsonify, request
+from flask import Blueprint, Response, render_template, jsonify, request
 from flask_login import login_required
-import os
-import psutil
-import time
+import gzip
 import json
+import math
+import queue
+import re
+import time
 from ...config import Config
+from ... import metrics_store
+from ... import probes as path_probes
+from ...metrics_feed import LiveFeed
+from ...metrics_store import StoreError
 
 stats_bp = Blueprint('stats', __name__, url_prefix='/stats')
- 
-# Store last network counters for throughput calculation
-last_net = {}
+
+# Shared by every /stats/stream connection in this process.
+live_feed = LiveFeed(Config.METRICS_LIVE_PATH)
+burst_feed = LiveFeed(Config.METRICS_BURST_PATH)
+# Seconds between SSE keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+# Linux interface names: up to 15 characters, no slashes
+IFACE_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,15}$')
+MAC_RE = re.compile(r'^[0-9A-Fa-f]{2}(:[0-9A-Fa-f]{2}){5}$')
+PROBE_TARGETS = ('gateway', 'public', 'exit')
+# Shortest /stats/history window, in hours
+MIN_HOURS = 1 / 60
+
 
 @stats_bp.route('/')
 @login_required
 def index():
     return render_template('stats/index.html')
- 
+
+
 @stats_bp.route('/data')
 @login_required
 def data():
-    """Return system metrics as JSON for Chart.js polling."""
-    now = time.time()
-    # Network throughput calculation
-    net = psutil.net_io_counters()
-    if not last_net:
-        sent_rate = 0.0
-        recv_rate = 0.0
-    else:
-        delta = now - last_net.get('time', now)
-        dt = delta if delta > 0 else 1
-        sent_rate = (net.bytes_sent - last_net['bytes_sent']) / dt
-        recv_rate = (net.bytes_recv - last_net['bytes_recv']) / dt
-    # Update last counters
-    last_net['bytes_sent'] = net.bytes_sent
-    last_net['bytes_recv'] = net.bytes_recv
-    last_net['time'] = now
-
-    # CPU, memory, disk usage
-    cpu = psutil.cpu_percent(interval=0.1)
-    memory = psutil.virtual_memory().percent
-    disk = psutil.disk_usage('/').percent
-
-    # Prepare record for response and logging
-    record = {
-        'time': int(now * 1000),
-        'cpu': cpu,
-        'memory': memory,
-        'disk': disk,
-        'net_sent': sent_rate,
-        'net_recv': recv_rate
-    }
-    # Append to metrics log for historical data
-    try:
-        log_path = Config.METRICS_LOG_PATH
-        os.makedirs(os.path.dirname(log_path), exist_ok=True)
-        with open(log_path, 'a') as f:
-            f.write(json.dumps(record) + '\n')
-    except Exception:
-        pass
+    """Return the collector's latest live sample as JSON for Chart.js polling.
+
+    The metrics collector publishes every sample to a live ring on tmpfs;
+    reading it is a few mmap'd bytes, so any number of viewers see the
+    same values and rates without sampling or writing anything.
+    """
+    record = metrics_store.read_latest(Config.METRICS_LIVE_PATH)
+    if record is None:
+        return jsonify({'error': 'metrics collector is not running'}), 503
     return jsonify(record)
-    
+
+
+def _sse_sample(record):
+    return f"id: {record['time']}\nevent: sample\ndata: {json.dumps(record)}\n\n"
+
+
+@stats_bp.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events stream of live samples.
+
+    Auth and session checks run once, when the stream opens; after that
+    each new collector sample is pushed by the shared fan-out thread. A
+    reconnect carrying ``Last-Event-ID`` (or ``?last_id=``) first gets the
+    samples it missed from the live ring. ``series=burst`` streams the
+    1 s burst ring instead (see /stats/burst).
+    """
+    feed = burst_feed if request.args.get('series') == 'burst' else live_feed
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+
+    def generate():
+        q = feed.subscribe()
+        try:
+            sent = last_id or 0
+            if last_id is not None:
+                for record in feed.backfill(last_id):
+                    sent = record['time']
+                    yield _sse_sample(record)
+            while True:
+                try:
+                    record = q.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line: keeps proxies from timing out the
+                    # stream and surfaces a closed socket to us.
+                    yield ': keepalive\n\n'
+                    continue
+                # Skip anything the backfill already covered
+                if record['time'] <= sent:
+                    continue
+                sent = record['time']
+                yield _sse_sample(record)
+        finally:
+            feed.unsubscribe(q)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+# Responses smaller than this are not worth gzipping
+GZIP_MIN_BYTES = 1024
+
+
+def _compressible_json(payload):
+    """JSON response, gzipped when the client accepts it and it pays off."""
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 @stats_bp.route('/history')
 @login_required
 def history():
-    """Return historical metrics for the past X hours."""
+    """Return historical metrics for the past X hours.
+
+    ``hours`` is clamped to between a minute and the retention of the
+    series' coarsest tier; a non-finite value is a 400.
+
+    ``points`` caps how many samples the client wants; the coarsest rollup
+    tier needed to stay under it is served (see metrics_store.select_tier)
+    and, when even that tier holds more, it is LTTB-downsampled to fit
+    (metrics_store.downsample). Rollup tiers carry
+    ``<metric>_min``/``<metric>_max`` next to the average.
+
+    The response is columnar with delta-encoded timestamps (see
+    metrics_store.columnar); ``format=rows`` returns the older list of
+    per-sample dicts. ``since=<ms>`` returns only samples newer than that
+    cursor, and the ETag follows the newest sample so an unchanged window
+    revalidates with a 304.
+
+    ``iface=<name>`` returns that interface's byte/packet/error/drop rates
+    instead of the system series (see /stats/interfaces for the names),
+    ``client=<mac>`` a LAN client's up/down rates (see /stats/clients),
+    ``proc=<group>`` a service's CPU/RSS/thread/FD/context-switch totals
+    (see /stats/processes), and ``probe=<target>`` the RTT, jitter and
+    loss to a path probe target (see /stats/probes).
+    """
     # hours parameter (in hours), default to 24
     hours = request.args.get('hours', type=float, default=24.0)
-    cutoff = int((time.time() - hours * 3600) * 1000)
-    data = []
+    points = request.args.get('points', type=int, default=metrics_store.DEFAULT_POINTS)
+    points = max(10, min(points, 20000))
+    since = request.args.get('since', type=int)
+    fmt = request.args.get('format', 'columns')
+    iface = request.args.get('iface')
+    client = request.args.get('client')
+    proc = request.args.get('proc')
+    probe = request.args.get('probe')
+    tiers = metrics_store.TIERS
+    if probe is not None:
+        if probe not in PROBE_TARGETS:
+            return jsonify({'error': 'invalid probe target'}), 400
+        series = metrics_store.probe_series(probe)
+        tiers = metrics_store.PROBE_TIERS
+    elif proc is not None:
+        if proc not in metrics_store.PROC_GROUPS:
+            return jsonify({'error': 'invalid process group'}), 400
+        series = metrics_store.proc_series(proc)
+    elif client is not None:
+        if not MAC_RE.match(client):
+            return jsonify({'error': 'invalid client'}), 400
+        series = metrics_store.client_series(client)
+        tiers = metrics_store.CLIENT_TIERS
+    elif iface is None:
+        series = 'system'
+    elif IFACE_RE.match(iface):
+        series = metrics_store.iface_series(iface)
+        tiers = metrics_store.IFACE_TIERS
+    else:
+        return jsonify({'error': 'invalid interface'}), 400
+    if not math.isfinite(hours):
+        return jsonify({'error': 'invalid hours'}), 400
+    # Nothing is kept longer than the coarsest tier's retention
+    hours = max(MIN_HOURS, min(hours, tiers[-1][2] / 3600))
+    now = int(time.time() * 1000)
+    cutoff = int(now - hours * 3600 * 1000)
     try:
-        with open(Config.METRICS_LOG_PATH, 'r') as f:
-            for line in f:
-                try:
-                    rec = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                if rec.get('time', 0) >= cutoff:
-                    data.append(rec)
-    except FileNotFoundError:
-        pass
-    return jsonify(data)
+        tier, bucket, store = metrics_store.open_tier(
+            Config.METRICS_DIR, series, now - cutoff, points, tiers
+        )
+    except (FileNotFoundError, StoreError):
+        if fmt == 'rows':
+            return jsonify([])
+        return jsonify({'tier': None, 'resolution': None, 'last': None, 'time': []})
+    with store:
+        last = store.last_time()
+        etag = f'{series}-{tier}-{last}-{hours:g}-{points}-{since}-{fmt}'
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            start = max(cutoff, since + 1) if since is not None else cutoff
+            rows = metrics_store.downsample(
+                store.columns, store.rows(start_ms=start), points
+            )
+            if fmt == 'rows':
+                response = jsonify(store.as_records(rows))
+            else:
+                payload = metrics_store.columnar(store.columns, rows)
+                payload.update(tier=tier, resolution=bucket, last=last)
+                response = _compressible_json(payload)
+    response.set_etag(etag, weak=True)
+    # Let the browser keep the window but revalidate it every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Metrics-Tier'] = tier
+    return response
+
+
+@stats_bp.route('/interfaces')
+@login_required
+def interfaces():
+    """Interfaces with recorded history, and their wan/lan/vpn/... role."""
+    return jsonify(metrics_store.read_interfaces(Config.METRICS_DIR))
+
+
+@stats_bp.route('/processes')
+@login_required
+def processes():
+    """Latest resource use of each service's processes.
+
+    cpu is percent of one core and ctx_switches per second, over the
+    collector's last history interval; rss is bytes.
+    """
+    groups = {}
+    for group in metrics_store.PROC_GROUPS:
+        groups[group] = metrics_store.read_latest(metrics_store.tier_path(
+            Config.METRICS_DIR, metrics_store.proc_series(group), 'raw'
+        ))
+    return jsonify(groups)
+
+
+@stats_bp.route('/probes')
+@login_required
+def probes():
+    """Probe targets with their latest RTT (ms), jitter (ms) and loss (%)."""
+    targets = path_probes.read_probes(Config.METRICS_DIR)
+    for name, target in targets.items():
+        target['latest'] = metrics_store.read_latest(metrics_store.tier_path(
+            Config.METRICS_DIR, metrics_store.probe_series(name), 'raw'
+        ))
+    return jsonify(targets)
+
+
+@stats_bp.route('/clients')
+@login_required
+def clients():
+    """LAN clients by current bandwidth (top talkers), busiest first.
+
+    Rates are bytes per second over the collector's last minute; totals
+    are bytes since the client was first seen.
+    """
+    limit = max(1, min(request.args.get('limit', type=int, default=20), 1000))
+    return jsonify(metrics_store.top_clients(Config.METRICS_DIR, limit))
+
+
+def _burst_status():
+    now = time.time()
+    until = metrics_store.read_burst(Config.METRICS_BURST_REQUEST_PATH)
+    active = until > now
+    return {
+        'now': int(now * 1000),
+        'active': active,
+        'until': int(until * 1000) if active else None,
+        'interval': metrics_store.BURST_INTERVAL,
+        'max_minutes': metrics_store.BURST_MAX_MINUTES,
+    }
+
+
+@stats_bp.route('/burst', methods=['GET', 'POST'])
+@login_required
+def burst():
+    """Report or change 1 s burst sampling.
+
+    POST ``minutes`` (1 to BURST_MAX_MINUTES, 0 to stop) asks the collector
+    to sample every second until then; the samples go to a separate
+    short-retention ring, streamed with ``/stats/stream?series=burst``.
+    ``now`` is the server time (ms) of the reply; streaming from it skips
+    samples of earlier bursts still in the ring.
+    """
+    if request.method == 'POST':
+        minutes = request.values.get('minutes', type=float)
+        if minutes is None or not 0 <= minutes <= metrics_store.BURST_MAX_MINUTES:
+            return jsonify({'error': 'invalid minutes'}), 400
+        until = time.time() + minutes * 60 if minutes else 0
+        try:
+            metrics_store.write_burst(Config.METRICS_BURST_REQUEST_PATH, until)
+        except OSError:
+            return jsonify({'error': 'could not reach the metrics collector'}), 503
+    return jsonify(_burst_status())
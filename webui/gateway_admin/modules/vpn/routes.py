@@ -15,24 +15,11 @@ import time
 import signal
 import stat
 import threading
-import yaml
+from ... import node_state, runner, state_files, systemd
 from ...config import Config
 from ...auth_mode import ANONYMOUS_USER_ID
 
 
-def _decode_jwt_payload(token_path):
-    """Return the decoded JWT payload dict, or None on any failure."""
-    try:
-        token_str = open(token_path).read().strip()
-        parts = token_str.split('.')
-        if len(parts) < 2:
-            return None
-        padding = '=' * (-len(parts[1]) % 4)
-        return json.loads(base64.urlsafe_b64decode(parts[1] + padding))
-    except Exception:
-        return None
-
-
 def _ts_to_iso(ts):
     if not isinstance(ts, (int, float)):
         return None
@@ -51,7 +38,7 @@ def _summarize_client_token(token_path):
     """
     if not os.path.isfile(token_path):
         return None
-    payload = _decode_jwt_payload(token_path)
+    payload = state_files.read(token_path, 'jwt')
     try:
         stat = os.stat(token_path)
         mtime_iso = datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(sep=' ', timespec='seconds')
@@ -84,47 +71,6 @@ def _summarize_client_token(token_path):
     return info
 
 
-def _load_device_state(state_path):
-    """Parse device.state.yaml and return a flat dict for the current org."""
-    if not os.path.isfile(state_path):
-        return None
-    try:
-        with open(state_path) as f:
-            doc = yaml.safe_load(f) or {}
-    except Exception:
-        return None
-    current = doc.get('current_organization')
-    orgs = doc.get('organizations') or {}
-    org_block = orgs.get(current) if current else None
-    if not isinstance(org_block, dict):
-        # Fall back to the first org block if 'current_organization' is missing.
-        for v in orgs.values():
-            if isinstance(v, dict):
-                org_block = v
-                break
-    if not isinstance(org_block, dict):
-        return None
-    key_block = org_block.get('key') or {}
-    profile = org_block.get('profile') or {}
-    return {
-        'device_id': org_block.get('device_id'),
-        'self_ip_v4': org_block.get('self_ip_v4'),
-        'self_ip_v6': org_block.get('self_ip_v6'),
-        'network_cidr_v4': org_block.get('network_cidr_v4'),
-        'network_cidr_v6': org_block.get('network_cidr_v6'),
-        'resources_cidr_v4': org_block.get('resources_cidr_v4'),
-        'resources_cidr_v6': org_block.get('resources_cidr_v6'),
-        'public_key': key_block.get('public_key'),
-        'key_expires_at': key_block.get('expires_at'),
-        'managed_interfaces': org_block.get('managed_network_interfaces') or [],
-        'exit_node': org_block.get('exit_node'),
-        'last_updated_at': org_block.get('last_updated_at'),
-        'profile_name': profile.get('name'),
-        'profile_email': profile.get('email'),
-        'org_subdomain': profile.get('org_subdomain'),
-        'org_id': profile.get('org_id'),
-    }
-
 vpn_bp = Blueprint('vpn', __name__, url_prefix='/vpn')
 
 
@@ -231,12 +177,7 @@ def _kind_from_payload(payload):
 
 def _read_current_org_id():
     """Return the current device's org_id from /etc/border0/org, or None."""
-    try:
-        with open(Config.BORDER0_ORG_PATH) as f:
-            data = json.load(f)
-        return data.get('org_id')
-    except Exception:
-        return None
+    return state_files.org().get('org_id')
 
 
 # Cap on the size of the pasted JWT. Real Border0 tokens are well under
@@ -373,7 +314,7 @@ def token_apply():
 
     # Record the identity we're about to replace, for the audit log.
     old_identity = None
-    prior = _decode_jwt_payload(token_path) if os.path.isfile(token_path) else None
+    prior = state_files.read(token_path, 'jwt')
     if prior:
         old_identity = _identity_from_payload(prior)
 
@@ -409,11 +350,7 @@ def token_apply():
             os.replace(tmp_path, token_path)
             # Bounce the daemon so it picks up the new credential.
             try:
-                rc = subprocess.run(
-                    ['systemctl', 'restart', 'border0-device'],
-                    check=False, timeout=15,
-                    capture_output=True, text=True,
-                )
+                rc = systemd.restart('border0-device', timeout=15)
                 if rc.returncode != 0:
                     restart_failed_reason = (rc.stderr or rc.stdout or '').strip() or f'exit code {rc.returncode}'
             except Exception as e:
@@ -468,29 +405,11 @@ def token_apply():
 def index():
     """VPN configuration interface: set org, initiate login, upload client token, and install VPN."""
     # Helpers to get/save org
-    def get_org():
-        # Env var override preferred
-        if Config.BORDER0_ORG:
-            return Config.BORDER0_ORG
-        try:
-            with open(Config.BORDER0_ORG_PATH) as f:
-                content = f.read().strip()
-                # support JSON with org_subdomain and org_id
-                try:
-                    data = json.loads(content)
-                    return data.get('org_subdomain', '')
-                except ValueError:
-                    return content
-        except IOError:
-            return ''
-
     def save_org(org_name):
-        os.makedirs(os.path.dirname(Config.BORDER0_ORG_PATH), exist_ok=True)
-        with open(Config.BORDER0_ORG_PATH, 'w') as f:
-            f.write(org_name)
+        state_files.write(Config.BORDER0_ORG_PATH, org_name, 'org')
 
     token_file = Config.BORDER0_TOKEN_PATH
-    org = get_org()
+    org = state_files.org_subdomain()
     login_url = None
 
     if request.method == 'POST':
@@ -499,25 +418,19 @@ def index():
         if action == 'reset_org':
             errors = []
             # Remove saved organization file
-            org_path = Config.BORDER0_ORG_PATH
             try:
-                if org_path and os.path.isfile(org_path):
-                    os.remove(org_path)
+                state_files.remove(Config.BORDER0_ORG_PATH)
             except Exception as e:
                 errors.append(f"org file removal error: {e}")
             # Note: do not remove client token; login will overwrite existing token
             # Remove device state file
             try:
-                token_path = Config.BORDER0_TOKEN_PATH
-                state_dir = os.path.dirname(token_path)
-                state_file = os.path.join(state_dir, 'device.state.yaml')
-                if os.path.isfile(state_file):
-                    os.remove(state_file)
+                state_files.remove(state_files.device_state_path())
             except Exception as e:
                 errors.append(f"device state removal error: {e}")
             # Stop the border0-device service
             try:
-                subprocess.run(['systemctl', 'stop', 'border0-device'], check=False)
+                systemd.stop('border0-device')
             except Exception as e:
                 errors.append(f"service stop error: {e}")
             # Report results
@@ -538,9 +451,9 @@ def index():
                     flash('Organization saved.', 'success')
                     # Auto-trigger Border0 CLI login for this org
                     try:
-                        subprocess.run([
+                        runner.run([
                             'pkill', '-f', f"{Config.BORDER0_CLI_PATH} client login"
-                        ], check=False)
+                        ])
                     except Exception:
                         pass
                     env = os.environ.copy()
@@ -550,7 +463,7 @@ def index():
                         'HOME': '/root',
                         'USER': 'root'
                     })
-                    proc = subprocess.Popen(
+                    proc = runner.spawn(
                         [Config.BORDER0_CLI_PATH, 'client', 'login', f'--org={org}'],
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT,
@@ -601,7 +514,7 @@ def index():
                                         proc.wait(timeout=5)
                                     except Exception:
                                         pass
-                                    subprocess.run(['systemctl', 'restart', 'border0-device'], check=False)
+                                    systemd.restart('border0-device')
                                     current_app.logger.info('Border0 device service restarted after token acquisition')
                                     break
                                 time.sleep(2)
@@ -624,9 +537,9 @@ def index():
             else:
                 # avoid duplicate login processes
                 try:
-                    subprocess.run([
+                    runner.run([
                         'pkill', '-f', f"{Config.BORDER0_CLI_PATH} client login"
-                    ], check=False)
+                    ])
                 except Exception:
                     pass
                 try:
@@ -638,7 +551,7 @@ def index():
                         'HOME': '/root',
                         'USER': 'root',
                     })
-                    proc = subprocess.Popen(
+                    proc = runner.spawn(
                         [Config.BORDER0_CLI_PATH, 'client', 'login', f'--org={org}'],
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT,
@@ -689,7 +602,7 @@ def index():
                                         proc.wait(timeout=5)
                                     except Exception:
                                         pass
-                                    subprocess.run(['systemctl', 'restart', 'border0-device'], check=False)
+                                    systemd.restart('border0-device')
                                     current_app.logger.info('Border0 device service restarted after login')
                                     break
                                 time.sleep(2)
@@ -710,9 +623,7 @@ def index():
             token = request.form.get('token', '').strip()
             if token:
                 try:
-                    os.makedirs(os.path.dirname(token_file), exist_ok=True)
-                    with open(token_file, 'w') as f:
-                        f.write(token)
+                    state_files.write(token_file, token, perms=0o600)
                     flash('Client token saved successfully.', 'success')
                 except Exception as e:
                     flash(f'Failed to save client token: {e}', 'danger')
@@ -723,10 +634,7 @@ def index():
         # Restart VPN service
         elif action == 'install_vpn':
             try:
-                result = subprocess.run(
-                    ['systemctl', 'restart', 'border0-device'],
-                    capture_output=True, text=True
-                )
+                result = systemd.restart('border0-device')
                 if result.returncode == 0:
                     flash('VPN service restarted successfully.', 'success')
                 else:
@@ -740,15 +648,10 @@ def index():
             selected = request.form.get('exit_node', '').strip()
             try:
                 if selected and selected != 'none':
-                    result = subprocess.run(
-                        [Config.BORDER0_CLI_PATH, 'node', 'exitnode', 'set', selected, '--json'],
-                        capture_output=True, text=True
-                    )
+                    result = runner.run([Config.BORDER0_CLI_PATH, 'node', 'exitnode', 'set', selected, '--json'])
                 else:
-                    result = subprocess.run(
-                        [Config.BORDER0_CLI_PATH, 'node', 'exitnode', 'unset', '--json'],
-                        capture_output=True, text=True
-                    )
+                    result = runner.run([Config.BORDER0_CLI_PATH, 'node', 'exitnode', 'unset', '--json'])
+                node_state.invalidate(Config.BORDER0_CLI_PATH)
                 if result.returncode == 0:
                     try:
                         msg = json.loads(result.stdout).get('message', '').strip()
@@ -762,89 +665,35 @@ def index():
                 flash(f'Error setting exit node: {e}', 'danger')
             return redirect(url_for('vpn.index'))
 
-    # Determine border0-device service full status output
+    # Determine border0-device service state
     try:
-        status_proc = subprocess.run(
-            ['systemctl', 'status', 'border0-device.service', '-n0'],
-            capture_output=True, text=True, timeout=5
-        )
-        device_status = status_proc.stdout
-        service_active = 'Active: active' in device_status
+        service = systemd.status('border0-device.service')['border0-device.service']
+        device_status = f"{service['active_state']} ({service['sub_state']})"
+        service_active = service['active']
+        service_enabled = service['enabled']
     except Exception as e:
         device_status = f'Error obtaining service status: {e}'
-        service_active = False
-    try:
-        enabled_proc = subprocess.run(
-            ['systemctl', 'is-enabled', 'border0-device.service'],
-            capture_output=True, text=True, timeout=5
-        )
-        service_enabled = enabled_proc.stdout.strip() == 'enabled'
-    except Exception:
-        service_enabled = False
+        service_active = service_enabled = False
 
     # Determine token existence (may be used for showing upload form)
     token_exists = os.path.isfile(token_file)
     # Load user information: prefer cached metadata, else decode token
-    user_info = None
-    metadata_path = Config.BORDER0_TOKEN_METADATA_PATH
-    if os.path.isfile(metadata_path):
-        try:
-            with open(metadata_path) as mf:
-                user_info = json.load(mf)
-        except Exception:
-            user_info = None
-    elif token_exists:
-        try:
-            token_str = open(token_file).read().strip()
-            parts = token_str.split('.')
-            if len(parts) >= 2:
-                payload_b64 = parts[1]
-                padding = '=' * (-len(payload_b64) % 4)
-                payload_bytes = base64.urlsafe_b64decode(payload_b64 + padding)
-                user_info = json.loads(payload_bytes)
-        except Exception:
-            user_info = None
+    user_info = state_files.token_metadata()
+    if user_info is None and token_exists:
+        user_info = state_files.client_token_claims()
     # Fetch current exit node and list of available exit nodes
     exit_nodes = []
     current_exit_node = ''
     exitnode_error = None
-    state = None
     if service_active:
-        # Determine current exit node via state
-        try:
-            result = subprocess.run(
-                [Config.BORDER0_CLI_PATH, 'node', 'state', 'show', '--json'],
-                capture_output=True, text=True, timeout=20
-            )
-            if result.returncode == 0:
-                state = json.loads(result.stdout)
-                current_exit_node = state.get('exit_node', '') or ''
-            else:
-                exitnode_error = result.stderr or result.stdout
-        except Exception as e:
-            exitnode_error = str(e)
-        # Populate exit nodes directly from state.
-        # Newer border0 CLI returns peers_v2 / services_v2 as dicts keyed by
-        # public_key / service_name. Fall back to the legacy list-based
-        # peers / services keys for older CLI builds.
+        state, exitnode_error = node_state.get(
+            Config.BORDER0_CLI_PATH, ttl=Config.BORDER0_STATE_TTL
+        )
         if state:
-            peers = state.get('peers_v2') or state.get('peers') or []
-            peer_iter = peers.values() if isinstance(peers, dict) else peers
-            for peer in peer_iter:
-                peer_name = peer.get('name')
-                services = peer.get('services_v2') or peer.get('services') or []
-                svc_iter = services.values() if isinstance(services, dict) else services
-                for service in svc_iter:
-                    if service.get('type') == 'exit_node':
-                        exit_nodes.append({
-                            'name': service.get('name'),
-                            'peer_name': peer_name,
-                            'dns_name': service.get('dns_name'),
-                            'public_ips': service.get('public_ips', [])
-                        })
+            current_exit_node = state.exit_node or ''
+            exit_nodes = state.exit_nodes
     client_token_info = _summarize_client_token(token_file)
-    device_state_path = os.path.join(os.path.dirname(token_file or ''), 'device.state.yaml')
-    device_state = _load_device_state(device_state_path)
+    device_state = state_files.device_state()
     replacement_preview = session.get('token_replacement_preview')
     return render_template(
         'vpn/index.html',
@@ -1,10 +1,8 @@
 import os
 import re
-import subprocess
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
 from flask_login import login_required
-import socket
-import psutil
+from ... import netlink, runner, state_files
 # Default static configuration defaults
 DEFAULT_STATIC_CFG = {
     'address': '192.168.123.1',
@@ -22,20 +20,14 @@ def index():
     net_dir = '/sys/class/net'
     interfaces = []
     # Read current LAN interface to exclude it from WAN options
-    lan_iface_path = current_app.config.get('LAN_IFACE_PATH')
-    lan_iface_to_exclude = None
-    try:
-        with open(lan_iface_path) as f:
-            lan_iface_to_exclude = f.read().strip()
-    except Exception:
-        lan_iface_to_exclude = None
+    lan_iface = state_files.lan_iface()
     if os.path.isdir(net_dir):
         for iface in sorted(os.listdir(net_dir)):
             # only physical ethernet or wlan
             if not re.match(r'^(eth|wlan)\d+$', iface):
                 continue
             # skip LAN interface
-            if iface == lan_iface_to_exclude:
+            if iface == lan_iface:
                 continue
             interfaces.append(iface)
 
@@ -45,11 +37,7 @@ def index():
     # Prepare static config with sensible defaults
     static_cfg = DEFAULT_STATIC_CFG.copy()
     wan_iface_path = current_app.config.get('WAN_IFACE_PATH')
-    try:
-        with open(wan_iface_path) as f:
-            current_iface = f.read().strip()
-    except Exception:
-        current_iface = None
+    current_iface = state_files.wan_iface()
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -59,8 +47,8 @@ def index():
                 flash('Invalid interface selected', 'warning')
                 return redirect(url_for('wan.index'))
             try:
-                subprocess.run(['ifdown', iface], capture_output=True, text=True, timeout=10)
-                subprocess.run(['ifup', iface], capture_output=True, text=True, timeout=10)
+                runner.run(['ifdown', iface], timeout=10)
+                runner.run(['ifup', iface], timeout=10)
                 flash(f'WAN interface {iface} restarted', 'success')
             except Exception as e:
                 flash(f'Failed to restart WAN interface: {e}', 'danger')
@@ -107,9 +95,7 @@ def index():
 
         # Persist the selected WAN interface
         try:
-            os.makedirs(os.path.dirname(wan_iface_path), exist_ok=True)
-            with open(wan_iface_path, 'w') as f:
-                f.write(iface + '\n')
+            state_files.write(wan_iface_path, iface + '\n')
         except Exception as e:
             flash(f'Failed to save WAN interface selection: {e}', 'danger')
             return redirect(url_for('wan.index'))
@@ -117,8 +103,8 @@ def index():
         flash(f'WAN interface {iface} configured ({m})', 'success')
         # Automatically restart the WAN interface
         try:
-            subprocess.run(['ifdown', iface], capture_output=True, text=True, timeout=10)
-            subprocess.run(['ifup', iface], capture_output=True, text=True, timeout=10)
+            runner.run(['ifdown', iface], timeout=10)
+            runner.run(['ifup', iface], timeout=10)
             flash(f'WAN interface {iface} restarted', 'success')
         except Exception as e:
             flash(f'Failed to restart WAN interface: {e}', 'danger')
@@ -139,17 +125,8 @@ def index():
             except Exception:
                 pass
 
-    # Load current LAN interface selection for cross-page indicator
-    lan_iface = None
-    lan_iface_path = current_app.config.get('LAN_IFACE_PATH')
-    try:
-        with open(lan_iface_path) as f:
-            lan_iface = f.read().strip()
-    except Exception:
-        lan_iface = None
     # Build interface information for display
-    iface_stats = psutil.net_if_stats()
-    iface_addrs = psutil.net_if_addrs()
+    links = netlink.get_links()
     interfaces_info = []
     for iface in interfaces:
         # Determine type: WiFi if wireless, else Ethernet
@@ -158,14 +135,10 @@ def index():
         else:
             iface_type = 'Ethernet'
         # Determine status: UP if interface is up, else no_carrier
-        is_up = iface_stats.get(iface).isup if iface in iface_stats else False
+        is_up = iface in links and links[iface]['up']
         status = 'UP' if is_up else 'no_carrier'
         # Get IPv4 address if available
-        ip_addr = 'none'
-        for addr in iface_addrs.get(iface, []):
-            if addr.family == socket.AF_INET:
-                ip_addr = addr.address
-                break
+        ip_addr = netlink.first_address(iface) or 'none'
         # Determine mode: static, dynamic, or unmanaged based on config file
         cfg_file = os.path.join('/etc/network/interfaces.d', f'{iface}.conf')
         mode_val = 'unmanaged'
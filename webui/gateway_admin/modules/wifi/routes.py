@@ -1,7 +1,7 @@
 import os
 from flask import Blueprint, render_template, request, flash, redirect, url_for, abort
-import subprocess
 from flask_login import login_required
+from ... import netlink, systemd
 
 # Allowed hostapd hardware modes on Raspberry Pi (2.4 GHz g, 5 GHz a)
 HW_MODES = ['g', 'a']
@@ -41,34 +41,31 @@ def index():
                                     wpa_passphrase = v
                     except Exception:
                         pass
-                # Gather interface statistics and hostapd service status
+                # Gather interface statistics; service status is read below
                 stats = ''
-                service_enabled = False
-                service_active = False
                 try:
-                    result = subprocess.run(['iwconfig', iface], capture_output=True, text=True, timeout=2)
-                    stats = result.stdout or result.stderr
+                    stats = netlink.describe_wireless(iface)
                 except Exception:
                     stats = 'Unable to retrieve interface statistics'
-                try:
-                    en = subprocess.run(['systemctl', 'is-enabled', f'hostapd@{iface}'], capture_output=True, text=True, timeout=2)
-                    service_enabled = en.stdout.strip() == 'enabled'
-                except Exception:
-                    service_enabled = False
-                try:
-                    act = subprocess.run(['systemctl', 'is-active', f'hostapd@{iface}'], capture_output=True, text=True, timeout=2)
-                    service_active = act.stdout.strip() == 'active'
-                except Exception:
-                    service_active = False
                 interfaces.append({
                     'name': iface,
                     'ssid': ssid,
                     'hw_mode': hw_mode,
                     'wpa_passphrase': wpa_passphrase,
                     'stats': stats,
-                    'service_enabled': service_enabled,
-                    'service_active': service_active
+                    'service_enabled': False,
+                    'service_active': False,
                 })
+    # One systemctl call for every interface's hostapd unit
+    try:
+        services = systemd.status(*(f"hostapd@{w['name']}" for w in interfaces))
+    except Exception:
+        services = {}
+    for w in interfaces:
+        service = services.get(f"hostapd@{w['name']}")
+        if service:
+            w['service_enabled'] = service['enabled']
+            w['service_active'] = service['active']
     # Friendly labels for hardware modes with typical speeds
     hw_mode_labels = {
         'g': '2.4 GHz (802.11g: 6/12/24/54 Mbps)',
@@ -94,15 +91,14 @@ def save(iface):
         service = f'hostapd@{iface}'
         try:
             if action == 'enable':
-                cmd = ['systemctl', 'enable', '--now', service]
+                result = systemd.enable(service, now=True)
                 action_str = 'enabled and started'
             elif action == 'disable':
-                cmd = ['systemctl', 'disable', '--now', service]
+                result = systemd.disable(service, now=True)
                 action_str = 'disabled and stopped'
             else:  # restart
-                cmd = ['systemctl', 'restart', service]
+                result = systemd.restart(service)
                 action_str = 'restarted'
-            result = subprocess.run(cmd, capture_output=True, text=True)
             if result.returncode == 0:
                 flash(f'Service {service} {action_str} successfully', 'success')
             else:
@@ -0,0 +1,430 @@
+"""Link, address, neighbour and wireless state over netlink.
+
+Reading interface state used to cost a fork+exec per page (``ip -j neigh
+show``, ``iwconfig``), tens of milliseconds each on a Pi. This module asks
+the kernel directly over an ``AF_NETLINK`` socket:
+
+* rtnetlink dumps (``RTM_GETLINK``, ``RTM_GETADDR``, ``RTM_GETNEIGH``) for
+  links with their counters, addresses and the neighbour table;
+* generic netlink ``nl80211`` for wireless interfaces: SSID, mode,
+  frequency, TX power and the associated stations.
+
+:func:`get_links`, :func:`get_addresses` and :func:`get_neighbours` cache
+each dump for ``CACHE_TTL`` seconds. :func:`watch` (started by the app)
+subscribes to link, address and neighbour change events: every event
+drops the cached dumps, so the cache can be kept for ``WATCHED_TTL``
+instead, and callbacks passed to :func:`subscribe` hear about each one.
+Traffic counters change without an event, so callers that show them ask
+with ``counters=True`` and get a dump at most ``CACHE_TTL`` old.
+"""
+
+import errno
+import itertools
+import os
+import socket
+import struct
+import threading
+import time
+
+NETLINK_ROUTE = 0
+NETLINK_GENERIC = 16
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWNEIGH, RTM_DELNEIGH, RTM_GETNEIGH = 28, 29, 30
+RTMGRP_LINK = 0x1
+RTMGRP_NEIGH = 0x4
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+IFLA_ADDRESS, IFLA_IFNAME, IFLA_MTU, IFLA_OPERSTATE, IFLA_STATS64 = 1, 3, 4, 16, 23
+IFA_ADDRESS, IFA_LOCAL = 1, 2
+NDA_DST, NDA_LLADDR = 1, 2
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+# Neighbour states, most significant first, named as ``ip neigh`` does
+NUD_STATES = (
+    (0x80, 'PERMANENT'), (0x02, 'REACHABLE'), (0x08, 'DELAY'), (0x10, 'PROBE'),
+    (0x04, 'STALE'), (0x01, 'INCOMPLETE'), (0x20, 'FAILED'), (0x40, 'NOARP'),
+)
+OPERSTATES = ('UNKNOWN', 'NOTPRESENT', 'DOWN', 'LOWERLAYERDOWN', 'TESTING', 'DORMANT', 'UP')
+
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID, CTRL_ATTR_FAMILY_NAME = 1, 2
+NL80211_CMD_GET_INTERFACE = 5
+NL80211_CMD_GET_STATION = 17
+NL80211_ATTR_IFINDEX = 3
+NL80211_ATTR_IFTYPE = 5
+NL80211_ATTR_MAC = 6
+NL80211_ATTR_STA_INFO = 21
+NL80211_ATTR_WIPHY_FREQ = 38
+NL80211_ATTR_SSID = 52
+NL80211_ATTR_WIPHY_TX_POWER_LEVEL = 98
+NL80211_STA_INFO_INACTIVE_TIME = 1
+NL80211_STA_INFO_SIGNAL = 7
+NL80211_STA_INFO_TX_BITRATE = 8
+NL80211_STA_INFO_CONNECTED_TIME = 16
+NL80211_RATE_INFO_BITRATE = 1
+NL80211_RATE_INFO_BITRATE32 = 5
+IFTYPES = {1: 'Ad-Hoc', 2: 'Managed', 3: 'Master', 4: 'AP VLAN', 6: 'Monitor', 7: 'Mesh'}
+
+CACHE_TTL = 2.0
+WATCHED_TTL = 30.0
+SOCKET_TIMEOUT = 1.0
+
+_NLMSG = struct.Struct('=IHHII')
+_NLATTR = struct.Struct('=HH')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_NDMSG = struct.Struct('=BxxxiHBB')
+_GENLMSG = struct.Struct('=BBxx')
+
+_seq = itertools.count(1)
+_cache = {}
+_cache_lock = threading.Lock()
+_subscribers = []
+_watcher = None
+_nl80211_id = None
+
+
+def _align(n):
+    return (n + 3) & ~3
+
+
+def parse_attrs(data, offset=0):
+    """``{type: payload}`` of the netlink attributes in ``data[offset:]``."""
+    attrs = {}
+    while offset + _NLATTR.size <= len(data):
+        length, kind = _NLATTR.unpack_from(data, offset)
+        if length < _NLATTR.size:
+            break
+        # Strip the NLA_F_NESTED / NLA_F_NET_BYTEORDER flags
+        attrs[kind & 0x3fff] = data[offset + _NLATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _attr(kind, payload):
+    return _NLATTR.pack(_NLATTR.size + len(payload), kind) + payload + b'\0' * (-len(payload) % 4)
+
+
+def _cstr(value):
+    return value.split(b'\0', 1)[0].decode('utf-8', 'replace') if value else None
+
+
+def _mac(value):
+    return ':'.join(f'{b:02x}' for b in value) if value else None
+
+
+def _u32(value):
+    return struct.unpack('=I', value[:4])[0] if value and len(value) >= 4 else None
+
+
+def _request(protocol, msg_type, payload, flags=NLM_F_DUMP):
+    """Send one request and yield ``(type, body)`` of every reply message."""
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                       protocol) as sock:
+        sock.settimeout(SOCKET_TIMEOUT)
+        sock.bind((0, 0))
+        seq = next(_seq)
+        sock.send(_NLMSG.pack(_NLMSG.size + len(payload), msg_type,
+                              NLM_F_REQUEST | flags, seq, 0) + payload)
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + _NLMSG.size <= len(data):
+                length, kind, _, reply_seq, _ = _NLMSG.unpack_from(data, offset)
+                if length < _NLMSG.size:
+                    return
+                body = data[offset + _NLMSG.size:offset + length]
+                offset += _align(length)
+                if reply_seq != seq:
+                    continue
+                if kind == NLMSG_DONE:
+                    return
+                if kind == NLMSG_ERROR:
+                    code = -struct.unpack_from('=i', body)[0]
+                    if code:
+                        raise OSError(code, os.strerror(code))
+                    # Plain ACK of a non-dump request
+                    return
+                yield kind, body
+                if not flags & NLM_F_DUMP:
+                    return
+
+
+def links():
+    """``{name: {...}}`` of every link with flags and byte/packet counters."""
+    result = {}
+    for kind, body in _request(NETLINK_ROUTE, RTM_GETLINK,
+                               _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if kind != RTM_NEWLINK:
+            continue
+        _, _, index, flags, _ = _IFINFOMSG.unpack_from(body)
+        attrs = parse_attrs(body, _IFINFOMSG.size)
+        name = _cstr(attrs.get(IFLA_IFNAME))
+        if not name:
+            continue
+        stats = attrs.get(IFLA_STATS64) or b''
+        counters = struct.unpack_from('=4Q', stats) if len(stats) >= 32 else (0, 0, 0, 0)
+        operstate = attrs.get(IFLA_OPERSTATE)
+        result[name] = {
+            'index': index,
+            'up': bool(flags & IFF_UP),
+            'carrier': bool(flags & IFF_LOWER_UP),
+            'operstate': OPERSTATES[operstate[0]] if operstate and operstate[0] < len(OPERSTATES) else 'UNKNOWN',
+            'mac': _mac(attrs.get(IFLA_ADDRESS)),
+            'mtu': _u32(attrs.get(IFLA_MTU)),
+            'rx_packets': counters[0],
+            'tx_packets': counters[1],
+            'rx_bytes': counters[2],
+            'tx_bytes': counters[3],
+        }
+    return result
+
+
+def addresses():
+    """``{ifindex: [{'family', 'address', 'prefixlen'}]}`` in kernel order."""
+    result = {}
+    for kind, body in _request(NETLINK_ROUTE, RTM_GETADDR,
+                               _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if kind != RTM_NEWADDR:
+            continue
+        family, prefixlen, _, _, index = _IFADDRMSG.unpack_from(body)
+        if family not in (socket.AF_INET, socket.AF_INET6):
+            continue
+        attrs = parse_attrs(body, _IFADDRMSG.size)
+        # IFA_ADDRESS is the peer on point-to-point links; IFA_LOCAL is ours
+        raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+        if not raw:
+            continue
+        result.setdefault(index, []).append({
+            'family': family,
+            'address': socket.inet_ntop(family, raw),
+            'prefixlen': prefixlen,
+        })
+    return result
+
+
+def neighbours():
+    """Neighbour table entries as dicts shaped like ``ip -j neigh`` output."""
+    names = {link['index']: name for name, link in get_links().items()}
+    entries = []
+    for kind, body in _request(NETLINK_ROUTE, RTM_GETNEIGH,
+                               _NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if kind != RTM_NEWNEIGH:
+            continue
+        family, index, state, _, _ = _NDMSG.unpack_from(body)
+        attrs = parse_attrs(body, _NDMSG.size)
+        dst = attrs.get(NDA_DST)
+        # Like ``ip neigh``, leave out NOARP entries (multicast, loopback)
+        if not dst or family not in (socket.AF_INET, socket.AF_INET6) or state == 0x40:
+            continue
+        entries.append({
+            'dst': socket.inet_ntop(family, dst),
+            'dev': names.get(index),
+            'lladdr': _mac(attrs.get(NDA_LLADDR)),
+            'state': next((n for bit, n in NUD_STATES if state & bit), 'NONE'),
+        })
+    return entries
+
+
+def _cached(name, fn, watched=True):
+    """``fn()``, cached; ``watched=False`` ignores the watcher's longer TTL."""
+    watching = watched and _watcher is not None and _watcher.is_alive()
+    ttl = WATCHED_TTL if watching else CACHE_TTL
+    with _cache_lock:
+        hit = _cache.get(name)
+        if hit and time.monotonic() - hit[0] < ttl:
+            return hit[1]
+    value = fn()
+    with _cache_lock:
+        _cache[name] = (time.monotonic(), value)
+    return value
+
+
+def get_links(counters=False):
+    """Cached :func:`links`; ``counters=True`` when the byte/packet counters are used."""
+    return _cached('links', links, watched=not counters)
+
+
+def get_addresses():
+    return _cached('addresses', addresses)
+
+
+def get_neighbours():
+    return _cached('neighbours', neighbours)
+
+
+def interface(name, counters=False):
+    """One link from :func:`get_links` with its ``addresses``, or ``None``."""
+    link = get_links(counters).get(name)
+    if link is None:
+        return None
+    return dict(link, addresses=get_addresses().get(link['index'], []))
+
+
+def first_address(name, family=socket.AF_INET):
+    """First address of ``family`` on ``name``, or ``None``."""
+    info = interface(name)
+    if info is None:
+        return None
+    return next((a['address'] for a in info['addresses'] if a['family'] == family), None)
+
+
+def _nl80211():
+    global _nl80211_id
+    if _nl80211_id is None:
+        payload = _GENLMSG.pack(CTRL_CMD_GETFAMILY, 1) + _attr(CTRL_ATTR_FAMILY_NAME, b'nl80211\0')
+        for _, body in _request(NETLINK_GENERIC, GENL_ID_CTRL, payload, NLM_F_ACK):
+            attrs = parse_attrs(body, _GENLMSG.size)
+            _nl80211_id = struct.unpack('=H', attrs[CTRL_ATTR_FAMILY_ID][:2])[0]
+    return _nl80211_id
+
+
+def _genl(cmd, ifindex, flags):
+    payload = _GENLMSG.pack(cmd, 0) + _attr(NL80211_ATTR_IFINDEX, struct.pack('=I', ifindex))
+    for _, body in _request(NETLINK_GENERIC, _nl80211(), payload, flags):
+        yield parse_attrs(body, _GENLMSG.size)
+
+
+def wireless(name):
+    """nl80211 state of a wireless interface, or ``None`` if not wireless."""
+    link = get_links().get(name)
+    if link is None:
+        return None
+    info = None
+    for attrs in _genl(NL80211_CMD_GET_INTERFACE, link['index'], 0):
+        ssid = attrs.get(NL80211_ATTR_SSID)
+        power = attrs.get(NL80211_ATTR_WIPHY_TX_POWER_LEVEL)
+        info = {
+            'name': name,
+            'mode': IFTYPES.get(_u32(attrs.get(NL80211_ATTR_IFTYPE)), 'Unknown'),
+            'ssid': ssid.decode('utf-8', 'replace') if ssid else None,
+            'frequency': _u32(attrs.get(NL80211_ATTR_WIPHY_FREQ)),
+            # mBm
+            'tx_power': _u32(power) / 100 if power else None,
+            'stations': [],
+        }
+    if info is None:
+        return None
+    for attrs in _genl(NL80211_CMD_GET_STATION, link['index'], NLM_F_DUMP):
+        sta = parse_attrs(attrs.get(NL80211_ATTR_STA_INFO) or b'')
+        rate = parse_attrs(sta.get(NL80211_STA_INFO_TX_BITRATE) or b'')
+        # 100 kbit/s units; BITRATE32 carries rates past 6.5 Gbit/s
+        bitrate = _u32(rate.get(NL80211_RATE_INFO_BITRATE32))
+        if bitrate is None and rate.get(NL80211_RATE_INFO_BITRATE):
+            bitrate = struct.unpack('=H', rate[NL80211_RATE_INFO_BITRATE][:2])[0]
+        signal = sta.get(NL80211_STA_INFO_SIGNAL)
+        info['stations'].append({
+            'mac': _mac(attrs.get(NL80211_ATTR_MAC)),
+            'signal': struct.unpack('=b', signal[:1])[0] if signal else None,
+            'tx_bitrate': bitrate / 10 if bitrate is not None else None,
+            'connected': _u32(sta.get(NL80211_STA_INFO_CONNECTED_TIME)),
+            'inactive_ms': _u32(sta.get(NL80211_STA_INFO_INACTIVE_TIME)),
+        })
+    return info
+
+
+def describe_wireless(name):
+    """Short text summary of a wireless interface, in place of ``iwconfig``."""
+    try:
+        info = wireless(name)
+    except OSError as e:
+        return f'Unable to retrieve interface statistics: {e.strerror}'
+    if info is None:
+        return 'no wireless extensions.'
+    lines = [f"{name}  Mode:{info['mode']}  ESSID:\"{info['ssid'] or ''}\""]
+    details = []
+    if info['frequency']:
+        details.append(f"Frequency:{info['frequency'] / 1000:g} GHz")
+    if info['tx_power'] is not None:
+        details.append(f"Tx-Power={info['tx_power']:g} dBm")
+    if details:
+        lines.append('  '.join(details))
+    if info['mode'] == 'Master':
+        lines.append(f"Stations: {len(info['stations'])}")
+    for sta in info['stations']:
+        parts = [sta['mac']]
+        if sta['signal'] is not None:
+            parts.append(f"signal {sta['signal']} dBm")
+        if sta['tx_bitrate'] is not None:
+            parts.append(f"tx {sta['tx_bitrate']:g} Mb/s")
+        if sta['connected'] is not None:
+            parts.append(f"connected {sta['connected']} s")
+        lines.append('  ' + ', '.join(parts))
+    return '\n'.join(lines)
+
+
+def _watch():
+    groups = RTMGRP_LINK | RTMGRP_NEIGH | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR
+    kinds = {
+        RTM_NEWLINK: 'link', RTM_DELLINK: 'link',
+        RTM_NEWADDR: 'address', RTM_DELADDR: 'address',
+        RTM_NEWNEIGH: 'neighbour', RTM_DELNEIGH: 'neighbour',
+    }
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                       NETLINK_ROUTE) as sock:
+        sock.bind((0, groups))
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                # Events were dropped; the cache may be stale either way
+                data = b''
+            events = set()
+            offset = 0
+            while offset + _NLMSG.size <= len(data):
+                length, kind, _, _, _ = _NLMSG.unpack_from(data, offset)
+                if length < _NLMSG.size:
+                    break
+                if kind in kinds:
+                    events.add(kinds[kind])
+                offset += _align(length)
+            with _cache_lock:
+                _cache.clear()
+            for event in events:
+                for callback in list(_subscribers):
+                    try:
+                        callback(event)
+                    except Exception:
+                        pass
+
+
+def watch():
+    """Start the change-event thread (once per process); False if unsupported."""
+    global _watcher
+    with _cache_lock:
+        if _watcher is not None and _watcher.is_alive():
+            return True
+        try:
+            # Fail here, not in the thread, where netlink is unavailable
+            socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE).close()
+        except (AttributeError, OSError):
+            return False
+        _watcher = threading.Thread(target=_watch, name='netlink-watch', daemon=True)
+        _watcher.start()
+        return True
+
+
+def subscribe(callback):
+    """Call ``callback(kind)`` ('link', 'address' or 'neighbour') on changes."""
+    _subscribers.append(callback)
+    watch()
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    for name in sys.argv[1:] or sorted(get_links()):
+        print(json.dumps(interface(name), sort_keys=True))
+        if os.path.isdir(f'/sys/class/net/{name}/wireless'):
+            print(describe_wireless(name))
+    print(json.dumps(get_neighbours(), sort_keys=True))
@@ -0,0 +1,122 @@
+"""Shared, cached ``border0 node state show --json``.
+
+The home dashboard, the VPN page and the probe engine all need the node
+state, and each used to fork the Border0 CLI for it, once per page load
+and per open tab. :func:`get` serves them all from one cache per CLI
+path:
+
+* a state younger than ``ttl`` seconds is returned as is;
+* otherwise one CLI run refreshes it, and callers arriving while it runs
+  wait on that same run rather than forking another (single flight);
+* a caller whose ``wait`` runs out before the CLI answers gets the last
+  good state (stale-while-revalidate) and the refresh carries on in the
+  background for the next caller.
+
+The JSON is parsed once into a :class:`NodeState`, so the newer
+``peers_v2``/``services_v2`` dicts and the legacy ``peers``/``services``
+lists are handled in one place.
+"""
+
+import json
+import threading
+import time
+from collections import namedtuple
+
+from . import runner
+
+DEFAULT_TTL = 10
+# Upper bound on one CLI run; callers usually wait less
+CLI_TIMEOUT = 20
+
+ExitNode = namedtuple('ExitNode', 'name peer_name dns_name public_ips')
+NodeState = namedtuple('NodeState', 'exit_node exit_nodes')
+
+_lock = threading.Lock()
+# cli -> (monotonic time, NodeState) of the last good run
+_states = {}
+# cli -> threading.Event of the run in flight, plus its (state, error)
+_flights = {}
+
+
+def parse(state):
+    """Build a :class:`NodeState` from the CLI's decoded JSON."""
+    exit_nodes = []
+    peers = state.get('peers_v2') or state.get('peers') or []
+    for peer in peers.values() if isinstance(peers, dict) else peers:
+        services = peer.get('services_v2') or peer.get('services') or []
+        for service in services.values() if isinstance(services, dict) else services:
+            if service.get('type') == 'exit_node':
+                exit_nodes.append(ExitNode(
+                    name=service.get('name'),
+                    peer_name=peer.get('name'),
+                    dns_name=service.get('dns_name'),
+                    public_ips=service.get('public_ips') or [],
+                ))
+    return NodeState(exit_node=state.get('exit_node') or None, exit_nodes=exit_nodes)
+
+
+def exit_ip(state):
+    """First public IP of the selected exit node, or ``None``."""
+    for node in state.exit_nodes:
+        if node.name == state.exit_node and node.public_ips:
+            # Entries are {'ip_address', 'metadata'} objects
+            first = node.public_ips[0]
+            return first.get('ip_address') if isinstance(first, dict) else first
+    return None
+
+
+def run(cli, timeout=CLI_TIMEOUT):
+    """Run the CLI once; returns ``(NodeState or None, error or None)``."""
+    try:
+        proc = runner.run([cli, 'node', 'state', 'show', '--json'], timeout=timeout)
+        if proc.returncode != 0:
+            return None, proc.stderr or proc.stdout
+        state = json.loads(proc.stdout)
+        if not isinstance(state, dict):
+            return None, 'unexpected node state output'
+        return parse(state), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _refresh(cli, flight):
+    state, error = run(cli)
+    with _lock:
+        if state is not None:
+            _states[cli] = (time.monotonic(), state)
+        flight.result = (state, error)
+        del _flights[cli]
+    flight.set()
+
+
+def get(cli, wait=CLI_TIMEOUT, ttl=DEFAULT_TTL):
+    """Node state for ``cli``; returns ``(NodeState or None, error or None)``.
+
+    Waits at most ``wait`` seconds for a refresh before falling back to
+    the last good state; with none, the error says the CLI timed out. A
+    refresh that fails within ``wait`` returns its error, not the stale
+    state.
+    """
+    with _lock:
+        cached = _states.get(cli)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1], None
+        flight = _flights.get(cli)
+        if flight is None:
+            flight = _flights[cli] = threading.Event()
+            threading.Thread(
+                target=_refresh, args=(cli, flight), name='node-state', daemon=True
+            ).start()
+    if flight.wait(wait):
+        return flight.result
+    if cached:
+        return cached[1], None
+    return None, f'Timed out after {wait:g} s waiting for the Border0 CLI'
+
+
+def invalidate(cli):
+    """Forget the cached state, e.g. after changing the exit node."""
+    with _lock:
+        if cli in _states:
+            # Keep it as the stale fallback, but refresh on the next call
+            _states[cli] = (float('-inf'), _states[cli][1])
@@ -0,0 +1,215 @@
+"""Precompiled OUI vendor index for MAC address lookups.
+
+``manuf.MacParser()`` parses the whole Wireshark ``manuf`` text file (45k
+lines) into a dict every time it is built. Here that file is compiled
+once, by setup.sh at image build or on first use, into a binary index
+(``INDEX_FILE``) that is mmapped and shared by every lookup in the
+process.
+
+The index holds one section per prefix length (the ``manuf`` file mixes
+/24 OUIs with /28 and /36 IEEE blocks and a few others). Each section is
+a sorted array of 48-bit prefixes and a parallel array of offsets into a
+table of NUL-terminated vendor names. A lookup tries the sections from
+most to least specific and binary-searches each, so it costs
+O(sections * log n) and builds no Python objects except the result.
+Arrays are in native byte order, since the index is built on the device
+that reads it.
+
+The header records the source file's size and mtime; a lookup against an
+index older than its source recompiles it. ``python3 -m gateway_admin.oui
+build`` compiles it by hand; benchmarks/bench_oui.py compares lookups
+with ``manuf.MacParser``.
+"""
+
+import array
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+
+INDEX_FILE = '/var/lib/border0/oui.idx'
+# Used when the manuf package is not installed
+SYSTEM_MANUF = '/usr/share/wireshark/manuf'
+MAGIC = b'OUI1'
+# magic, source mtime_ns, source size, section count, offset of the names
+_HEADER = struct.Struct('=4sQQII4x')
+# prefix length, entry count, offset of the prefixes, offset of the names
+_SECTION = struct.Struct('=B3xIQQ')
+_HEX_RE = re.compile(r'[^0-9A-Fa-f]')
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def source_path():
+    """Path of the ``manuf`` database to compile, or ``None``."""
+    try:
+        import manuf
+        path = os.path.join(os.path.dirname(manuf.__file__), 'manuf')
+        if os.path.exists(path):
+            return path
+    except ImportError:
+        pass
+    return SYSTEM_MANUF if os.path.exists(SYSTEM_MANUF) else None
+
+
+def parse_manuf(text):
+    """Yield ``(prefix_bits, prefix, short_name)`` for each manuf entry.
+
+    Prefix lengths follow manuf.MacParser: the digits given, or the
+    ``/bits`` suffix when that is shorter.
+    """
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] == '#':
+            continue
+        fields = [f.strip() for f in line.replace('\t\t', '\t').split('\t')]
+        if len(fields) < 2:
+            continue
+        address, _, bits = fields[0].partition('/')
+        digits = _HEX_RE.sub('', address)
+        if not digits or len(digits) > 12:
+            continue
+        length = 4 * len(digits)
+        if bits:
+            try:
+                length = min(length, int(bits))
+            except ValueError:
+                continue
+        if not 0 < length <= 48:
+            continue
+        value = int(digits, 16) << (48 - 4 * len(digits))
+        yield length, value >> (48 - length) << (48 - length), fields[1]
+
+
+def compile_index(source, dest=None):
+    """Compile ``source`` into index bytes; also written to ``dest`` if given."""
+    st = os.stat(source)
+    with open(source, encoding='utf-8', errors='replace') as f:
+        entries = parse_manuf(f.read())
+        sections = {}
+        for length, prefix, name in entries:
+            # Later lines win, as in manuf.MacParser
+            sections.setdefault(length, {})[prefix] = name
+    names = bytearray()
+    name_offsets = {}
+    arrays = []
+    for length in sorted(sections, reverse=True):
+        prefixes = sorted(sections[length])
+        offsets = array.array('I')
+        for prefix in prefixes:
+            name = sections[length][prefix]
+            if name not in name_offsets:
+                name_offsets[name] = len(names)
+                names += name.encode('utf-8') + b'\0'
+            offsets.append(name_offsets[name])
+        arrays.append((length, array.array('Q', prefixes), offsets))
+    pos = _HEADER.size + _SECTION.size * len(arrays)
+    table = []
+    body = bytearray()
+    for length, prefixes, offsets in arrays:
+        prefix_at = pos + len(body)
+        body += prefixes.tobytes()
+        offsets_at = pos + len(body)
+        body += offsets.tobytes()
+        # Keep the next prefix array 8-byte aligned
+        body += b'\0' * (-len(body) % 8)
+        table.append(_SECTION.pack(length, len(prefixes), prefix_at, offsets_at))
+    header = _HEADER.pack(MAGIC, st.st_mtime_ns, st.st_size, len(arrays), pos + len(body))
+    data = header + b''.join(table) + body + bytes(names)
+    if dest:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, dest)
+    return data
+
+
+class OuiIndex:
+    """Vendor lookups against compiled index bytes (or an mmap of them)."""
+
+    def __init__(self, buf):
+        (magic, self.source_mtime, self.source_size, count,
+         self._names_at) = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise ValueError('not an OUI index')
+        self._buf = buf
+        view = memoryview(buf)
+        self._sections = []
+        for i in range(count):
+            length, n, prefix_at, offsets_at = _SECTION.unpack_from(
+                buf, _HEADER.size + _SECTION.size * i
+            )
+            self._sections.append((
+                length,
+                view[prefix_at:prefix_at + 8 * n].cast('Q'),
+                view[offsets_at:offsets_at + 4 * n].cast('I'),
+            ))
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _name(self, offset):
+        start = self._names_at + offset
+        return self._buf[start:self._buf.find(b'\0', start)].decode('utf-8')
+
+    def lookup(self, mac):
+        """Short vendor name for ``mac`` (any separators), or ``None``."""
+        digits = _HEX_RE.sub('', mac)
+        if len(digits) != 12:
+            return None
+        value = int(digits, 16)
+        for length, prefixes, offsets in self._sections:
+            key = value >> (48 - length) << (48 - length)
+            i = bisect.bisect_left(prefixes, key)
+            if i < len(prefixes) and prefixes[i] == key:
+                return self._name(offsets[i])
+        return None
+
+
+def _load(path, source):
+    """Open the index at ``path``, (re)compiling it from ``source`` if needed."""
+    st = os.stat(source) if source else None
+    try:
+        index = OuiIndex.open(path)
+        if st is None or (index.source_mtime, index.source_size) == (st.st_mtime_ns, st.st_size):
+            return index
+    except (OSError, ValueError, struct.error):
+        if st is None:
+            return None
+    try:
+        compile_index(source, path)
+        return OuiIndex.open(path)
+    except OSError:
+        # Read-only or missing directory: keep the index in memory only
+        return OuiIndex(compile_index(source))
+
+
+def vendor(mac, path=INDEX_FILE):
+    """Manufacturer of ``mac`` from the shared index, or ''."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = _load(path, source_path()) or False
+                except (OSError, ValueError):
+                    _index = False
+    return (_index.lookup(mac) or '') if _index else ''
+
+
+if __name__ == '__main__':
+    # python3 -m gateway_admin.oui build [index path]
+    if sys.argv[1:2] not in ([], ['build']):
+        sys.exit('usage: python3 -m gateway_admin.oui build [index path]')
+    source = source_path()
+    if not source:
+        sys.exit('no manuf database found')
+    dest = sys.argv[2] if len(sys.argv) > 2 else INDEX_FILE
+    print(f'{dest}: {len(compile_index(source, dest))} bytes from {source}')
@@ -0,0 +1,322 @@
+"""Path latency and loss probes for the metrics collector.
+
+A :class:`ProbeEngine` thread probes a few targets every
+``PROBE_INTERVAL`` seconds and records one ``probe-<name>`` record per
+round: RTT min/p50/p90/max and jitter (mean difference between
+consecutive RTTs) in milliseconds, plus loss in percent.
+
+Targets, by default:
+
+* ``gateway`` - the WAN default gateway, read from /proc/net/route
+* ``public``  - a configurable public host (``--probe-target``)
+* ``exit``    - the first public IP of the Border0 exit node currently
+  selected, from ``border0 node state show --json`` (refreshed every few
+  minutes, not per round)
+
+Each target uses one of three probe kinds, written ``kind:host[:port]``:
+``icmp`` echo (an unprivileged ICMP datagram socket when the kernel allows
+it, a raw socket otherwise), ``tcp`` connect time, or ``udp`` (a DNS
+query; any datagram back from the target counts, so a UDP echo server
+works as well). A refused TCP connection or an ICMP port unreachable
+still measures the path and counts as a reply.
+
+Probing runs off the sampling loop so a slow or dead target never delays
+a sample. For a quick check against a local stand-in, run
+``python3 -m gateway_admin.probes tcp:127.0.0.1:8080`` from webui/.
+"""
+
+import ipaddress
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from . import node_state
+from .metrics_store import (
+    PROBE_COLUMNS, PROBE_TIERS, TieredSeries, probe_series, remove_series,
+)
+
+# One round per raw bucket of the probe series
+PROBE_INTERVAL = PROBE_TIERS[0][1]
+# Probes per round, the gap between them and how long to wait for a reply
+PROBE_COUNT = 5
+PROBE_GAP = 0.2
+PROBE_TIMEOUT = 1.0
+DEFAULT_PUBLIC_TARGET = 'icmp:1.1.1.1'
+# Seconds between exit-node lookups through the Border0 CLI
+EXIT_REFRESH = 300
+ROUTE_FILE = '/proc/net/route'
+PROBES_FILE = 'probes.json'
+DEFAULT_PORTS = {'tcp': 443, 'udp': 53}
+
+
+def read_probes(directory):
+    """Return ``{name: {'kind', 'host', 'port'}}`` of the current targets."""
+    try:
+        with open(os.path.join(directory, PROBES_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_target(spec):
+    """Parse ``kind:host[:port]`` (kind defaults to icmp) into a tuple."""
+    kind, _, rest = spec.partition(':')
+    if kind not in ('icmp', 'tcp', 'udp'):
+        kind, rest = 'icmp', spec
+    host, port = rest, DEFAULT_PORTS.get(kind)
+    if kind != 'icmp' and rest.count(':') == 1:
+        host, port_text = rest.rsplit(':', 1)
+        port = int(port_text)
+    return kind, host, port
+
+
+def default_gateway(iface=None):
+    """IPv4 default gateway (optionally on ``iface``) or ``None``."""
+    try:
+        with open(ROUTE_FILE) as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return None
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3 or parts[1] != '00000000':
+            continue
+        if iface and parts[0] != iface:
+            continue
+        return socket.inet_ntoa(struct.pack('<I', int(parts[2], 16)))
+    return None
+
+
+def exit_node_ip(cli):
+    """First public IPv4 address (a string) of the selected exit node, or ``None``.
+
+    ``public_ips`` entries are ``{'ip_address', 'metadata'}`` objects;
+    anything that is not an IPv4 address is not probed, since the ICMP
+    probe is IPv4 only.
+    """
+    state, _ = node_state.run(cli)
+    ip = node_state.exit_ip(state) if state else None
+    try:
+        return str(ipaddress.IPv4Address(ip))
+    except ValueError:
+        return None
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def _icmp_socket():
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except PermissionError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+def _wait(sock, deadline):
+    remaining = deadline - time.monotonic()
+    return remaining > 0 and bool(select.select([sock], [], [], remaining)[0])
+
+
+def probe_icmp(host, seq, timeout=PROBE_TIMEOUT):
+    """Round-trip seconds of one ICMP echo, or ``None`` when lost."""
+    sock, raw = _icmp_socket()
+    try:
+        ident = os.getpid() & 0xffff
+        payload = b'border0-probe'
+        header = struct.pack('!BBHHH', 8, 0, 0, ident, seq)
+        packet = struct.pack(
+            '!BBHHH', 8, 0, _checksum(header + payload), ident, seq
+        ) + payload
+        start = time.monotonic()
+        deadline = start + timeout
+        sock.sendto(packet, (host, 0))
+        while _wait(sock, deadline):
+            data, addr = sock.recvfrom(1024)
+            if raw:
+                # Raw sockets deliver the IP header too
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8 or addr[0] != host:
+                continue
+            kind, _, _, reply_id, reply_seq = struct.unpack('!BBHHH', data[:8])
+            # Datagram sockets rewrite the identifier, so only raw sockets
+            # (which see every echo reply on the host) check it
+            if kind == 0 and reply_seq == seq and (not raw or reply_id == ident):
+                return time.monotonic() - start
+        return None
+    finally:
+        sock.close()
+
+
+def probe_tcp(host, port, timeout=PROBE_TIMEOUT):
+    """Seconds to complete (or be refused) a TCP handshake."""
+    start = time.monotonic()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            pass
+    except ConnectionRefusedError:
+        pass
+    except OSError:
+        return None
+    return time.monotonic() - start
+
+
+def probe_udp(host, port, seq, timeout=PROBE_TIMEOUT):
+    """Seconds until any datagram comes back for a DNS root NS query."""
+    query = struct.pack('!HHHHHH', seq, 0x0100, 1, 0, 0, 0) + b'\0' + struct.pack('!HH', 2, 1)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect((host, port))
+            start = time.monotonic()
+            sock.send(query)
+            if _wait(sock, start + timeout):
+                sock.recv(512)
+                return time.monotonic() - start
+        except ConnectionRefusedError:
+            # Port unreachable: the host answered, which is what we time
+            return time.monotonic() - start
+        except OSError:
+            pass
+    return None
+
+
+def run_round(kind, host, port=None, count=PROBE_COUNT, gap=PROBE_GAP,
+              timeout=PROBE_TIMEOUT):
+    """Probe a target ``count`` times; returns a PROBE_COLUMNS record."""
+    rtts = []
+    for seq in range(count):
+        if seq:
+            time.sleep(gap)
+        try:
+            if kind == 'icmp':
+                rtt = probe_icmp(host, seq, timeout)
+            elif kind == 'tcp':
+                rtt = probe_tcp(host, port, timeout)
+            else:
+                rtt = probe_udp(host, port, seq, timeout)
+        except OSError:
+            rtt = None
+        rtts.append(rtt)
+    return summarize(rtts)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def summarize(rtts):
+    """Turn round-trip times (``None`` for a loss) into a record."""
+    got = [r * 1000 for r in rtts if r is not None]
+    record = {'loss': 100.0 * (len(rtts) - len(got)) / len(rtts) if rtts else None}
+    if got:
+        ordered = sorted(got)
+        record.update(
+            rtt_min=ordered[0], rtt_p50=_percentile(ordered, 0.5),
+            rtt_p90=_percentile(ordered, 0.9), rtt_max=ordered[-1],
+            jitter=(sum(abs(b - a) for a, b in zip(got, got[1:])) / (len(got) - 1)
+                    if len(got) > 1 else 0.0),
+        )
+    return record
+
+
+class ProbeEngine(threading.Thread):
+    """Background thread probing every target each PROBE_INTERVAL."""
+
+    def __init__(self, directory, public_target=DEFAULT_PUBLIC_TARGET,
+                 wan_iface_file=None, cli='border0', interval=PROBE_INTERVAL):
+        super().__init__(name='probes', daemon=True)
+        self.directory = directory
+        self.public = parse_target(public_target) if public_target else None
+        self.wan_iface_file = wan_iface_file
+        self.cli = cli
+        self.interval = interval
+        self._series = {}
+        self._exit_ip = None
+        self._exit_checked = None
+
+    def targets(self):
+        """Return ``{name: (kind, host, port)}`` for this round."""
+        targets = {}
+        wan = None
+        if self.wan_iface_file:
+            try:
+                with open(self.wan_iface_file) as f:
+                    wan = f.read().strip() or None
+            except OSError:
+                pass
+        gateway = default_gateway(wan)
+        if gateway:
+            targets['gateway'] = ('icmp', gateway, None)
+        if self.public:
+            targets['public'] = self.public
+        now = time.monotonic()
+        if self._exit_checked is None or now - self._exit_checked >= EXIT_REFRESH:
+            self._exit_ip = exit_node_ip(self.cli)
+            self._exit_checked = now
+        if self._exit_ip:
+            targets['exit'] = ('icmp', self._exit_ip, None)
+        return targets
+
+    def _write_targets(self, targets):
+        path = os.path.join(self.directory, PROBES_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                name: {'kind': kind, 'host': host, 'port': port}
+                for name, (kind, host, port) in targets.items()
+            }, f, sort_keys=True)
+        os.replace(tmp, path)
+
+    def run(self):
+        tick = time.monotonic()
+        while True:
+            targets = {}
+            try:
+                targets = self.targets()
+                self._write_targets(targets)
+            except Exception:
+                # A failed target lookup skips this round only; a failed
+                # probes.json write still probes the targets
+                pass
+            for name, (kind, host, port) in targets.items():
+                try:
+                    record = run_round(kind, host, port)
+                except Exception:
+                    # A bad target must not end the thread
+                    continue
+                try:
+                    if name not in self._series:
+                        series = probe_series(name)
+                        # Drop tiers left over from an older tier layout
+                        remove_series(self.directory, series,
+                                      keep=[t for t, _, _ in PROBE_TIERS])
+                        self._series[name] = TieredSeries(
+                            self.directory, series, PROBE_COLUMNS, PROBE_TIERS
+                        )
+                    self._series[name].append(int(time.time() * 1000), record)
+                except Exception:
+                    pass
+            tick += self.interval
+            delay = tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Slow targets overran the interval; don't queue rounds up
+                tick = time.monotonic()
+
+
+if __name__ == '__main__':
+    import sys
+
+    for spec in sys.argv[1:] or [DEFAULT_PUBLIC_TARGET]:
+        print(spec, json.dumps(run_round(*parse_target(spec))))
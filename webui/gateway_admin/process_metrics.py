@@ -0,0 +1,123 @@
+"""Resource use of the gateway's own services, per process group.
+
+Each group in ``UNITS`` is found through the cgroups of its systemd units,
+so forks and restarts are picked up without matching command lines:
+``border0`` is the VPN data path (``border0 node start``), ``webui`` the
+Flask UI, ``hostapd`` the access point. dnsmasq has no unit of its own;
+ifupdown starts it from the networking units, so those cgroups are
+filtered by process name, and when no cgroup can be read (cgroup v1 or a
+development machine) any process of that name is taken.
+
+For every group :class:`ProcessSampler` sums CPU time (as percent of one
+core over the time actually elapsed), RSS, threads, open file descriptors
+and context switches per second.
+"""
+
+import glob
+import os
+
+import psutil
+
+from .metrics_store import PROC_COLUMNS, PROC_GROUPS
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+# group -> (unit cgroup paths relative to CGROUP_ROOT, process name filter)
+UNITS = {
+    'border0': (('system.slice/border0-device.service',), None),
+    'hostapd': (('system.slice/hostapd.service',
+                 'system.slice/system-hostapd.slice/hostapd@*.service'), None),
+    'dnsmasq': (('system.slice/networking.service',
+                 'system.slice/system-ifup.slice/ifup@*.service',
+                 'system.slice/dnsmasq.service'), 'dnsmasq'),
+    'webui': (('system.slice/border0-webui.service',), None),
+}
+
+
+def unit_pids(patterns):
+    """PIDs in the cgroups matching ``patterns``, including sub-cgroups."""
+    pids = set()
+    for pattern in patterns:
+        for unit in glob.glob(os.path.join(CGROUP_ROOT, pattern)):
+            for path in glob.glob(os.path.join(unit, '**', 'cgroup.procs'),
+                                  recursive=True):
+                try:
+                    with open(path) as f:
+                        pids.update(int(line) for line in f if line.strip())
+                except (OSError, ValueError):
+                    continue
+    return pids
+
+
+class ProcessSampler:
+    """Samples every group in PROC_GROUPS; one instance per collector."""
+
+    def __init__(self):
+        # pid -> psutil.Process, kept so cpu/ctx counters can be diffed
+        self._procs = {}
+        # pid -> (cpu seconds, context switches) at the previous sample
+        self._prev = {}
+
+    def _group_pids(self, group):
+        patterns, name = UNITS[group]
+        pids = unit_pids(patterns)
+        if name is None:
+            return pids
+        matched = {pid for pid in pids if self._name(pid) == name}
+        if matched or pids:
+            return matched
+        # No readable cgroup: fall back to the process name
+        return {
+            p.pid for p in psutil.process_iter(['name'])
+            if p.info['name'] == name
+        }
+
+    def _process(self, pid):
+        proc = self._procs.get(pid)
+        if proc is None or not proc.is_running():
+            proc = self._procs[pid] = psutil.Process(pid)
+            self._prev.pop(pid, None)
+        return proc
+
+    def _name(self, pid):
+        try:
+            return self._process(pid).name()
+        except psutil.Error:
+            return None
+
+    def sample(self, seconds):
+        """Return ``{group: {column: value}}`` for the last ``seconds``.
+
+        A process seen for the first time contributes no CPU or context
+        switches until the next sample, which has its baseline.
+        """
+        seen = set()
+        samples = {}
+        for group in PROC_GROUPS:
+            totals = dict.fromkeys(PROC_COLUMNS, 0)
+            for pid in self._group_pids(group):
+                try:
+                    proc = self._process(pid)
+                    with proc.oneshot():
+                        times = proc.cpu_times()
+                        cpu = times.user + times.system
+                        ctx = sum(proc.num_ctx_switches())
+                        rss = proc.memory_info().rss
+                        threads = proc.num_threads()
+                        fds = proc.num_fds()
+                except psutil.Error:
+                    continue
+                seen.add(pid)
+                totals['procs'] += 1
+                totals['rss'] += rss
+                totals['threads'] += threads
+                totals['fds'] += fds
+                before = self._prev.get(pid)
+                self._prev[pid] = (cpu, ctx)
+                if before is not None:
+                    totals['cpu'] += max(cpu - before[0], 0) / seconds * 100
+                    totals['ctx_switches'] += max(ctx - before[1], 0) / seconds
+            samples[group] = totals
+        for pid in set(self._procs) - seen:
+            self._procs.pop(pid, None)
+            self._prev.pop(pid, None)
+        return samples
@@ -0,0 +1,101 @@
+"""One place to run external commands from the web UI.
+
+Routes and collectors call :func:`run` in place of ``subprocess.run``
+(and :func:`spawn` in place of ``subprocess.Popen`` for long-lived,
+streamed children such as ``border0 client login``). That gives every
+command:
+
+* a timeout, ``DEFAULT_TIMEOUT`` unless the caller passes one;
+* a slot among ``MAX_CHILDREN`` concurrent children, so a burst of open
+  tabs queues instead of forking dozens of CLIs on a small board. A
+  caller that cannot get a slot within its timeout gets the same
+  ``subprocess.TimeoutExpired`` as a command that ran too long;
+* per-program launch counts and per-command duration and failure
+  metrics in :mod:`telemetry`, exported on ``/metrics``. A failure is a
+  non-zero exit, a timeout or a command that could not be started.
+
+Results are not memoized here. Read-only commands run on every page view
+are cached by the modules that know when their result goes stale:
+:mod:`node_state` for ``border0 node state show`` and :mod:`systemd` for
+``systemctl show``.
+
+Output is captured as text unless the caller passes ``stdout``/``stderr``
+or ``text`` itself. ``check=True`` raises ``CalledProcessError`` as
+``subprocess.run`` does.
+"""
+
+import os
+import re
+import subprocess
+import threading
+import time
+
+from . import telemetry
+
+DEFAULT_TIMEOUT = 30
+MAX_CHILDREN = 4
+_SUBCOMMAND_RE = re.compile(r'[a-z][a-z-]*\Z')
+
+_slots = threading.BoundedSemaphore(MAX_CHILDREN)
+
+
+def command_name(argv):
+    """Metric label for ``argv``: the program, plus its subcommand if any.
+
+    Only a plain lowercase word counts as a subcommand (``systemctl
+    is-active``, ``border0 node``), so interface names, paths and other
+    arguments never end up in a label.
+    """
+    name = _program(argv)
+    if len(argv) > 1 and _SUBCOMMAND_RE.match(str(argv[1])):
+        name += ' ' + argv[1]
+    return name
+
+
+def _program(argv):
+    return os.path.basename(str(argv[0])) if argv else '?'
+
+
+def run(argv, timeout=DEFAULT_TIMEOUT, check=False, **kwargs):
+    """``subprocess.run`` with a default timeout, a concurrency cap and metrics."""
+    argv = list(argv)
+    if 'stdout' not in kwargs and 'stderr' not in kwargs:
+        kwargs.setdefault('capture_output', True)
+    kwargs.setdefault('text', True)
+    name = command_name(argv)
+    start = time.monotonic()
+    if not _slots.acquire(timeout=timeout):
+        telemetry.observe_subprocess(name, 0.0, failed=True)
+        raise subprocess.TimeoutExpired(argv, timeout)
+    try:
+        # Time spent queueing counts against the caller's timeout
+        remaining = None if timeout is None else max(timeout - (time.monotonic() - start), 0.001)
+        started = time.monotonic()
+        telemetry.count_subprocess(_program(argv))
+        try:
+            result = subprocess.run(argv, timeout=remaining, **kwargs)
+        except (OSError, subprocess.SubprocessError):
+            telemetry.observe_subprocess(name, time.monotonic() - started, failed=True)
+            raise
+    finally:
+        _slots.release()
+    telemetry.observe_subprocess(name, time.monotonic() - started, failed=result.returncode != 0)
+    if check:
+        result.check_returncode()
+    return result
+
+
+def spawn(argv, **kwargs):
+    """``subprocess.Popen`` for children that outlive a request.
+
+    These do not take a slot, since they run for minutes and are bounded
+    by their callers (one login flow, one upgrade); failing to start one
+    still counts as a failure.
+    """
+    telemetry.count_subprocess(_program(argv))
+    try:
+        return subprocess.Popen(list(argv), **kwargs)
+    except OSError:
+        telemetry.observe_subprocess(command_name(argv), 0.0, failed=True)
+        raise
+
@@ -0,0 +1,210 @@
+"""RAM staging for the collector's metrics rings and the dnsmasq logs.
+
+Writing metrics and DHCP logs straight to the SD card is the main source
+of card wear on the gateway. In staging mode the collector keeps its
+rings in a tmpfs directory (``/run/border0/metrics``) and dnsmasq logs to
+``/run/border0/log``; a :class:`Stager` copies both to persistent storage
+in batches every ``flush_interval`` seconds and on clean shutdown, so at
+most one interval of history is lost on a power cut.
+
+* Rings are synced incrementally (see metrics_store.sync_ring): only the
+  records appended since the last flush are written.
+* Staged logs are appended to their persistent file and truncated
+  (copy-truncate, as logrotate does; dnsmasq opens its log with
+  O_APPEND). Lines dnsmasq appends while the copy is synced are read
+  again right before the truncate, so only a line written between that
+  last read and the truncate itself can be lost.
+* A log growing past ``LOG_FLUSH_BYTES`` is flushed early so tmpfs use
+  stays bounded.
+
+Bytes written to persistent storage per day, by source, are kept in
+``writes.json`` in the persistent metrics directory, next to the bytes the
+kernel reports written to the root block device, so the effect on card
+wear can be measured.
+"""
+
+import datetime
+import json
+import os
+import shutil
+
+from . import metrics_store
+from .metrics_store import StoreError
+
+# Where staged files live; the web UI reads metrics from STAGING_DIR
+STAGING_DIR = '/run/border0/metrics'
+LOG_STAGING_DIR = '/run/border0/log'
+# Persistent directory the staged dnsmasq logs are appended to
+LOG_DIR = '/var/log'
+# Seconds between flushes; also the most history a power cut loses
+FLUSH_INTERVAL = 600
+# A staged log this large is flushed without waiting for the interval
+LOG_FLUSH_BYTES = 1024 * 1024
+WRITES_FILE = 'writes.json'
+# Days of write accounting kept in WRITES_FILE
+WRITES_DAYS = 60
+# Indexes the collector keeps next to the rings
+_JSON_FILES = (metrics_store.INTERFACES_FILE, metrics_store.CLIENTS_FILE)
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+def read_writes(directory):
+    """Return ``{day: {source: bytes}}`` from ``directory``/writes.json."""
+    try:
+        with open(os.path.join(directory, WRITES_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class Stager:
+    """Seeds ``staging_dir`` from ``persist_dir`` and flushes it back.
+
+    With ``staging_dir=None`` the rings are written in place and only the
+    write accounting is kept, which gives the baseline to compare with.
+    """
+
+    def __init__(self, staging_dir, persist_dir, log_staging_dir=LOG_STAGING_DIR,
+                 log_dir=LOG_DIR, flush_interval=FLUSH_INTERVAL):
+        self.staging_dir = staging_dir
+        self.persist_dir = persist_dir
+        self.log_staging_dir = log_staging_dir
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.writes = read_writes(persist_dir)
+        # Written bytes not yet saved to WRITES_FILE, {source: bytes}
+        self._pending = {}
+
+    def seed(self):
+        """Copy persisted files that the staging directory lacks.
+
+        After a reboot tmpfs is empty and everything is restored; after a
+        collector restart the staged copies are newer and are kept.
+        """
+        if self.staging_dir is None:
+            return
+        os.makedirs(self.staging_dir, exist_ok=True)
+        os.makedirs(self.log_staging_dir, exist_ok=True)
+        try:
+            names = os.listdir(self.persist_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not (name.endswith('.ring') or name in _JSON_FILES
+                    or name == WRITES_FILE):
+                continue
+            dst = os.path.join(self.staging_dir, name)
+            if not os.path.exists(dst):
+                shutil.copyfile(os.path.join(self.persist_dir, name), dst)
+
+    def count(self, source, nbytes):
+        """Add ``nbytes`` written by ``source`` to today's total."""
+        if nbytes:
+            self._pending[source] = self._pending.get(source, 0) + nbytes
+
+    def flush(self):
+        """Persist staged rings, their JSON indexes and the logs."""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        names = []
+        if self.staging_dir is not None:
+            try:
+                names = sorted(os.listdir(self.staging_dir))
+            except FileNotFoundError:
+                pass
+        for name in names:
+            src = os.path.join(self.staging_dir, name)
+            dst = os.path.join(self.persist_dir, name)
+            try:
+                if name.endswith('.ring'):
+                    self.count('metrics', metrics_store.sync_ring(src, dst))
+                elif name in _JSON_FILES:
+                    self.count('metrics', self._sync_file(src, dst))
+            except (OSError, StoreError):
+                pass
+        self._remove_expired(names)
+        self.flush_logs()
+        self._save_writes()
+
+    def _remove_expired(self, staged):
+        """Delete persisted client and interface series the collector has dropped."""
+        if self.staging_dir is None:
+            return
+        staged = set(staged)
+        for name in os.listdir(self.persist_dir):
+            if (name.startswith((metrics_store.CLIENT_PREFIX, metrics_store.IFACE_PREFIX))
+                    and name.endswith('.ring') and name not in staged):
+                try:
+                    os.remove(os.path.join(self.persist_dir, name))
+                except OSError:
+                    pass
+
+    def flush_logs(self, min_bytes=0):
+        """Move staged logs of at least ``min_bytes`` to the log directory."""
+        try:
+            names = sorted(os.listdir(self.log_staging_dir))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith('.log'):
+                continue
+            src = os.path.join(self.log_staging_dir, name)
+            try:
+                if os.path.getsize(src) < max(min_bytes, 1):
+                    continue
+                with open(src, 'r+b') as staged, \
+                        open(os.path.join(self.log_dir, name), 'ab') as out:
+                    data = staged.read()
+                    out.write(data)
+                    out.flush()
+                    os.fdatasync(out.fileno())
+                    # Pick up what was appended during the sync and
+                    # truncate straight after
+                    tail = staged.read()
+                    staged.truncate(0)
+                    if tail:
+                        out.write(tail)
+                        out.flush()
+                        os.fdatasync(out.fileno())
+                self.count('logs', len(data) + len(tail))
+            except OSError:
+                pass
+
+    def _sync_file(self, src, dst):
+        with open(src, 'rb') as f:
+            data = f.read()
+        try:
+            with open(dst, 'rb') as f:
+                if f.read() == data:
+                    return 0
+        except FileNotFoundError:
+            pass
+        tmp = dst + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, dst)
+        return len(data)
+
+    def _save_writes(self):
+        if not self._pending:
+            return
+        day = self.writes.setdefault(_today(), {})
+        for source, nbytes in self._pending.items():
+            day[source] = day.get(source, 0) + nbytes
+        self._pending = {}
+        for old in sorted(self.writes)[:-WRITES_DAYS]:
+            del self.writes[old]
+        path = os.path.join(self.persist_dir, WRITES_FILE)
+        try:
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.writes, f, sort_keys=True)
+            os.replace(tmp, path)
+            # The web UI reads the staging directory
+            if self.staging_dir is not None:
+                shutil.copyfile(path, os.path.join(self.staging_dir, WRITES_FILE))
+        except OSError:
+            pass
@@ -0,0 +1,240 @@
+"""Cached reads and atomic writes of the small state files the UI keeps.
+
+The routes re-open and re-parse the same handful of files on most
+requests: the WAN/LAN interface selections, the org file, the token
+metadata, the version cache, the client token and ``device.state.yaml``.
+This generalises the cache ``auth_mode.current_mode()`` keeps. A
+:func:`read` costs one ``stat()`` and parses the file again only when
+its inode, mtime or size changed. :func:`write` replaces a file
+atomically and stores the value it wrote, so the next read is a stat as
+well. Either way an edit made outside the UI shows up on the next
+request.
+
+Each read names a kind, which picks the parser and the type returned:
+
+- ``text``: the stripped contents (``str``);
+- ``json`` / ``yaml``: the decoded document;
+- ``org``: the org file, JSON ``{"org_subdomain", "org_id"}`` or a bare
+  subdomain, always as a dict;
+- ``jwt``: the claims of the JWT in the file (``dict``);
+- ``device_state``: the fields of ``device.state.yaml`` the VPN page
+  shows, for the current org (``dict``).
+
+The accessors at the bottom name the files themselves. Parsed values are
+shared between callers, so treat them as read-only.
+"""
+
+import base64
+import json
+import os
+import secrets
+import threading
+
+import yaml
+
+from .config import Config
+
+# libyaml's loader parses an order of magnitude faster than the
+# pure-Python one; PyYAML only has it when built against libyaml.
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _parse_org(text):
+    text = text.strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    return data if isinstance(data, dict) else {'org_subdomain': text}
+
+
+def parse_jwt(text):
+    """Claims of the JWT in ``text``; raises ``ValueError`` if it has none."""
+    parts = text.strip().split('.')
+    if len(parts) < 2:
+        raise ValueError('not a JWT')
+    claims = json.loads(base64.urlsafe_b64decode(parts[1] + '=' * (-len(parts[1]) % 4)))
+    if not isinstance(claims, dict):
+        raise ValueError('JWT claims are not an object')
+    return claims
+
+
+def _parse_yaml(text):
+    try:
+        return yaml.load(text, Loader=_YamlLoader)
+    except yaml.YAMLError as e:
+        raise ValueError(str(e))
+
+
+def _device_summary(doc):
+    """Flat dict of the current org's block of a parsed device.state.yaml."""
+    if not isinstance(doc, dict):
+        raise ValueError('device state is not a mapping')
+    current = doc.get('current_organization')
+    orgs = doc.get('organizations') or {}
+    org_block = orgs.get(current) if current else None
+    if not isinstance(org_block, dict):
+        # Fall back to the first org block if 'current_organization' is missing.
+        for v in orgs.values():
+            if isinstance(v, dict):
+                org_block = v
+                break
+    if not isinstance(org_block, dict):
+        raise ValueError('device state has no organization')
+    key_block = org_block.get('key') or {}
+    profile = org_block.get('profile') or {}
+    return {
+        'device_id': org_block.get('device_id'),
+        'self_ip_v4': org_block.get('self_ip_v4'),
+        'self_ip_v6': org_block.get('self_ip_v6'),
+        'network_cidr_v4': org_block.get('network_cidr_v4'),
+        'network_cidr_v6': org_block.get('network_cidr_v6'),
+        'resources_cidr_v4': org_block.get('resources_cidr_v4'),
+        'resources_cidr_v6': org_block.get('resources_cidr_v6'),
+        'public_key': key_block.get('public_key'),
+        'key_expires_at': key_block.get('expires_at'),
+        'managed_interfaces': org_block.get('managed_network_interfaces') or [],
+        'exit_node': org_block.get('exit_node'),
+        'last_updated_at': org_block.get('last_updated_at'),
+        'profile_name': profile.get('name'),
+        'profile_email': profile.get('email'),
+        'org_subdomain': profile.get('org_subdomain'),
+        'org_id': profile.get('org_id'),
+    }
+
+
+KINDS = {
+    'text': str.strip,
+    'json': json.loads,
+    'yaml': _parse_yaml,
+    'org': _parse_org,
+    'jwt': parse_jwt,
+    # Only the summary is cached; the full document (every org and its
+    # peers) is dropped as soon as it has been read.
+    'device_state': lambda text: _device_summary(_parse_yaml(text)),
+}
+
+
+def _stamp(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def read(path, kind='text', default=None):
+    """Parsed contents of ``path``, or ``default`` if it is missing or unparseable."""
+    if not path:
+        return default
+    key = (path, kind)
+    try:
+        stamp = _stamp(os.stat(path))
+    except OSError:
+        with _cache_lock:
+            _cache.pop(key, None)
+        return default
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit is None or hit[0] != stamp:
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = KINDS[kind](f.read())
+        except (OSError, ValueError, UnicodeError):
+            value = None
+        # Keyed on the stat taken before reading: if the file changed in
+        # between, the next read sees a new stamp and parses it again.
+        hit = (stamp, value)
+        with _cache_lock:
+            _cache[key] = hit
+    return default if hit[1] is None else hit[1]
+
+
+def write(path, data, kind='text', perms=0o644):
+    """Atomically replace ``path`` and cache it as ``kind``.
+
+    ``data`` is written as given when it is a string, or as JSON
+    otherwise. The temp file is fsynced before the rename, so a power
+    cut leaves either the old file or the new one.
+    """
+    text = data if isinstance(data, str) else json.dumps(data)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp.{os.getpid()}.{secrets.token_hex(4)}'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, perms)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    stamp = _stamp(os.stat(path))
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == path]:
+            del _cache[key]
+        try:
+            _cache[(path, kind)] = (stamp, KINDS[kind](text))
+        except ValueError:
+            pass
+
+
+def remove(path):
+    """Delete ``path`` if it exists; True if it did."""
+    invalidate(path)
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def invalidate(path):
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == path]:
+            del _cache[key]
+
+
+def wan_iface():
+    return read(Config.WAN_IFACE_PATH) or None
+
+
+def lan_iface():
+    return read(Config.LAN_IFACE_PATH) or None
+
+
+def org():
+    """``{'org_subdomain', 'org_id'}`` from the org file (either may be missing)."""
+    return read(Config.BORDER0_ORG_PATH, 'org', {})
+
+
+def org_subdomain():
+    """Org subdomain: the ``BORDER0_ORG`` override, else the org file, else ''."""
+    return Config.BORDER0_ORG or org().get('org_subdomain') or ''
+
+
+def token_metadata():
+    """Claims saved at login (plus the bound ``device_id``), or ``None``."""
+    return read(Config.BORDER0_TOKEN_METADATA_PATH, 'json')
+
+
+def version_cache():
+    return read(Config.VERSION_CACHE_PATH, 'json', {})
+
+
+def client_token_claims():
+    """Claims of the client token, or ``None`` if it is missing or malformed."""
+    return read(Config.BORDER0_TOKEN_PATH, 'jwt')
+
+
+def device_state_path():
+    # The Border0 daemon keeps its state next to the client token
+    return os.path.join(os.path.dirname(Config.BORDER0_TOKEN_PATH or ''), 'device.state.yaml')
+
+
+def device_state():
+    """Summary of the current org in device.state.yaml (see ``_device_summary``), or ``None``."""
+    return read(device_state_path(), 'device_state')
@@ -0,0 +1,145 @@
+"""Service status and control for systemd units.
+
+The home, VPN, LAN and Wi-Fi pages used to run ``systemctl status -n0``,
+``is-enabled`` and ``is-active`` for each unit on every page view, and
+then string-match ``Active: active``. :func:`status` reads every unit a
+page needs with one batched ``systemctl show -p ...``, and callers pass
+all their units in one call.
+
+Statuses are cached for ``CACHE_TTL`` seconds, so a page that polls
+reads each unit at most once per TTL whatever the number of open
+browsers, and a change made outside the web UI shows up within that
+time.
+
+:func:`start`, :func:`stop`, :func:`restart`, :func:`enable` and
+:func:`disable` run ``systemctl`` through :mod:`runner`, because
+systemctl waits for the job and reports why it failed. Each then drops
+the unit from the cache.
+"""
+
+import re
+import threading
+import time
+
+from . import runner
+
+# Unit properties read for a status, and their keys in it
+STATUS_PROPERTIES = (
+    ('LoadState', 'load_state'), ('ActiveState', 'active_state'),
+    ('SubState', 'sub_state'), ('UnitFileState', 'file_state'),
+    ('Description', 'description'),
+)
+
+CACHE_TTL = 5.0
+SHOW_TIMEOUT = 4.0
+
+_UNIT_SUFFIX_RE = re.compile(
+    r'\.(service|socket|target|device|mount|automount|swap|timer|path|slice|scope)\Z'
+)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def unit_name(name):
+    """``name`` with ``.service`` appended when it has no unit suffix."""
+    return name if _UNIT_SUFFIX_RE.search(name) else name + '.service'
+
+
+def _summary(props):
+    state = {key: props.get(prop) or '' for prop, key in STATUS_PROPERTIES}
+    state['active'] = state['active_state'] == 'active'
+    state['enabled'] = state['file_state'] == 'enabled'
+    return state
+
+
+def _systemctl_status(units):
+    """Statuses from one ``systemctl show`` for all ``units``."""
+    proc = runner.run(
+        ['systemctl', 'show', '-p', ','.join(p for p, _ in STATUS_PROPERTIES), *units],
+        timeout=SHOW_TIMEOUT,
+    )
+    if proc.returncode != 0:
+        raise OSError(proc.stderr.strip() or f'systemctl show exited {proc.returncode}')
+    # One block of Key=value lines per unit, in argument order
+    blocks = proc.stdout.strip('\n').split('\n\n')
+    result = {}
+    for unit, block in zip(units, blocks):
+        props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+        result[unit] = _summary(props)
+    return result
+
+
+def status(*names):
+    """``{name: {...}}`` with each unit's states and ``active``/``enabled`` flags.
+
+    Each status holds ``load_state``, ``active_state``, ``sub_state``,
+    ``file_state`` (as ``is-enabled`` prints it) and ``description``.
+    Raises ``OSError`` or ``subprocess.SubprocessError`` if systemctl
+    fails.
+    """
+    now = time.monotonic()
+    result = {}
+    missing = []
+    with _cache_lock:
+        for name in names:
+            hit = _cache.get(unit_name(name))
+            if hit and now - hit[0] < CACHE_TTL:
+                result[name] = hit[1]
+            else:
+                missing.append(name)
+    if missing:
+        units = [unit_name(name) for name in missing]
+        fetched = _systemctl_status(units)
+        with _cache_lock:
+            for name, unit in zip(missing, units):
+                _cache[unit] = (time.monotonic(), fetched[unit])
+                result[name] = fetched[unit]
+    return result
+
+
+def invalidate(name=None):
+    """Drop ``name`` (or every unit) from the status cache."""
+    with _cache_lock:
+        if name is None:
+            _cache.clear()
+        else:
+            _cache.pop(unit_name(name), None)
+
+
+def _systemctl(verb, name, *flags, timeout=runner.DEFAULT_TIMEOUT):
+    try:
+        return runner.run(['systemctl', verb, *flags, unit_name(name)], timeout=timeout)
+    finally:
+        invalidate(name)
+
+
+def start(name, timeout=runner.DEFAULT_TIMEOUT):
+    """Start a unit; returns the ``CompletedProcess`` of ``systemctl``."""
+    return _systemctl('start', name, timeout=timeout)
+
+
+def stop(name, timeout=runner.DEFAULT_TIMEOUT):
+    return _systemctl('stop', name, timeout=timeout)
+
+
+def restart(name, timeout=runner.DEFAULT_TIMEOUT):
+    return _systemctl('restart', name, timeout=timeout)
+
+
+def enable(name, now=False, timeout=runner.DEFAULT_TIMEOUT):
+    """Enable a unit, and start it too if ``now``."""
+    return _systemctl('enable', name, *(('--now',) if now else ()), timeout=timeout)
+
+
+def disable(name, now=False, timeout=runner.DEFAULT_TIMEOUT):
+    """Disable a unit, and stop it too if ``now``."""
+    return _systemctl('disable', name, *(('--now',) if now else ()), timeout=timeout)
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    # python3 -m gateway_admin.systemd [unit]... prints each unit's status
+    print(json.dumps(status(*(sys.argv[1:] or ['border0-device'])), indent=2, sort_keys=True))
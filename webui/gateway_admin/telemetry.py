@@ -0,0 +1,173 @@
+"""In-process counters for the web UI's own ``/metrics`` exposition.
+
+Everything here is bookkeeping done on the request path; nothing samples
+the system. ``init_app`` times every request per blueprint, :mod:`runner`
+reports each subprocess it starts, how long each command took and
+whether it failed, and other modules register gauges
+(e.g. the number of pending login flows) with :func:`register_gauge`.
+:func:`render` formats it all as OpenMetrics text.
+"""
+
+import math
+import threading
+import time
+
+from flask import g, request
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+# Request latency histogram buckets, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+# (blueprint, method, status) -> count
+_requests = {}
+# blueprint -> [per-bucket counts..., count, sum]
+_latency = {}
+# program basename -> count
+_subprocesses = {}
+# runner command name -> [per-bucket counts..., count, sum]
+_command_latency = {}
+# runner command name -> count
+_command_failures = {}
+# (name, help, callable returning a number)
+_gauges = []
+
+
+def register_gauge(name, help_text, fn):
+    _gauges.append((name, help_text, fn))
+
+
+def _observe(histograms, key, seconds):
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = [0] * len(LATENCY_BUCKETS) + [0, 0.0]
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            hist[i] += 1
+    hist[-2] += 1
+    hist[-1] += seconds
+
+
+def observe_request(blueprint, method, status, seconds):
+    with _lock:
+        key = (blueprint, method, str(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        _observe(_latency, blueprint, seconds)
+
+
+def observe_subprocess(command, seconds, failed=False):
+    with _lock:
+        _observe(_command_latency, command, seconds)
+        if failed:
+            _command_failures[command] = _command_failures.get(command, 0) + 1
+
+
+def count_subprocess(program):
+    with _lock:
+        _subprocesses[program] = _subprocesses.get(program, 0) + 1
+
+
+def _before_request():
+    g.telemetry_start = time.monotonic()
+
+
+def _after_request(response):
+    start = g.pop('telemetry_start', None)
+    if start is not None:
+        observe_request(
+            request.blueprint or 'app', request.method,
+            response.status_code, time.monotonic() - start,
+        )
+    return response
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def family(name, kind, help_text, samples):
+    """Lines for one metric family.
+
+    ``samples`` is an iterable of ``(suffix, labels, value)``; samples whose
+    value is ``None`` or NaN are skipped.
+    """
+    lines = [f'# TYPE {name} {kind}', f'# HELP {name} {_escape(help_text)}']
+    for suffix, labels, value in samples:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        label_text = ''
+        if labels:
+            label_text = '{' + ','.join(
+                f'{k}="{_escape(v)}"' for k, v in labels.items()
+            ) + '}'
+        lines.append(f'{name}{suffix}{label_text} {_format_value(value)}')
+    return lines
+
+
+def _histogram_samples(label, histograms):
+    samples = []
+    for key, hist in sorted(histograms.items()):
+        for bound, count in zip(LATENCY_BUCKETS, hist):
+            samples.append(('_bucket', {label: key, 'le': repr(bound)}, count))
+        samples.append(('_bucket', {label: key, 'le': '+Inf'}, hist[-2]))
+        samples.append(('_count', {label: key}, hist[-2]))
+        samples.append(('_sum', {label: key}, hist[-1]))
+    return samples
+
+
+def render(extra=()):
+    """OpenMetrics text for the web UI internals plus ``extra`` lines."""
+    with _lock:
+        requests = dict(_requests)
+        latency = {bp: list(hist) for bp, hist in _latency.items()}
+        subprocesses = dict(_subprocesses)
+        command_latency = {c: list(hist) for c, hist in _command_latency.items()}
+        command_failures = dict(_command_failures)
+    lines = list(extra)
+    lines += family(
+        'border0_webui_http_requests', 'counter',
+        'HTTP requests handled, by blueprint, method and status',
+        (('_total', {'blueprint': bp, 'method': m, 'status': s}, n)
+         for (bp, m, s), n in sorted(requests.items())),
+    )
+    lines += family(
+        'border0_webui_http_request_duration_seconds', 'histogram',
+        'Time spent handling a request, by blueprint',
+        _histogram_samples('blueprint', latency),
+    )
+    lines += family(
+        'border0_webui_subprocesses', 'counter',
+        'Subprocesses started by the web UI, by program',
+        (('_total', {'program': p}, n) for p, n in sorted(subprocesses.items())),
+    )
+    lines += family(
+        'border0_webui_command_duration_seconds', 'histogram',
+        'Run time of commands started through the runner, by command',
+        _histogram_samples('command', command_latency),
+    )
+    lines += family(
+        'border0_webui_command_failures', 'counter',
+        'Commands that exited non-zero, timed out or failed to start, by command',
+        (('_total', {'command': c}, n) for c, n in sorted(command_failures.items())),
+    )
+    for name, help_text, fn in _gauges:
+        try:
+            value = fn()
+        except Exception:
+            continue
+        lines += family(name, 'gauge', help_text, [('', None, value)])
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
@@ -1,62 +1,642 @@
 #!/usr/bin/env python3
 """
 Simple metrics collector for Border0 Pi.
-Runs as a systemd service to record system metrics every minute to a log file.
-Each line in the log file is a JSON object with timestamp (ms) and metrics:
+Runs as a systemd service and samples system metrics every 5 seconds. Each
+sample has a timestamp (ms) and the metrics:
   cpu, memory, disk, net_sent, net_recv
+  load1, load5, load15, cpu_freq (MHz), soc_temp (C)
+  undervolt, freq_capped, throttled, soft_temp_limit (firmware flags, 0/1)
+  cpu0..cpuN (per-core %)
+
+The board metrics are read straight from procfs/sysfs, so sampling them
+costs a few small reads. Anything the kernel does not expose (no thermal
+zone, not a Raspberry Pi) is recorded as missing. The throttle flags are
+0/1, so a rollup's average is the fraction of time spent throttled and
+its max says whether it happened at all.
+
+net_sent/net_recv only count physical interfaces, so loopback and the VPN
+tunnel (whose traffic also crosses the WAN) no longer inflate them. Every
+interface additionally gets its own short-tier series (``iface-<name>``)
+of byte, packet, error and drop rates, and ``interfaces.json`` in the
+metrics directory tags each one with its role (wan/lan from /etc/border0,
+vpn, loopback or other). Interfaces not seen for a day are dropped along
+with their series.
+
+Once a minute, per-LAN-client byte and packet rates are read from an
+nftables accounting table (see gateway_admin/lan_accounting.py) into
+``client-<mac>`` series, with ``clients.json`` holding each client's last
+IP, current rates and byte totals for the top-talkers tables. Clients not
+seen for a week are dropped along with their series.
+
+With every history record the collector also sums CPU, RSS, threads,
+open FDs and context switches of its own services (border0, hostapd,
+dnsmasq, the web UI), found through their systemd cgroups (see
+gateway_admin/process_metrics.py), into ``proc-<group>`` series.
+
+A background thread probes RTT, jitter and loss to the WAN gateway, a
+public target (--probe-target) and the selected Border0 exit node every
+30 seconds into ``probe-<target>`` series (see gateway_admin/probes.py).
+
+Every sample is published to a small live ring on tmpfs that the web UI
+reads for its live views, so viewers never sample anything themselves.
+Ticks follow a monotonic schedule and rates use the time actually elapsed
+between samples. While the stats page has requested a burst (see
+/stats/burst), the collector samples every second into a separate
+30-minute ring on tmpfs and folds those samples into the 5 s live ones.
+Every 15 seconds the time-weighted average of the live samples is
+recorded into the fixed-size history rings (see
+gateway_admin/metrics_store.py): a raw tier plus 1 min / 5 min / 1 h
+rollups with avg/min/max per bucket.
+
+By default the rings are kept on tmpfs and written to the SD card in
+batches (see gateway_admin/staging.py): every --flush-interval seconds
+(10 minutes) and when the service stops, only the records appended since
+the last flush are written to --dir. The staged dnsmasq logs are moved to
+/var/log on the same schedule. Bytes written per day (by these flushes,
+and by the kernel to the root block device) are kept in writes.json;
+--staging-dir '' writes the rings in place as before.
+
+On startup, history from older releases (the JSON-lines metrics.log, or the
+single metrics.ring file) is imported once and the old file is renamed with
+an .imported suffix.
 """
+import argparse
+import logging
+import signal
 import time
 import psutil
-import json
 import os
 
-# Log file path; matches Config.METRICS_LOG_PATH in the web UI
-LOG_FILE = '/var/lib/border0/metrics.log'
-# Sampling interval in seconds (reduced to collect every 15 seconds)
-INTERVAL = 15
+from gateway_admin.metrics_store import (
+    BURST_INTERVAL, BURST_RETENTION, CLIENT_COLUMNS, CLIENT_TIERS,
+    IFACE_COLUMNS, IFACE_EXPIRY, IFACE_TIERS, PROC_COLUMNS, TIERS, RingStore,
+    TieredSeries, client_series, iface_series, import_jsonl, import_ring,
+    proc_series, read_burst, read_clients, read_interfaces, remove_series,
+    tier_path, write_clients, write_interfaces,
+)
+from gateway_admin.lan_accounting import LanAccounting
+from gateway_admin.probes import DEFAULT_PUBLIC_TARGET, ProbeEngine
+from gateway_admin.process_metrics import ProcessSampler
+from gateway_admin.staging import (
+    FLUSH_INTERVAL, LOG_FLUSH_BYTES, STAGING_DIR, Stager,
+)
+
+log = logging.getLogger('metrics_collector')
+
+# Persistent directory for the tier files; the collector works on a tmpfs
+# copy in STAGING_DIR, which is what Config.METRICS_DIR points the web UI at
+METRICS_DIR = '/var/lib/border0/metrics'
+SERIES = 'system'
+# Pre-tier history files, imported once on startup
+LEGACY_LOG_FILE = '/var/lib/border0/metrics.log'
+LEGACY_RING_FILE = '/var/lib/border0/metrics.ring'
+# Live ring on tmpfs; matches Config.METRICS_LIVE_PATH in the web UI
+LIVE_FILE = '/run/border0/metrics-live.ring'
+# Burst ring and the web UI's burst request; match Config.METRICS_BURST_PATH
+# and Config.METRICS_BURST_REQUEST_PATH
+BURST_FILE = '/run/border0/metrics-burst.ring'
+BURST_REQUEST_FILE = '/run/border0/metrics-burst.json'
+# Live sampling interval in seconds, and one hour of live tail
+LIVE_INTERVAL = 5
+LIVE_CAPACITY = 3600 // LIVE_INTERVAL + 1
+# History interval in seconds; matches the raw tier's bucket
+INTERVAL = TIERS[0][1]
+COLUMNS = (
+    'cpu', 'memory', 'disk', 'net_sent', 'net_recv',
+    'load1', 'load5', 'load15', 'cpu_freq', 'soc_temp',
+    'undervolt', 'freq_capped', 'throttled', 'soft_temp_limit',
+)
+# Raspberry Pi firmware throttle state (hex bitmask); the low bits are the
+# current state: under-voltage, ARM frequency capped, throttled, soft
+# temperature limit.
+THROTTLED_FILE = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+THROTTLE_BITS = (
+    ('undervolt', 0), ('freq_capped', 1), ('throttled', 2),
+    ('soft_temp_limit', 3),
+)
+THERMAL_DIR = '/sys/class/thermal'
+CPUFREQ_FILE = '/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq'
+# Interface role files; match Config.WAN_IFACE_PATH / LAN_IFACE_PATH
+WAN_IFACE_FILE = '/etc/border0/wan_interface'
+LAN_IFACE_FILE = '/etc/border0/lan_interface'
+# Tunnel interfaces; their traffic is counted again on the WAN
+VPN_PREFIXES = ('utun', 'tun', 'wg')
+# LAN clients are sampled once per client raw-tier bucket
+CLIENT_INTERVAL = CLIENT_TIERS[0][1]
+# Clients not seen for this long are dropped with their series
+CLIENT_EXPIRY = CLIENT_TIERS[-1][2]
+
+
+def import_legacy(series):
+    """Import pre-tier history files into ``series`` and move them aside."""
+    for path, importer in ((LEGACY_LOG_FILE, import_jsonl),
+                           (LEGACY_RING_FILE, import_ring)):
+        if not os.path.isfile(path):
+            continue
+        try:
+            importer(path, series)
+            os.replace(path, path + '.imported')
+        except Exception:
+            pass
+
+
+def root_disk():
+    """Name of the block device holding ``/`` (e.g. ``mmcblk0``), or ``None``."""
+    try:
+        for part in psutil.disk_partitions(all=False):
+            if part.mountpoint == '/':
+                name = os.path.basename(part.device)
+                break
+        else:
+            return None
+        # Partitions sit below their disk in sysfs
+        parent = os.path.basename(os.path.dirname(
+            os.path.realpath(os.path.join('/sys/class/block', name))
+        ))
+        if os.path.exists(os.path.join('/sys/block', parent)):
+            return parent
+        return name
+    except OSError:
+        return None
+
+
+def disk_written(disk):
+    """Bytes written to ``disk`` since boot, or ``None``."""
+    if disk is None:
+        return None
+    counters = psutil.disk_io_counters(perdisk=True) or {}
+    io = counters.get(disk)
+    return io.write_bytes if io is not None else None
+
+
+def read_iface(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def read_int(path, base=10):
+    try:
+        with open(path) as f:
+            return int(f.read().strip(), base)
+    except (OSError, ValueError):
+        return None
+
+
+def find_soc_zone():
+    """Path of the SoC's thermal zone temperature, or ``None``.
 
-def ensure_log_dir(path):
-    dirpath = os.path.dirname(path)
+    Prefers the zone typed cpu-thermal/soc-thermal and falls back to the
+    first zone.
+    """
     try:
-        os.makedirs(dirpath, exist_ok=True)
-    except Exception:
-        pass
+        zones = sorted(
+            z for z in os.listdir(THERMAL_DIR) if z.startswith('thermal_zone')
+        )
+    except OSError:
+        return None
+    for zone in zones:
+        try:
+            with open(os.path.join(THERMAL_DIR, zone, 'type')) as f:
+                kind = f.read().strip()
+        except OSError:
+            continue
+        if kind in ('cpu-thermal', 'soc-thermal', 'soc_thermal'):
+            return os.path.join(THERMAL_DIR, zone, 'temp')
+    if zones:
+        return os.path.join(THERMAL_DIR, zones[0], 'temp')
+    return None
+
+
+def board_metrics(temp_path):
+    """Load average, CPU clock, SoC temperature and throttle flags."""
+    load1, load5, load15 = os.getloadavg()
+    freq = read_int(CPUFREQ_FILE)
+    temp = read_int(temp_path) if temp_path else None
+    metrics = {
+        'load1': load1,
+        'load5': load5,
+        'load15': load15,
+        'cpu_freq': freq / 1000 if freq is not None else None,
+        'soc_temp': temp / 1000 if temp is not None else None,
+    }
+    flags = read_int(THROTTLED_FILE, 16)
+    for name, bit in THROTTLE_BITS:
+        metrics[name] = (flags >> bit) & 1 if flags is not None else None
+    return metrics
+
+
+def weighted_mean(pairs):
+    """Mean of ``(weight, value)`` pairs whose value is present."""
+    pairs = [(w, v) for w, v in pairs if v is not None]
+    total = sum(w for w, _ in pairs)
+    return sum(w * v for w, v in pairs) / total if total else None
+
+
+def iface_roles(names):
+    """Map interface names to wan/lan/vpn/loopback/other."""
+    wan = read_iface(WAN_IFACE_FILE)
+    lan = read_iface(LAN_IFACE_FILE)
+    roles = {}
+    for name in names:
+        if name == wan:
+            role = 'wan'
+        elif name == lan:
+            role = 'lan'
+        elif name == 'lo':
+            role = 'loopback'
+        elif name.startswith(VPN_PREFIXES):
+            role = 'vpn'
+        else:
+            role = 'other'
+        roles[name] = role
+    return roles
+
+
+def iface_rates(prev, cur, seconds):
+    """Per-interface counter rates between two pernic snapshots."""
+    rates = {}
+    for name, now in cur.items():
+        before = prev.get(name)
+        if before is None:
+            continue
+        # A counter that went backwards means the interface was recreated
+        rates[name] = {
+            col: max(getattr(now, col) - getattr(before, col), 0) / seconds
+            for col in IFACE_COLUMNS
+        }
+    return rates
+
+
+def stop(signum, frame):
+    raise SystemExit(0)
+
 
 def main():
-    # Prepare
-    ensure_log_dir(LOG_FILE)
-    prev_net = psutil.net_io_counters()
-    # Warm up CPU percent
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dir', default=METRICS_DIR)
+    parser.add_argument(
+        '--staging-dir', default=STAGING_DIR,
+        help="tmpfs directory the rings are kept in between flushes; '' "
+             "writes them to --dir directly",
+    )
+    parser.add_argument(
+        '--flush-interval', type=int, default=FLUSH_INTERVAL,
+        help='seconds between flushes to --dir (default %(default)s)',
+    )
+    parser.add_argument(
+        '--probe-target', default=DEFAULT_PUBLIC_TARGET,
+        help="public latency/loss probe target, kind:host[:port] with kind "
+             "icmp, tcp or udp (default %(default)s); '' disables it",
+    )
+    parser.add_argument(
+        '--border0-cli', default='border0',
+        help='Border0 CLI used to look up the exit node to probe',
+    )
+    parser.add_argument(
+        '--import-log', metavar='PATH',
+        help='import a legacy JSON-lines metrics log into the store and exit',
+    )
+    args = parser.parse_args()
+
+    # Warm up CPU percent; the per-core list also tells how many cores
+    # to record
     psutil.cpu_percent(interval=None)
+    cores = len(psutil.cpu_percent(interval=None, percpu=True))
+    columns = COLUMNS + tuple(f'cpu{i}' for i in range(cores))
+    temp_path = find_soc_zone()
 
-    while True:
-        time.sleep(INTERVAL)
-        now = int(time.time() * 1000)
+    if args.import_log:
+        series = TieredSeries(args.dir, SERIES, columns)
+        count = import_jsonl(args.import_log, series)
+        series.flush()
+        print(f'imported {count} records into {args.dir}')
+        return
+
+    stager = Stager(args.staging_dir or None, args.dir,
+                    flush_interval=args.flush_interval)
+    try:
+        stager.seed()
+    except OSError:
+        stager.staging_dir = None
+    work_dir = stager.staging_dir or args.dir
+    series = TieredSeries(work_dir, SERIES, columns)
+    import_legacy(series)
+    # systemd stops the service with SIGTERM; unwind so the finally
+    # below flushes the staged data
+    signal.signal(signal.SIGTERM, stop)
+    ProbeEngine(work_dir, args.probe_target, WAN_IFACE_FILE,
+                args.border0_cli).start()
+    try:
+        run(stager, work_dir, series, columns, cores, temp_path)
+    finally:
+        series.flush()
+        stager.flush()
+
+
+class Sampler:
+    """Takes one sample of every column.
 
-        # Metrics
+    Counter rates are divided by the monotonic time actually elapsed since
+    the previous sample, not the nominal interval, so a late tick does
+    not inflate them.
+    """
+
+    def __init__(self, cores, temp_path):
+        self.cores = cores
+        self.temp_path = temp_path
+        self._nics = psutil.net_io_counters(pernic=True)
+        self._time = time.monotonic()
+
+    def sample(self):
+        """Return ``(seconds since the previous sample, record, nic_rates)``."""
         cpu = psutil.cpu_percent(interval=None)
+        per_core = psutil.cpu_percent(interval=None, percpu=True)
         memory = psutil.virtual_memory().percent
         disk = psutil.disk_usage('/').percent
-        net = psutil.net_io_counters()
-        # Compute throughput
-        sent_rate = (net.bytes_sent - prev_net.bytes_sent) / INTERVAL
-        recv_rate = (net.bytes_recv - prev_net.bytes_recv) / INTERVAL
-        prev_net = net
-
+        nics = psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        elapsed = max(now - self._time, 1e-3)
+        nic_rates = iface_rates(self._nics, nics, elapsed)
+        self._nics, self._time = nics, now
+        roles = iface_roles(nic_rates)
+        # Compute throughput over physical interfaces only
+        physical = [
+            rates for name, rates in nic_rates.items()
+            if roles[name] not in ('loopback', 'vpn')
+        ]
         record = {
-            'time': now,
             'cpu': cpu,
             'memory': memory,
             'disk': disk,
-            'net_sent': sent_rate,
-            'net_recv': recv_rate
+            'net_sent': sum(r['bytes_sent'] for r in physical),
+            'net_recv': sum(r['bytes_recv'] for r in physical),
         }
-        # Append to log
+        record.update(board_metrics(self.temp_path))
+        for i, value in enumerate(per_core[:self.cores]):
+            record[f'cpu{i}'] = value
+        return elapsed, record, nic_rates
+
+
+class Accumulator:
+    """Folds samples into one per ``period`` seconds.
+
+    Samples are weighted by the time they cover, so a period made of
+    uneven ticks (a burst starting or ending mid-period, a late tick)
+    still averages to the period's value.
+    """
+
+    def __init__(self, period, slack):
+        self.period = period
+        # Accept a period this much short of ``period``, so tick jitter
+        # does not push the fold to the next tick
+        self.slack = slack
+        self._samples = []
+
+    def add(self, elapsed, record, nic_rates):
+        """Add a sample; returns the folded sample once a period is full."""
+        self._samples.append((elapsed, record, nic_rates))
+        total = sum(s[0] for s in self._samples)
+        if total < self.period - self.slack:
+            return None
+        samples, self._samples = self._samples, []
+        if len(samples) == 1:
+            return samples[0]
+        names = set().union(*(s[1] for s in samples))
+        record = {
+            name: weighted_mean((w, r.get(name)) for w, r, _ in samples)
+            for name in names
+        }
+        # Interfaces present at the end of the period
+        nic_rates = {}
+        for iface in samples[-1][2]:
+            present = [(w, n[iface]) for w, _, n in samples if iface in n]
+            nic_rates[iface] = {
+                col: weighted_mean((w, r[col]) for w, r in present)
+                for col in IFACE_COLUMNS
+            }
+        return total, record, nic_rates
+
+
+class InterfaceRecorder:
+    """Records per-interface rates into ``iface-<name>`` series and keeps
+    ``interfaces.json`` (role, hour last seen) current.
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        hour = self._hour(int(time.time() * 1000))
+        # Entries from before last_seen was kept count as seen now
+        self.known = {
+            name: dict(info, last_seen=info.get('last_seen', hour))
+            for name, info in read_interfaces(work_dir).items()
+        }
+        self._series = {}
+
+    @staticmethod
+    def _hour(now_ms):
+        # last_seen only moves once an hour, so the index is rewritten
+        # hourly rather than with every sample
+        return now_ms - now_ms % 3600000
+
+    def record(self, now_ms, nic_rates):
+        for name, rates in nic_rates.items():
+            try:
+                if name not in self._series:
+                    series = iface_series(name)
+                    # Drop tiers left over from an older tier layout
+                    remove_series(self.work_dir, series,
+                                  keep=[t for t, _, _ in IFACE_TIERS])
+                    self._series[name] = TieredSeries(
+                        self.work_dir, series, IFACE_COLUMNS, IFACE_TIERS
+                    )
+                self._series[name].append(now_ms, rates)
+            except Exception:
+                pass
+        hour = self._hour(now_ms)
+        interfaces = {
+            name: info for name, info in self.known.items()
+            if name in nic_rates
+            or info['last_seen'] >= now_ms - IFACE_EXPIRY * 1000
+        }
+        for name in set(self.known) - set(interfaces):
+            store = self._series.pop(name, None)
+            if store is not None:
+                store.close()
+            remove_series(self.work_dir, iface_series(name))
+        interfaces.update({
+            name: {'role': role, 'last_seen': hour}
+            for name, role in iface_roles(nic_rates).items()
+        })
+        if interfaces != self.known:
+            try:
+                write_interfaces(self.work_dir, interfaces)
+                self.known = interfaces
+            except OSError:
+                pass
+
+
+class ClientRecorder:
+    """Records per-LAN-client rates into ``client-<mac>`` series and
+    keeps ``clients.json`` (last IP, current rates, byte totals) current.
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.accounting = LanAccounting()
+        self.accounting.setup()
+        self.clients = read_clients(work_dir)
+        self._series = {}
+        self._last = time.monotonic()
+
+    def due(self):
+        return time.monotonic() - self._last >= CLIENT_INTERVAL
+
+    def record(self, now_ms):
+        mono = time.monotonic()
+        elapsed, self._last = mono - self._last, mono
+        lan = read_iface(LAN_IFACE_FILE)
+        if lan is None:
+            return
+        samples = self.accounting.sample(lan, elapsed)
+        for info in self.clients.values():
+            info['rate_up'] = info['rate_down'] = 0
+        for mac, (rates, ip, deltas) in samples.items():
+            try:
+                if mac not in self._series:
+                    self._series[mac] = TieredSeries(
+                        self.work_dir, client_series(mac), CLIENT_COLUMNS,
+                        CLIENT_TIERS,
+                    )
+                self._series[mac].append(now_ms, rates)
+            except Exception:
+                pass
+            info = self.clients.setdefault(mac, {'bytes_up': 0, 'bytes_down': 0})
+            info.update(
+                ip=ip, last_seen=now_ms,
+                rate_up=rates['bytes_up'], rate_down=rates['bytes_down'],
+                bytes_up=info.get('bytes_up', 0) + deltas[0],
+                bytes_down=info.get('bytes_down', 0) + deltas[1],
+            )
+        self._expire(now_ms)
+        try:
+            write_clients(self.work_dir, self.clients)
+        except OSError:
+            pass
+
+    def _expire(self, now_ms):
+        cutoff = now_ms - CLIENT_EXPIRY * 1000
+        for mac, info in list(self.clients.items()):
+            if info.get('last_seen', 0) >= cutoff:
+                continue
+            del self.clients[mac]
+            store = self._series.pop(mac, None)
+            if store is not None:
+                store.close()
+            for tier, _, _ in CLIENT_TIERS:
+                try:
+                    os.remove(tier_path(self.work_dir, client_series(mac), tier))
+                except OSError:
+                    pass
+
+
+def run(stager, work_dir, series, columns, cores, temp_path):
+    """Sample forever, recording history into ``work_dir``.
+
+    Ticks follow a monotonic schedule (``tick += interval``) rather than
+    sleeping a fixed time after each sample, so the time spent sampling
+    does not accumulate as drift. The interval drops to BURST_INTERVAL
+    while the web UI has a burst pending.
+    """
+    live = RingStore.open(LIVE_FILE, columns, LIVE_CAPACITY)
+    burst = RingStore.open(BURST_FILE, columns, BURST_RETENTION + 1)
+    sampler = Sampler(cores, temp_path)
+    clients = ClientRecorder(work_dir)
+    processes = ProcessSampler()
+    proc_stores = {}
+    last_proc = time.monotonic()
+    live_acc = Accumulator(LIVE_INTERVAL, BURST_INTERVAL / 2)
+    history_acc = Accumulator(INTERVAL, LIVE_INTERVAL / 2)
+    interfaces = InterfaceRecorder(work_dir)
+    root_dev = root_disk()
+    prev_written = disk_written(root_dev)
+    last_flush = time.monotonic()
+    tick = time.monotonic()
+
+    while True:
+        bursting = time.time() < read_burst(BURST_REQUEST_FILE)
+        interval = BURST_INTERVAL if bursting else LIVE_INTERVAL
+        tick += interval
+        delay = tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -interval:
+            # More than a tick behind (suspend, stalled I/O): start over
+            # instead of catching up with back-to-back samples
+            tick = time.monotonic()
+        now = int(time.time() * 1000)
+
+        elapsed, record, nic_rates = sampler.sample()
+        if bursting:
+            try:
+                burst.append(now, record)
+            except Exception:
+                pass
+        folded = live_acc.add(elapsed, record, nic_rates)
+        if folded is None:
+            continue
         try:
-            with open(LOG_FILE, 'a') as f:
-                f.write(json.dumps(record) + '\n')
+            live.append(now, folded[1])
         except Exception:
             pass
 
+        written = disk_written(root_dev)
+        if written is not None and prev_written is not None:
+            stager.count('device', max(written - prev_written, 0))
+        prev_written = written
+        if time.monotonic() - last_flush >= stager.flush_interval:
+            stager.flush()
+            last_flush = time.monotonic()
+        else:
+            stager.flush_logs(LOG_FLUSH_BYTES)
+
+        if clients.due():
+            # nft or the accounting table failing must not stop history
+            try:
+                clients.record(now)
+            except Exception:
+                log.exception('LAN client accounting failed')
+
+        folded = history_acc.add(*folded)
+        if folded is None:
+            continue
+        _, averaged, nic_rates = folded
+        # In-place record updates in the raw ring and its rollups
+        try:
+            series.append(now, averaged)
+        except Exception:
+            pass
+
+        mono = time.monotonic()
+        try:
+            proc_samples = processes.sample(mono - last_proc)
+        except Exception:
+            proc_samples = {}
+        last_proc = mono
+        for group, values in proc_samples.items():
+            try:
+                if group not in proc_stores:
+                    proc_stores[group] = TieredSeries(
+                        work_dir, proc_series(group), PROC_COLUMNS
+                    )
+                proc_stores[group].append(now, values)
+            except Exception:
+                pass
+
+        interfaces.record(now, nic_rates)
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
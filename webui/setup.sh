@@ -17,6 +17,10 @@ echo "Installing dependencies..."
 pip install --upgrade pip
 pip install -r ../requirements.txt
 
+# Compile the MAC vendor database once instead of parsing it per lookup
+echo "Compiling OUI vendor index..."
+python3 -m gateway_admin.oui build || echo "OUI index not built; it is compiled on first use"
+
 echo "Downloading Bootstrap and Volt static assets..."
 STATIC_DIR="static/volt"
 mkdir -p "$STATIC_DIR/css" "$STATIC_DIR/js"
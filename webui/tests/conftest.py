@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests run from webui/ or the repository root; import gateway_admin from webui/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,90 @@
+"""LTTB downsampling keeps short spikes visible (metrics_store.downsample)."""
+import random
+
+from gateway_admin import metrics_store
+
+COLUMNS = ('cpu', 'memory', 'disk', 'net_sent', 'net_recv')
+INTERVAL_MS = 15 * 1000
+START_MS = 1_700_000_000_000
+
+
+def raw_rows(hours, spike_at=None):
+    """``hours`` of raw-tier rows with CPU idling at 2-8 %, and one 15 s
+    sample at 100 % CPU at index ``spike_at``."""
+    rnd = random.Random(7)
+    rows = []
+    for i in range(hours * 3600 * 1000 // INTERVAL_MS):
+        cpu = 100.0 if i == spike_at else rnd.uniform(2, 8)
+        rows.append((
+            START_MS + i * INTERVAL_MS, cpu, rnd.uniform(30, 40), 41.0,
+            rnd.uniform(0, 1e5), rnd.uniform(0, 1e6),
+        ))
+    return rows
+
+
+def test_cpu_spike_survives_downsampling():
+    rows = raw_rows(6, spike_at=777)
+    out = metrics_store.downsample(COLUMNS, rows, 200)
+    assert len(out) < len(rows) // 4
+    assert rows[777] in out
+    assert max(r[1] for r in out) == 100.0
+
+
+def test_spike_at_every_position_survives():
+    rows = raw_rows(6)
+    for at in (1, 2, 500, 1000, len(rows) - 2):
+        spiked = list(rows)
+        spiked[at] = (rows[at][0], 100.0) + rows[at][2:]
+        assert spiked[at] in metrics_store.downsample(COLUMNS, spiked, 200)
+
+
+def test_downsample_keeps_endpoints_and_order():
+    rows = raw_rows(6)
+    out = metrics_store.downsample(COLUMNS, rows, 200)
+    assert out[0] == rows[0] and out[-1] == rows[-1]
+    assert [r[0] for r in out] == sorted({r[0] for r in out})
+
+
+def test_short_window_is_returned_unchanged():
+    rows = raw_rows(1)
+    assert metrics_store.downsample(COLUMNS, rows, 1000) == rows
+
+
+def test_lttb_skips_nan_gaps():
+    times = list(range(100))
+    values = [float('nan') if 40 <= i < 60 else float(i % 5) for i in times]
+    values[70] = 50.0
+    kept = metrics_store.lttb(times, values, 10)
+    assert 70 in kept
+    assert all(not (40 <= i < 60) for i in kept)
+
+
+def test_spike_right_after_a_gap_survives():
+    # A collector outage longer than a bucket, then a spike mid-bucket
+    times = list(range(1000))
+    values = [float(i % 7) for i in times]
+    for i in range(300, 420):
+        values[i] = float('nan')
+    values[430] = 500.0
+    kept = metrics_store.lttb(times, values, 50)
+    assert 430 in kept
+    # The gap keeps a point so the chart still shows it as a gap
+    assert any(300 <= i < 420 for i in kept)
+
+
+def test_spike_after_gap_survives_downsample():
+    rows = raw_rows(6)
+    nan = float('nan')
+    for i in range(600, 700):
+        rows[i] = (rows[i][0],) + (nan,) * len(COLUMNS)
+    rows[705] = (rows[705][0], 100.0) + rows[705][2:]
+    assert rows[705] in metrics_store.downsample(COLUMNS, rows, 200)
+
+
+def test_lttb_all_nan_and_nan_endpoints():
+    nan = float('nan')
+    assert metrics_store.lttb(list(range(20)), [nan] * 20, 5) == [0, 1, 7, 13, 19]
+    values = [nan] + [float(i % 3) for i in range(1, 19)] + [nan]
+    values[9] = 40.0
+    kept = metrics_store.lttb(list(range(20)), values, 5)
+    assert kept[0] == 0 and kept[-1] == 19 and 9 in kept
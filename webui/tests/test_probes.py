@@ -0,0 +1,79 @@
+"""Probe rounds against loopback, and the probe thread surviving errors."""
+import math
+import os
+import socket
+import time
+
+import pytest
+
+from gateway_admin import metrics_store, probes
+
+
+@pytest.fixture
+def listener():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def assert_answered(record):
+    assert record['loss'] == 0.0
+    assert 0 <= record['rtt_min'] <= record['rtt_p50'] <= record['rtt_p90'] <= record['rtt_max']
+    # Loopback answers well inside the probe timeout
+    assert record['rtt_max'] < probes.PROBE_TIMEOUT * 1000
+    assert record['jitter'] >= 0
+
+
+def test_tcp_loopback(listener):
+    assert_answered(probes.run_round('tcp', '127.0.0.1', listener, count=3, gap=0))
+
+
+def test_tcp_refused_still_measures_the_path(listener):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    assert_answered(probes.run_round('tcp', '127.0.0.1', port, count=3, gap=0))
+
+
+def test_icmp_loopback():
+    try:
+        probes._icmp_socket()[0].close()
+    except PermissionError:
+        pytest.skip('no unprivileged ICMP socket and no CAP_NET_RAW')
+    assert_answered(probes.run_round('icmp', '127.0.0.1', count=3, gap=0))
+
+
+def test_summarize():
+    record = probes.summarize([0.010, None, 0.030, 0.020])
+    assert record['loss'] == 25.0
+    assert (record['rtt_min'], record['rtt_max']) == pytest.approx((10, 30))
+    assert record['jitter'] == pytest.approx(15)
+    assert probes.summarize([]) == {'loss': None}
+
+
+def test_engine_survives_failed_target_lookup(tmp_path, listener, monkeypatch):
+    engine = probes.ProbeEngine(str(tmp_path), f'tcp:127.0.0.1:{listener}', interval=0.05)
+    lookups = []
+
+    def flaky():
+        lookups.append(None)
+        if len(lookups) == 1:
+            raise OSError('route table unreadable')
+        return {'public': engine.public}
+
+    monkeypatch.setattr(engine, 'targets', flaky)
+    engine.start()
+    path = metrics_store.tier_path(str(tmp_path), metrics_store.probe_series('public'), 'raw')
+    deadline = time.monotonic() + 5
+    record = None
+    while record is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+        if os.path.exists(path):
+            record = metrics_store.read_latest(path)
+    assert engine.is_alive()
+    assert len(lookups) >= 2
+    assert record is not None and record['loss'] == 0.0
+    assert not math.isnan(record['rtt_p50'])
+    assert probes.read_probes(str(tmp_path))['public']['port'] == listener
@@ -0,0 +1,65 @@
+"""systemd.status() batching and caching over ``systemctl show``."""
+import subprocess
+
+import pytest
+
+from gateway_admin import runner, systemd
+
+SHOW = {
+    'hostapd@wlan0.service': 'LoadState=loaded\nActiveState=active\nSubState=running\n'
+                             'UnitFileState=enabled\nDescription=Access point on wlan0\n',
+    'hostapd@wlan1.service': 'LoadState=loaded\nActiveState=inactive\nSubState=dead\n'
+                             'UnitFileState=disabled\nDescription=Access point on wlan1\n',
+}
+
+
+@pytest.fixture
+def systemctl(monkeypatch):
+    calls = []
+
+    def run(argv, **kwargs):
+        calls.append(argv)
+        units = argv[4:]
+        stdout = '\n'.join(SHOW[unit] for unit in units)
+        return subprocess.CompletedProcess(argv, 0, stdout, '')
+
+    monkeypatch.setattr(runner, 'run', run)
+    systemd.invalidate()
+    yield calls
+    systemd.invalidate()
+
+
+def test_one_call_for_all_units(systemctl):
+    result = systemd.status('hostapd@wlan0', 'hostapd@wlan1')
+    assert len(systemctl) == 1
+    assert systemctl[0][4:] == ['hostapd@wlan0.service', 'hostapd@wlan1.service']
+    assert result['hostapd@wlan0']['active'] and result['hostapd@wlan0']['enabled']
+    assert result['hostapd@wlan1'] == {
+        'load_state': 'loaded', 'active_state': 'inactive', 'sub_state': 'dead',
+        'file_state': 'disabled', 'description': 'Access point on wlan1',
+        'active': False, 'enabled': False,
+    }
+
+
+def test_cached_units_are_not_read_again(systemctl):
+    systemd.status('hostapd@wlan0')
+    systemd.status('hostapd@wlan0', 'hostapd@wlan1')
+    assert [argv[4:] for argv in systemctl] == [
+        ['hostapd@wlan0.service'], ['hostapd@wlan1.service'],
+    ]
+    assert systemd.status() == {}
+    assert len(systemctl) == 2
+
+
+def test_entries_expire(systemctl, monkeypatch):
+    systemd.status('hostapd@wlan0')
+    monkeypatch.setattr(systemd, 'CACHE_TTL', 0)
+    systemd.status('hostapd@wlan0')
+    assert len(systemctl) == 2
+
+
+def test_control_drops_the_unit(systemctl):
+    systemd.status('hostapd@wlan0')
+    systemd.restart('hostapd@wlan0')
+    systemd.status('hostapd@wlan0')
+    assert [argv[1] for argv in systemctl] == ['show', 'restart', 'show']